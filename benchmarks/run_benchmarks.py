@@ -0,0 +1,190 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+#Measures the throughput and memory use of the service analysers against synthetic accounts of a configurable size (see synthetic_data.py),
+#without any AWS account. Every analyser is run on its own, and then all of them together (end to end), each run in a fresh process so
+#that its peak RSS is its own. The allocations are measured with tracemalloc in a second run of each, as tracing slows the run down.
+#The results are written to a json file, which can be passed back in with --baseline to compare two versions of the code.
+#Any option not listed below is passed on to the analyser, for example: python benchmarks/run_benchmarks.py --scale 0.1 --incremental
+
+import os
+import sys
+
+benchmarks_folder_name = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(benchmarks_folder_name, '..', 'src'))
+sys.path.insert(0, benchmarks_folder_name)
+
+import csv
+import glob
+import json
+import time
+import platform
+import argparse
+import datetime
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+import multiprocessing
+
+def get_peak_rss_in_mb():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024 #Bytes on macOS, kilobytes on Linux
+
+def count_findings(analyser, output_folder_name):
+    if os.path.isfile(analyser.output_file_full_path):
+        with open(analyser.output_file_full_path, newline='') as output_file:
+            return sum(1 for _ in csv.reader(output_file)) - 1 #Less the header
+    import pyarrow.parquet
+    return sum(pyarrow.parquet.ParquetFile(file_full_path).metadata.num_rows
+               for file_full_path in glob.glob(os.path.join(output_folder_name, 'findings', '**', '*.parquet'), recursive = True))
+
+#Runs in a process of its own. Returns the measurements of one run of the given analysers.
+def run_benchmark(services, region, resource_counts, analyser_args, trace_allocations):
+    import synthetic_clients
+    synthetic_clients.install(resource_counts)
+    import utils
+    import account_analyser
+
+    with tempfile.TemporaryDirectory() as output_folder_name:
+        sys.argv = (['account_analyser.py', '-s'] + services + ['-r', region, '-o', output_folder_name + '/', '--truncate-output', '--log-level', 'CRITICAL']
+                    + analyser_args)
+        utils.get_config_info()
+        baseline_rss_in_mb = get_peak_rss_in_mb()
+
+        if trace_allocations:
+            tracemalloc.start()
+        start = time.perf_counter()
+        analyser = account_analyser.AccountAnalyser()
+        analyser.run()
+        runtime_in_seconds = time.perf_counter() - start
+        if trace_allocations:
+            allocated_peak_in_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        peak_rss_in_mb = get_peak_rss_in_mb()
+
+        finding_count = count_findings(analyser, output_folder_name)
+
+    result = {
+        'services': services,
+        'resource_count': sum(resource_counts[service] for service in services),
+        'finding_count': finding_count,
+        'api_call_count': sum(synthetic_clients.call_counts.values()),
+        'runtime_in_seconds': round(runtime_in_seconds, 3),
+        'records_per_second': round(finding_count / runtime_in_seconds, 1) if runtime_in_seconds > 0 else None,
+        'baseline_rss_in_mb': round(baseline_rss_in_mb, 1),
+        'peak_rss_in_mb': round(peak_rss_in_mb, 1),
+        'rss_growth_in_mb': round(peak_rss_in_mb - baseline_rss_in_mb, 1),
+        'failed_units': [f"{rec['service']}+{rec['region']}: {rec['error_message']}" for rec in analyser.run_report if rec['result'] == 'Failure']
+    }
+    if trace_allocations:
+        result = {'allocated_peak_in_mb': round(allocated_peak_in_mb, 1)}
+    return result
+
+#Every run gets a fresh interpreter, so that nothing (peak RSS, caches, clients) carries over from the previous run
+def run_in_subprocess(*args):
+    with multiprocessing.get_context('spawn').Pool(processes = 1) as pool:
+        return pool.apply(run_benchmark, args)
+
+def measure(services, region, resource_counts, analyser_args, trace_allocations):
+    result = run_in_subprocess(services, region, resource_counts, analyser_args, False)
+    if trace_allocations:
+        result.update(run_in_subprocess(services, region, resource_counts, analyser_args, True))
+    return result
+
+def get_git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = benchmarks_folder_name, capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def resource_count_validator(value):
+    service, _, count = value.partition('=')
+    if not count.isdigit():
+        raise argparse.ArgumentTypeError(f"Invalid resource count {value}. It must be of the form SERVICE=COUNT, for example lambda=1000")
+    return (service, int(count))
+
+def print_result(name, result):
+    print(f"{name:<20} {result['resource_count']:>9} {result['finding_count']:>9} {result['api_call_count']:>9} {result['runtime_in_seconds']:>9.2f}"
+          f" {result['records_per_second'] or 0:>10.1f} {result['peak_rss_in_mb']:>9.1f} {result.get('allocated_peak_in_mb', ''):>9}")
+    for failed_unit in result['failed_units']:
+        print(f"    Failed: {failed_unit}")
+
+def print_comparison(results, baseline_results):
+    print(f"\nCompared with {baseline_results.get('git_commit') or 'the baseline'} (records per second, peak RSS in MB):")
+    runs = list(results['analysers'].items()) + ([('end to end', results['end_to_end'])] if results.get('end_to_end') else [])
+    for name, result in runs:
+        baseline = baseline_results['end_to_end'] if name == 'end to end' else baseline_results.get('analysers', {}).get(name)
+        if not baseline or not baseline.get('records_per_second') or not result.get('records_per_second'):
+            continue
+        change = (result['records_per_second'] / baseline['records_per_second'] - 1) * 100
+        print(f"{name:<20} {baseline['records_per_second']:>10.1f} -> {result['records_per_second']:>10.1f} ({change:+.1f}%)"
+              f" {baseline['peak_rss_in_mb']:>9.1f} -> {result['peak_rss_in_mb']:>9.1f}")
+
+def main():
+    import analyser_registry
+    import synthetic_data
+
+    parser = argparse.ArgumentParser(description = 'Benchmark the service analysers against synthetic accounts')
+    #The synthetic data covers the analysers of the tool, not those of other packages
+    services = list(analyser_registry.analyser_manifest)
+    parser.add_argument('-s', '--services', nargs = '+', choices = services, default = services,
+                        help = "Services whose analysers are benchmarked. Defaults to all of them")
+    parser.add_argument('--scale', type = float, default = 1.0,
+                        help = "Multiplies the default number of resources of every service (see synthetic_data.py). Defaults to 1")
+    parser.add_argument('--resource-count', nargs = '+', type = resource_count_validator, default = [], dest = 'resource_counts', metavar = 'SERVICE=COUNT',
+                        help = "Number of resources of a service, for example lambda=1000. Overrides --scale for that service")
+    parser.add_argument('-r', '--region', default = 'us-west-2',
+                        help = "Region in which the synthetic resources are. Defaults to us-west-2, the only region in which Global Accelerator is analysed")
+    parser.add_argument('--no-end-to-end', action = 'store_true', dest = 'no_end_to_end',
+                        help = "Do not run all the selected analysers together after running them one by one")
+    parser.add_argument('--no-tracemalloc', action = 'store_true', dest = 'no_tracemalloc',
+                        help = "Do not measure the allocations with tracemalloc. Halves the time taken by the benchmark")
+    parser.add_argument('-o', '--output', default = 'benchmark_results.json', dest = 'output_file_name',
+                        help = "File the results are written to. Defaults to benchmark_results.json")
+    parser.add_argument('--baseline', dest = 'baseline_file_name',
+                        help = "Results file of an earlier run to compare the results with")
+    args, analyser_args = parser.parse_known_args()
+
+    resource_counts = {service: max(1, int(count * args.scale)) for service, count in synthetic_data.default_resource_counts.items()}
+    for service, count in args.resource_counts:
+        if service not in resource_counts:
+            parser.error(f"Unknown service {service} in --resource-count")
+        resource_counts[service] = count
+
+    import boto3
+    import botocore
+    results = {
+        'created_at': datetime.datetime.now().astimezone().isoformat(),
+        'git_commit': get_git_commit(),
+        'python_version': platform.python_version(),
+        'platform': platform.platform(),
+        'boto3_version': boto3.__version__,
+        'botocore_version': botocore.__version__,
+        'cpu_count': os.cpu_count(),
+        'region': args.region,
+        'scale': args.scale,
+        'resource_counts': resource_counts,
+        'analyser_args': analyser_args,
+        'analysers': {},
+        'end_to_end': None
+    }
+
+    print(f"{'':<20} {'resources':>9} {'findings':>9} {'API calls':>9} {'seconds':>9} {'records/s':>10} {'peak RSS':>9} {'allocated':>9}")
+    for service in args.services:
+        results['analysers'][service] = measure([service], args.region, resource_counts, analyser_args, not args.no_tracemalloc)
+        print_result(service, results['analysers'][service])
+    if not args.no_end_to_end:
+        results['end_to_end'] = measure(args.services, args.region, resource_counts, analyser_args, not args.no_tracemalloc)
+        print_result('end to end', results['end_to_end'])
+
+    with open(args.output_file_name, 'w') as output_file:
+        json.dump(results, output_file, indent = 2)
+    print(f"\nResults written to {args.output_file_name}")
+
+    if args.baseline_file_name:
+        with open(args.baseline_file_name) as baseline_file:
+            print_comparison(results, json.load(baseline_file))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+#Measures the cold start of the tool: what a fresh interpreter spends importing the tool, parsing and validating the options, and running a
+#small scan of one service against a synthetic account (see synthetic_clients.py). This is what each of many short container runs pays
+#before and besides the analysis itself. Every run is a new process, and the median and the minimum of the runs are reported.
+#The results are written to a json file, which can be passed back in with --baseline to compare two versions of the code.
+
+import os
+import sys
+import json
+import time
+
+benchmarks_folder_name = os.path.dirname(os.path.abspath(__file__))
+
+#Runs in a process of its own, started by main(). Prints the measurements of one cold start as json.
+def run_cold_start(service, resource_count):
+    start = time.perf_counter()
+    sys.path.insert(0, os.path.join(benchmarks_folder_name, '..', 'src'))
+    import account_analyser
+    imported = time.perf_counter()
+
+    #Not part of the tool, so not measured
+    sys.path.insert(0, benchmarks_folder_name)
+    import tempfile
+    import synthetic_clients
+    synthetic_clients.install({service: resource_count})
+    import utils
+
+    with tempfile.TemporaryDirectory() as output_folder_name:
+        sys.argv = ['account_analyser.py', '-s', service, '-r', 'us-west-2', '-o', output_folder_name + '/', '--truncate-output', '--log-level', 'CRITICAL']
+        configure_start = time.perf_counter()
+        utils.get_config_info()
+        configured = time.perf_counter()
+        account_analyser.AccountAnalyser().run()
+        done = time.perf_counter()
+
+    print(json.dumps({
+        'import_in_ms': round((imported - start) * 1000, 1),
+        'config_in_ms': round((configured - configure_start) * 1000, 1),
+        'run_in_ms': round((done - configured) * 1000, 1),
+        'module_count': len(sys.modules),
+        'analyser_modules': sorted(name for name in sys.modules if name.startswith('service_specific_analysers.'))
+    }))
+
+def get_process_time_in_ms(command):
+    import subprocess
+    start = time.perf_counter()
+    completed = subprocess.run(command, capture_output = True, text = True, check = True)
+    return (time.perf_counter() - start) * 1000, completed.stdout
+
+def summarise(values):
+    import statistics
+    return {'median': round(statistics.median(values), 1), 'min': round(min(values), 1)}
+
+def get_git_commit():
+    import subprocess
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = benchmarks_folder_name, capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    import argparse
+    import datetime
+    import platform
+
+    parser = argparse.ArgumentParser(description = 'Benchmark the cold start of a single service run against a synthetic account')
+    parser.add_argument('-s', '--service', default = 'lambda',
+                        help = "Service of the run. Defaults to lambda")
+    parser.add_argument('--resource-count', type = int, default = 10, dest = 'resource_count',
+                        help = "Number of resources of the service in the synthetic account. Defaults to 10, so that the run is mostly startup")
+    parser.add_argument('--runs', type = int, default = 10,
+                        help = "Number of cold starts. Defaults to 10")
+    parser.add_argument('-o', '--output', default = 'startup_benchmark_results.json', dest = 'output_file_name',
+                        help = "File the results are written to. Defaults to startup_benchmark_results.json")
+    parser.add_argument('--baseline', dest = 'baseline_file_name',
+                        help = "Results file of an earlier run to compare the results with")
+    args = parser.parse_args()
+
+    phases = {'interpreter_in_ms': [], 'process_in_ms': [], 'import_in_ms': [], 'config_in_ms': [], 'run_in_ms': []}
+    for i in range(args.runs):
+        #The bare interpreter, for reference
+        phases['interpreter_in_ms'].append(get_process_time_in_ms([sys.executable, '-c', 'pass'])[0])
+        process_in_ms, output = get_process_time_in_ms([sys.executable, os.path.abspath(__file__), '--cold-start', args.service, str(args.resource_count)])
+        measurements = json.loads(output.splitlines()[-1])
+        phases['process_in_ms'].append(process_in_ms)
+        for phase in ('import_in_ms', 'config_in_ms', 'run_in_ms'):
+            phases[phase].append(measurements[phase])
+
+    results = {
+        'created_at': datetime.datetime.now().astimezone().isoformat(),
+        'git_commit': get_git_commit(),
+        'python_version': platform.python_version(),
+        'platform': platform.platform(),
+        'service': args.service,
+        'resource_count': args.resource_count,
+        'runs': args.runs,
+        'module_count': measurements['module_count'],
+        'analyser_modules': measurements['analyser_modules'],
+        'phases': {phase: summarise(values) for phase, values in phases.items()}
+    }
+
+    print(f"{'':<20} {'median ms':>10} {'min ms':>10}")
+    for phase, summary in results['phases'].items():
+        print(f"{phase:<20} {summary['median']:>10.1f} {summary['min']:>10.1f}")
+    print(f"{results['module_count']} modules loaded, of which {len(results['analyser_modules'])} analyser module(s): {results['analyser_modules']}")
+
+    with open(args.output_file_name, 'w') as output_file:
+        json.dump(results, output_file, indent = 2)
+    print(f"\nResults written to {args.output_file_name}")
+
+    if args.baseline_file_name:
+        with open(args.baseline_file_name) as baseline_file:
+            baseline_results = json.load(baseline_file)
+        print(f"\nCompared with {baseline_results.get('git_commit') or 'the baseline'} (median ms):")
+        for phase, summary in results['phases'].items():
+            baseline = baseline_results['phases'].get(phase)
+            if baseline:
+                print(f"{phase:<20} {baseline['median']:>10.1f} -> {summary['median']:>10.1f} ({summary['median'] - baseline['median']:+.1f})")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--cold-start':
+        run_cold_start(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,74 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+#Serves the API calls of the analysers from synthetic_data instead of AWS.
+#The clients are the real botocore clients of the client pool, so the parameters are validated and serialised and the calls go through
+#invoke_aws_api, the rate limiter and the event hooks as usual. Only the HTTP request is replaced: like botocore's Stubber, a handler
+#of the before-call event returns the response, so nothing is signed or sent.
+
+import os
+import functools
+import threading
+import collections
+import botocore.awsrequest
+import utils
+import synthetic_data
+
+#Number of calls served, keyed by (service, operation)
+call_counts = collections.Counter()
+call_counts_lock = threading.Lock()
+
+regions = {}
+regions_lock = threading.Lock()
+resource_counts = dict(synthetic_data.default_resource_counts)
+
+def get_synthetic_region(region):
+    with regions_lock:
+        if region not in regions:
+            regions[region] = synthetic_data.SyntheticRegion(region, resource_counts)
+        return regions[region]
+
+#The parameters of the call as passed by the caller. The before-call event only gets the serialised request.
+def save_params(params, context, **kwargs):
+    context['synthetic_params'] = params
+
+def get_synthetic_response(region, model, context, **kwargs):
+    service_name = model.service_model.service_name
+    with call_counts_lock:
+        call_counts[(service_name, model.name)] = call_counts[(service_name, model.name)] + 1
+
+    response = get_synthetic_region(region).get_response(service_name, model.name, context['synthetic_params'])
+    if response is None:
+        error = {'Error': {'Code': 'UnsupportedOperation', 'Message': f"There is no synthetic data for {service_name}.{model.name}"}}
+        return (botocore.awsrequest.AWSResponse(None, 400, {}, None), error)
+
+    response['ResponseMetadata'] = {'HTTPStatusCode': 200, 'HTTPHeaders': {}, 'RetryAttempts': 0}
+    return (botocore.awsrequest.AWSResponse(None, 200, {}, None), response)
+
+class SyntheticClientPool(utils.ClientPool):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stubbed_clients = set()
+
+    def get_client(self, service_name, region_name, account_id):
+        client = super().get_client(service_name, region_name, account_id)
+        if id(client) not in self.stubbed_clients:
+            with self.lock:
+                if id(client) not in self.stubbed_clients:
+                    client.meta.events.register('before-parameter-build.*.*', save_params)
+                    client.meta.events.register('before-call.*.*', functools.partial(get_synthetic_response, client.meta.region_name))
+                    self.stubbed_clients.add(id(client))
+        return client
+
+#Must be called before utils.get_config_info, which builds the client pool and checks the credentials
+def install(counts = None):
+    if counts:
+        resource_counts.update(counts)
+    #Dummy credentials, so that botocore does not look for real ones. They are never used to sign anything.
+    os.environ['AWS_ACCESS_KEY_ID'] = 'synthetic'
+    os.environ['AWS_SECRET_ACCESS_KEY'] = 'synthetic'
+    os.environ['AWS_EC2_METADATA_DISABLED'] = 'true'
+    os.environ.pop('AWS_PROFILE', None)
+    utils.ClientPool = SyntheticClientPool
+    utils.check_aws_credentials = lambda: synthetic_data.account_id
@@ -0,0 +1,350 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+#Synthetic responses of the describe/list APIs that the service analysers call, for an account of any size.
+#Nothing is generated up front: every page is built from the index of its first item when it is asked for, so the memory used
+#by the benchmark itself does not grow with the number of resources and does not hide the memory used by the analysers.
+#The resources are varied (single AZ and multi AZ, in and out of a VPC, etc.) so that every rule of an analyser is exercised.
+
+import utils
+
+account_id = '111122223333'
+
+#Number of top level resources of each service in each region
+default_resource_counts = {
+    'lambda': 100000,
+    'elasticache': 10000, #Replication groups. There are as many cache clusters that are not in a replication group
+    'globalaccelerator': 200, #Accelerators, each with listeners_per_accelerator * endpoint_groups_per_listener endpoint groups
+    'vpce': 10000,
+    'docdb': 2000,
+    'rds': 10000, #DB instances. There are a tenth as many DB clusters
+    'dms': 2000, #Replication instances, each with two replication tasks
+    'sgw': 2000,
+    'efs': 10000,
+    'opensearch': 2000,
+    'fsx': 5000,
+    'dax': 2000,
+    'memorydb': 2000,
+    'dx': 1000, #Virtual interfaces. There are a tenth as many connections
+    'cloudhsm': 500,
+    'redshift': 5000
+}
+
+listeners_per_accelerator = 4
+endpoint_groups_per_listener = 8
+endpoints_per_endpoint_group = 5
+node_groups_per_replication_group = 10
+vpc_count = 50
+subnets_per_vpc = 6 #Two in each AZ
+
+#Number of items in a page, as returned by the real APIs when the caller does not ask for a page size
+default_page_size = 100
+page_sizes = {
+    ('lambda', 'ListFunctions'): 50,
+    ('ec2', 'DescribeVpcEndpoints'): 1000,
+    ('ec2', 'DescribeInstances'): 1000,
+    ('globalaccelerator', 'ListAccelerators'): 10,
+    ('globalaccelerator', 'ListListeners'): 10,
+    ('globalaccelerator', 'ListEndpointGroups'): 10,
+    ('cloudhsmv2', 'DescribeClusters'): 25,
+    ('opensearch', 'ListDomainNames'): None, #Not paginated
+    ('opensearch', 'DescribeDomains'): None,
+    ('directconnect', 'DescribeConnections'): None,
+    ('directconnect', 'DescribeVirtualInterfaces'): None
+}
+
+#Request parameters with which the caller asks for a page size
+limit_parameter_names = ['MaxItems', 'MaxResults', 'MaxRecords', 'maxResults', 'Limit']
+
+azs = ['a', 'b', 'c']
+
+def get_az(region, index):
+    return f"{region}{azs[index % len(azs)]}"
+
+def get_subnet_id(index):
+    return f"subnet-{index % (vpc_count * subnets_per_vpc):017x}"
+
+#Subnet ids of a resource with subnet_count subnets, each in the AZ after the previous one, or all in the same AZ
+def get_subnet_ids(index, subnet_count, same_az = False):
+    return [get_subnet_id(index + offset * (len(azs) if same_az else 1)) for offset in range(subnet_count)]
+
+#Lists of the resources of one region. Each item_* method builds the item at the given index of a list.
+class SyntheticRegion():
+
+    def __init__(self, region, resource_counts):
+        self.region = region
+        self.counts = resource_counts
+        self.arn_prefix = f"arn:aws:{{}}:{region}:{account_id}"
+
+        #Top level member of the response and (item count, item builder) of each list API, keyed by (service, operation)
+        self.lists = {
+            ('lambda', 'ListFunctions'): ('Functions', self.counts['lambda'], self.item_lambda_function),
+            ('ec2', 'DescribeVpcEndpoints'): ('VpcEndpoints', self.counts['vpce'], self.item_vpc_endpoint),
+            ('ec2', 'DescribeSubnets'): ('Subnets', vpc_count * subnets_per_vpc, self.item_subnet),
+            ('docdb', 'DescribeDBClusters'): ('DBClusters', self.counts['docdb'], self.item_docdb_cluster),
+            ('rds', 'DescribeDBInstances'): ('DBInstances', self.counts['rds'], self.item_db_instance),
+            ('rds', 'DescribeDBClusters'): self.describe_db_clusters,
+            ('dms', 'DescribeReplicationInstances'): ('ReplicationInstances', self.counts['dms'], self.item_replication_instance),
+            ('dms', 'DescribeReplicationTasks'): ('ReplicationTasks', self.counts['dms'] * 2, self.item_replication_task),
+            ('storagegateway', 'ListGateways'): ('Gateways', self.counts['sgw'], self.item_gateway),
+            ('efs', 'DescribeFileSystems'): ('FileSystems', self.counts['efs'], self.item_efs_file_system),
+            ('opensearch', 'ListDomainNames'): ('DomainNames', self.counts['opensearch'], self.item_domain_name),
+            ('fsx', 'DescribeFileSystems'): ('FileSystems', self.counts['fsx'], self.item_fsx_file_system),
+            ('elasticache', 'DescribeCacheClusters'): ('CacheClusters', self.counts['elasticache'], self.item_cache_cluster),
+            ('elasticache', 'DescribeReplicationGroups'): ('ReplicationGroups', self.counts['elasticache'], self.item_replication_group),
+            ('dax', 'DescribeClusters'): ('Clusters', self.counts['dax'], self.item_dax_cluster),
+            ('globalaccelerator', 'ListAccelerators'): ('Accelerators', self.counts['globalaccelerator'], self.item_accelerator),
+            ('memorydb', 'DescribeClusters'): ('Clusters', self.counts['memorydb'], self.item_memorydb_cluster),
+            ('directconnect', 'DescribeConnections'): ('connections', max(1, self.counts['dx'] // 10), self.item_dx_connection),
+            ('directconnect', 'DescribeVirtualInterfaces'): ('virtualInterfaces', self.counts['dx'], self.item_virtual_interface),
+            ('cloudhsmv2', 'DescribeClusters'): ('Clusters', self.counts['cloudhsm'], self.item_hsm_cluster),
+            ('redshift', 'DescribeClusters'): ('Clusters', self.counts['redshift'], self.item_redshift_cluster)
+        }
+
+        #APIs whose response depends on the resources named in the request, keyed by (service, operation)
+        self.lookups = {
+            ('opensearch', 'DescribeDomains'): self.describe_domains,
+            ('globalaccelerator', 'ListListeners'): self.list_listeners,
+            ('globalaccelerator', 'ListEndpointGroups'): self.list_endpoint_groups,
+            ('ec2', 'DescribeInstances'): self.describe_instances,
+            ('ec2', 'DescribeRegions'): self.describe_regions,
+            ('organizations', 'DescribeAccount'): self.describe_account,
+            ('organizations', 'DescribeOrganization'): self.describe_organization
+        }
+
+    #Returns the response to the call, or None if there is no synthetic data for the API
+    def get_response(self, service_name, operation_name, params):
+        key = (service_name, operation_name)
+        if key in self.lookups:
+            top_level_member, items = self.lookups[key](params)
+            if not isinstance(items, list):
+                return {top_level_member: items}
+            return self.get_page(service_name, operation_name, params, top_level_member, len(items), lambda index: items[index])
+        if key in self.lists:
+            top_level_member, item_count, item_builder = self.lists[key](params) if callable(self.lists[key]) else self.lists[key]
+            return self.get_page(service_name, operation_name, params, top_level_member, item_count, item_builder)
+        return None
+
+    #Builds the page that starts at the index carried by the pagination token of the request
+    def get_page(self, service_name, operation_name, params, top_level_member, item_count, item_builder):
+        page_size = page_sizes.get((service_name, operation_name), default_page_size)
+        if page_size is None:
+            return {top_level_member: [item_builder(index) for index in range(item_count)]}
+
+        for limit_parameter_name in limit_parameter_names:
+            if limit_parameter_name in params:
+                page_size = params[limit_parameter_name]
+
+        input_token, output_token = utils.get_pagination_tokens(service_name, operation_name)
+        start = int(params.get(input_token) or 0)
+        end = min(item_count, start + page_size)
+        response = {top_level_member: [item_builder(index) for index in range(start, end)]}
+        if end < item_count:
+            response[output_token] = str(end)
+        return response
+
+    def item_lambda_function(self, index):
+        function = {'FunctionName': f"function-{index:06d}",
+                    'FunctionArn': f"{self.arn_prefix.format('lambda')}:function:function-{index:06d}"}
+        if index % 4 != 0: #A quarter of the functions are not in a VPC
+            subnet_count = 1 if index % 4 == 1 else 2
+            function['VpcConfig'] = {'VpcId': f"vpc-{index % 50:017x}",
+                                     'SubnetIds': get_subnet_ids(index, subnet_count, same_az = index % 8 == 2), #Some in two subnets of the same AZ
+                                     'SecurityGroupIds': []}
+        return function
+
+    def item_subnet(self, index):
+        return {'SubnetId': get_subnet_id(index),
+                'VpcId': f"vpc-{index // subnets_per_vpc:017x}",
+                'AvailabilityZone': get_az(self.region, index),
+                'AvailabilityZoneId': f"{self.region}-az{index % len(azs) + 1}",
+                'CidrBlock': f"10.{index // subnets_per_vpc}.{index % subnets_per_vpc}.0/24"}
+
+    def item_vpc_endpoint(self, index):
+        return {'VpcEndpointId': f"vpce-{index:017x}",
+                'VpcEndpointType': 'Interface',
+                'VpcId': f"vpc-{index % 50:017x}",
+                'ServiceName': f"com.amazonaws.{self.region}.service{index % 20}",
+                'SubnetIds': get_subnet_ids(index, 1 + index % 3),
+                'Tags': [{'Key': 'Name', 'Value': f"endpoint-{index:06d}"}] if index % 2 else []}
+
+    def item_docdb_cluster(self, index):
+        return {'DBClusterIdentifier': f"docdb-{index:06d}",
+                'DBClusterArn': f"{self.arn_prefix.format('rds')}:cluster:docdb-{index:06d}",
+                'DbClusterResourceId': f"cluster-docdb{index:06d}",
+                'Engine': 'docdb',
+                'MultiAZ': index % 2 == 0}
+
+    def item_db_instance(self, index):
+        db_instance = {'DBInstanceIdentifier': f"database-{index:06d}",
+                       'DBInstanceArn': f"{self.arn_prefix.format('rds')}:db:database-{index:06d}",
+                       'Engine': ['mysql', 'postgres', 'aurora-mysql', 'aurora-postgresql', 'docdb'][index % 5],
+                       'MultiAZ': index % 3 == 0}
+        if db_instance['Engine'] in ['aurora-mysql', 'aurora-postgresql', 'docdb']:
+            db_instance['DBClusterIdentifier'] = f"cluster-{(index // 10):06d}"
+        return db_instance
+
+    #The RDS API lists the clusters of all the RDS family engines, DocumentDB included, unless they are filtered on engine
+    def describe_db_clusters(self, params):
+        engine_filters = [filter['Values'] for filter in params.get('Filters', []) if filter['Name'] == 'engine']
+        if engine_filters == [['docdb']]:
+            return ('DBClusters', self.counts['docdb'], self.item_docdb_cluster)
+        rds_cluster_count = self.counts['rds'] // 10
+        return ('DBClusters', rds_cluster_count + self.counts['docdb'],
+                lambda index: self.item_db_cluster(index) if index < rds_cluster_count else self.item_docdb_cluster(index - rds_cluster_count))
+
+    def item_db_cluster(self, index):
+        return {'DBClusterIdentifier': f"cluster-{index:06d}",
+                'DBClusterArn': f"{self.arn_prefix.format('rds')}:cluster:cluster-{index:06d}",
+                'DbClusterResourceId': f"cluster-rds{index:06d}",
+                'Engine': ['aurora-mysql', 'aurora-postgresql', 'mysql', 'neptune'][index % 4],
+                'MultiAZ': index % 2 == 0}
+
+    def item_replication_instance(self, index):
+        replication_instance = {'ReplicationInstanceIdentifier': f"replication-{index:06d}",
+                                'ReplicationInstanceArn': f"{self.arn_prefix.format('dms')}:rep:replication-{index:06d}",
+                                'MultiAZ': index % 2 == 0,
+                                'AvailabilityZone': get_az(self.region, index)}
+        if replication_instance['MultiAZ']:
+            replication_instance['SecondaryAvailabilityZone'] = get_az(self.region, index + 1)
+        return replication_instance
+
+    def item_replication_task(self, index):
+        return {'ReplicationTaskIdentifier': f"task-{index:06d}",
+                'ReplicationTaskArn': f"{self.arn_prefix.format('dms')}:task:task-{index:06d}",
+                'ReplicationInstanceArn': f"{self.arn_prefix.format('dms')}:rep:replication-{(index // 2):06d}"}
+
+    def item_gateway(self, index):
+        gateway = {'GatewayId': f"sgw-{index:08X}",
+                   'GatewayName': f"gateway-{index:06d}",
+                   'GatewayARN': f"{self.arn_prefix.format('storagegateway')}:gateway/sgw-{index:08X}"}
+        if index % 2: #The other half are on premises
+            gateway['Ec2InstanceRegion'] = self.region
+        return gateway
+
+    def item_efs_file_system(self, index):
+        file_system = {'FileSystemId': f"fs-{index:017x}",
+                       'FileSystemArn': f"{self.arn_prefix.format('elasticfilesystem')}:file-system/fs-{index:017x}",
+                       'NumberOfMountTargets': index % 4,
+                       'Tags': [{'Key': 'Name', 'Value': f"file-system-{index:06d}"}] if index % 2 else []}
+        if index % 5 == 0: #One Zone file systems
+            file_system['AvailabilityZoneId'] = f"use1-az{index % 3 + 1}"
+            file_system['AvailabilityZoneName'] = get_az(self.region, index)
+        return file_system
+
+    def item_domain_name(self, index):
+        return {'DomainName': f"domain-{index:06d}", 'EngineType': 'OpenSearch'}
+
+    def item_fsx_file_system(self, index):
+        return {'FileSystemId': f"fs-{index:017x}",
+                'ResourceARN': f"{self.arn_prefix.format('fsx')}:file-system/fs-{index:017x}",
+                'FileSystemType': ['WINDOWS', 'LUSTRE', 'ONTAP', 'OPENZFS'][index % 4],
+                'SubnetIds': get_subnet_ids(index, 1 + (index // 4) % 2),
+                'Tags': [{'Key': 'Name', 'Value': f"file-system-{index:06d}"}] if index % 2 else []}
+
+    def item_cache_cluster(self, index):
+        return {'CacheClusterId': f"memcached-{index:06d}",
+                'ARN': f"{self.arn_prefix.format('elasticache')}:cluster:memcached-{index:06d}",
+                'Engine': 'memcached' if index % 2 else 'redis',
+                'PreferredAvailabilityZone': get_az(self.region, index)}
+
+    def item_replication_group(self, index):
+        node_group_count = 1 if index % 2 else node_groups_per_replication_group #Cluster mode disabled and enabled
+        if index % 7 == 3:
+            node_group_count = 0
+        return {'ReplicationGroupId': f"replication-group-{index:06d}",
+                'ARN': f"{self.arn_prefix.format('elasticache')}:replicationgroup:replication-group-{index:06d}",
+                'AutomaticFailover': 'enabled' if index % 3 else 'disabled',
+                'MultiAZ': 'enabled' if index % 4 == 0 else 'disabled',
+                'NodeGroups': [{'NodeGroupId': f"{node_group:04d}",
+                                'NodeGroupMembers': [{'CacheClusterId': f"replication-group-{index:06d}-{node_group:04d}-{member:03d}",
+                                                      'PreferredAvailabilityZone': get_az(self.region, index + (node_group + member if index % 5 else 0))}
+                                                     for member in range(1 if index % 7 == 5 and node_group == node_group_count - 1 else 3)]}
+                               for node_group in range(node_group_count)]}
+
+    def item_dax_cluster(self, index):
+        return {'ClusterName': f"dax-{index:06d}",
+                'ClusterArn': f"{self.arn_prefix.format('dax')}:cache/dax-{index:06d}",
+                'Nodes': [{'NodeId': f"dax-{index:06d}-{node}", 'AvailabilityZone': get_az(self.region, node if index % 2 else 0)}
+                          for node in range(1 + index % 3)]}
+
+    def item_memorydb_cluster(self, index):
+        return {'Name': f"memorydb-{index:06d}",
+                'ARN': f"{self.arn_prefix.format('memorydb')}:cluster/memorydb-{index:06d}",
+                'Shards': [{'Name': f"{shard:04d}",
+                            'Nodes': [{'Name': f"memorydb-{index:06d}-{shard:04d}-{node:03d}", 'AvailabilityZone': get_az(self.region, node)}
+                                      for node in range(1 + (index + shard) % 3)]}
+                           for shard in range(1 + index % 4)]}
+
+    def item_dx_connection(self, index):
+        return {'connectionId': f"dxcon-{index:08x}", 'location': f"location-{index % 7}"}
+
+    def item_virtual_interface(self, index):
+        connection_count = max(1, self.counts['dx'] // 10)
+        return {'virtualInterfaceId': f"dxvif-{index:08x}",
+                'connectionId': f"dxcon-{(index % connection_count):08x}",
+                'virtualGatewayId': f"vgw-{(index // 2):017x}"}
+
+    def item_hsm_cluster(self, index):
+        return {'ClusterId': f"cluster-{index:011x}",
+                'Hsms': [{'HsmId': f"hsm-{index:011x}{hsm}", 'AvailabilityZone': get_az(self.region, hsm if index % 2 else 0)}
+                         for hsm in range(1 + index % 3)]}
+
+    def item_redshift_cluster(self, index):
+        return {'ClusterIdentifier': f"redshift-{index:06d}",
+                'MultiAZ': 'Enabled' if index % 3 == 0 else 'Disabled'}
+
+    def get_accelerator_arn(self, index):
+        return f"arn:aws:globalaccelerator::{account_id}:accelerator/{index:08x}"
+
+    def item_accelerator(self, index):
+        return {'AcceleratorArn': self.get_accelerator_arn(index),
+                'Name': f"accelerator-{index:06d}",
+                'DnsName': f"a{index:015x}.awsglobalaccelerator.com"}
+
+    def list_listeners(self, params):
+        accelerator_arn = params['AcceleratorArn']
+        return 'Listeners', [{'ListenerArn': f"{accelerator_arn}/listener/{listener:04x}"} for listener in range(listeners_per_accelerator)]
+
+    #One accelerator in five has endpoint groups in two regions. The endpoints of the others are EC2 instances in one region.
+    #The id of an instance ends with the index of its AZ, so that describe_instances can place it.
+    def list_endpoint_groups(self, params):
+        listener_arn = params['ListenerArn']
+        accelerator_index = int(listener_arn.split('/')[1], 16)
+        listener = int(listener_arn.split('/')[3], 16)
+        endpoint_groups = []
+        for endpoint_group in range(endpoint_groups_per_listener):
+            endpoint_group_index = listener * endpoint_groups_per_listener + endpoint_group
+            in_other_region = accelerator_index % 5 == 0 and endpoint_group_index == 1
+            single_az = accelerator_index % 3 == 0
+            endpoint_groups.append({'EndpointGroupArn': f"{listener_arn}/endpoint-group/{endpoint_group:04x}",
+                                    'EndpointGroupRegion': 'eu-west-1' if in_other_region else self.region,
+                                    'EndpointDescriptions': [{'EndpointId': f"i-{accelerator_index:06x}{endpoint_group_index:04x}{endpoint:03x}"
+                                                                            f"{0 if single_az else endpoint % len(azs)}"}
+                                                             for endpoint in range(endpoints_per_endpoint_group)]})
+        return 'EndpointGroups', endpoint_groups
+
+    def describe_instances(self, params):
+        return 'Reservations', [{'ReservationId': f"r-{instance_id[2:]}",
+                                 'Instances': [{'InstanceId': instance_id,
+                                                'Placement': {'AvailabilityZone': get_az(self.region, int(instance_id[-1]))}}]}
+                                for instance_id in params.get('InstanceIds', [])]
+
+    def describe_domains(self, params):
+        domains = []
+        for domain_name in params['DomainNames']:
+            index = int(domain_name.split('-')[1])
+            domains.append({'DomainId': f"{account_id}/{domain_name}",
+                            'DomainName': domain_name,
+                            'ARN': f"{self.arn_prefix.format('es')}:domain/{domain_name}",
+                            'VPCOptions': {'AvailabilityZones': [get_az(self.region, az) for az in range(1 + index % 3)]}})
+        return 'DomainStatusList', domains
+
+    def describe_regions(self, params):
+        return 'Regions', [{'RegionName': region} for region in ['us-east-1', 'us-east-2', 'us-west-1', 'us-west-2', 'eu-west-1', 'ap-southeast-2']]
+
+    def describe_account(self, params):
+        return 'Account', {'Id': params['AccountId'], 'Name': 'benchmark'}
+
+    def describe_organization(self, params):
+        return 'Organization', {'MasterAccountId': account_id}
@@ -1,7 +1,6 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import threading
 import csv
 import time
 import logging
@@ -11,90 +10,94 @@ import botocore
 import datetime
 import utils
 import os
+import io
 
-from service_specific_analysers.vpce_analyser import VPCEAnalyser
-from service_specific_analysers.docdb_analyser import DocDBAnalyser
-from service_specific_analysers.dms_analyser import DMSAnalyser
-from service_specific_analysers.sgw_analyser import SGWAnalyser
-from service_specific_analysers.efs_analyser import EFSAnalyser
-from service_specific_analysers.opensearch_analyser import OpensearchAnalyser
-from service_specific_analysers.fsx_analyser import FSXAnalyser
-from service_specific_analysers.lambda_analyser import LambdaAnalyser
-from service_specific_analysers.elasticache_analyser import ElasticacheAnalyser
-from service_specific_analysers.dax_analyser import DAXAnalyser
-from service_specific_analysers.globalaccelerator_analyser import GlobalAcceleratorAnalyser
-from service_specific_analysers.rds_analyser import RDSAnalyser
-from service_specific_analysers.memorydb_analyser import MemoryDBAnalyser
-from service_specific_analysers.dx_analyser import DXAnalyser
-from service_specific_analysers.cloudhsm_analyser import CloudHSMAnalyser
-from service_specific_analysers.redshift_analyser import RedshiftAnalyser
-
+from scheduler import WorkScheduler, WorkUnit
+from finding import Finding
+from sinks import FindingsPipeline, CsvSink, EventBridgeSink, S3Sink, S3StreamSink, ParquetSink
+from state_store import StateStore
+from checkpoint import CheckpointJournal, CheckpointSink
+from inventory import ResourceInventory, release_collections
+from availability import AvailabilityCache, is_service_available
+import analyser_registry
 from collections import namedtuple
 
 class AccountAnalyser():
 
-    analyser_classes = {}
-    analyser_classes['vpce'] = VPCEAnalyser
-    analyser_classes['docdb'] = DocDBAnalyser
-    analyser_classes['dms'] = DMSAnalyser
-    analyser_classes['sgw'] = SGWAnalyser
-    analyser_classes['efs'] = EFSAnalyser
-    analyser_classes['opensearch'] = OpensearchAnalyser
-    analyser_classes['fsx'] = FSXAnalyser
-    analyser_classes['lambda'] = LambdaAnalyser
-    analyser_classes['elasticache'] = ElasticacheAnalyser
-    analyser_classes['dax'] = DAXAnalyser
-    analyser_classes['globalaccelerator'] = GlobalAcceleratorAnalyser
-    analyser_classes['rds'] = RDSAnalyser
-    analyser_classes['memorydb'] = MemoryDBAnalyser
-    analyser_classes['dx'] = DXAnalyser
-    analyser_classes['cloudhsm'] = CloudHSMAnalyser
-    analyser_classes['redshift'] = RedshiftAnalyser
-
-    def __init__ (self):
-        #self.services = services
-        #self.regions = regions
-        self.lock = threading.Lock()
-        self.threads = []
-        self.account_name = ''
-        self.payer_account_id = ''
-        self.payer_account_name = ''
-        self.run_report = []
-
-        utils.get_config_info()
-
-        self.account_id = utils.config_info.account_id
-        self.thread_limiter = threading.BoundedSemaphore(utils.config_info.max_concurrent_threads)
+    #Columns of the findings output file
+    keys = Finding.keys
 
-        #Write out an empty csv file with the headers
-        self.keys = [
-                        'service',
-                        'region',
+    #Columns of the run report. The columns after runtime_in_seconds are filled in only by some of the records, for example the one for the Eventbridge publisher.
+    run_report_keys = [
                         'account_id',
-                        'account_name',
-                        'payer_account_id',
-                        'payer_account_name',
-                        'resource_arn',
-                        'resource_name',
-                        'resource_id',
-                        'potential_issue',
-                        'engine', #Used for Elasticache, Memory DB and RDS
-                        'message',
-                        'timestamp'
+                        'region',
+                        'service',
+                        'result',
+                        'error_message',
+                        'start_time',
+                        'end_time',
+                        'runtime_in_seconds',
+                        'record_count',
+                        'records_per_second',
+                        'average_latency_in_ms',
+                        'p95_latency_in_ms',
+                        'skipped_resource_count',
+                        'throttled_call_count',
+                        'throttle_wait_in_seconds',
+                        'api_call_count',
+                        'page_count',
+                        'p50_latency_in_ms',
+                        'p99_latency_in_ms'
                     ]
 
-        self.get_account_level_information()
+    #account_id, account_name, payer_account_id and payer_account_name are passed in when the account level information is already known,
+    #for example when the account is analysed as part of an organization wide scan. Otherwise they are looked up for the account of the credentials in use.
+    #output_file_full_path is passed in when the findings for this account are to be written to a file of its own, which the caller will merge.
+    def __init__ (self, account_id = None, account_name = '', payer_account_id = 'N/A', payer_account_name = 'N/A', output_file_full_path = None):
+        self.scheduler = None
+        self.findings_pipeline = None
+        self.state_store = None
+        self.availability_cache = None
+        self.inventory = None
+        self.run_report = []
+        self.checkpoint_journal = CheckpointJournal(utils.config_info.checkpoint_file_name) if utils.config_info.checkpoint else None
+        self.checkpointed_units = set() #(region, service key) of the work units whose findings are taken from the checkpoint
 
-        curr_time = datetime.datetime.now()
-        tm = curr_time.strftime("%Y_%m_%d")
+        if account_id:
+            self.account_id = account_id
+            self.account_name = account_name
+            self.payer_account_id = payer_account_id
+            self.payer_account_name = payer_account_name
+        else:
+            self.account_id = utils.config_info.account_id
+            self.account_name = ''
+            self.payer_account_id = ''
+            self.payer_account_name = ''
+            self.get_account_level_information()
 
+        if output_file_full_path:
+            self.output_file_full_path = output_file_full_path
+            self.run_report_file_full_path = None
+            self.create_or_truncate_file = True
+            self.write_output_file_header()
         #Build output file names, either with or without the account id based on the config information
-        if utils.config_info.filename_with_accountid:
-            self.output_file_name = f"Fault_Tolerance_Findings_{self.account_id}_{self.account_name}_{tm}.csv"
-            self.run_report_file_name = f"Fault_Tolerance_Findings_{self.account_id}_{self.account_name}_{tm}_run_report.csv"
+        elif utils.config_info.filename_with_accountid:
+            self.init_output_files(f"Fault_Tolerance_Findings_{self.account_id}_{self.account_name}")
         else:
-            self.output_file_name = f"Fault_Tolerance_Findings_{tm}.csv"
-            self.run_report_file_name = f"Fault_Tolerance_Findings_{tm}_run_report.csv"
+            self.init_output_files("Fault_Tolerance_Findings")
+
+    def init_output_files(self, file_name_prefix):
+        curr_time = datetime.datetime.now()
+        tm = curr_time.strftime("%Y_%m_%d")
+
+        self.output_file_name = f"{file_name_prefix}_{tm}.csv"
+        self.run_report_file_name = f"{file_name_prefix}_{tm}_run_report.csv"
+
+        #A resumed run carries on with the files of the interrupted run, even if that was started on an earlier day
+        run_info = self.get_resumed_run_info()
+        if run_info:
+            self.output_file_name = run_info['output_file_name']
+            self.run_report_file_name = run_info['run_report_file_name']
 
         self.output_file_full_path = f"{utils.config_info.output_folder_name}{self.output_file_name}"
         self.run_report_file_full_path = f"{utils.config_info.output_folder_name}{self.run_report_file_name}"
@@ -107,31 +110,113 @@ class AccountAnalyser():
             if not os.path.isfile(self.output_file_full_path):
                 self.create_or_truncate_file = True #If truncate mode is set to False but file does not already exist, then create the file
 
+        if run_info and os.path.isfile(self.output_file_full_path):
+            #The findings written by the interrupted run are dropped. They are written again from the checkpoint, or by the work units run again.
+            self.create_or_truncate_file = run_info['create_or_truncate_file']
+            os.truncate(self.output_file_full_path, run_info['output_offset'])
+            if os.path.isfile(self.run_report_file_full_path): #Written by the resumed run itself, if it was resumed before
+                os.truncate(self.run_report_file_full_path, run_info['run_report_offset'])
+        elif not utils.config_info.no_local_output:
+            self.write_output_file_header()
+
+        if self.checkpoint_journal and not run_info:
+            self.checkpoint_journal.start_run({
+                                                'output_file_name' : self.output_file_name,
+                                                'run_report_file_name' : self.run_report_file_name,
+                                                'create_or_truncate_file' : self.create_or_truncate_file,
+                                                'output_offset' : os.path.getsize(self.output_file_full_path) if os.path.isfile(self.output_file_full_path) else 0,
+                                                'run_report_offset' : os.path.getsize(self.run_report_file_full_path) if os.path.isfile(self.run_report_file_full_path) else 0
+                                            })
+
+    #Returns the run_info of the checkpointed run, if this run resumes it
+    def get_resumed_run_info(self):
+        if not utils.config_info.resume:
+            return None
+        run_info = self.checkpoint_journal.get_run_info()
+        if not run_info:
+            logging.warning(f"There is no run to resume in {utils.config_info.checkpoint_file_name}. All the service+regions will be analysed")
+        return run_info
+
+    def write_output_file_header(self):
         #If the folder does not exist, create it.
-        os.makedirs(os.path.dirname(utils.config_info.output_folder_name), exist_ok=True)
+        os.makedirs(os.path.dirname(self.output_file_full_path), exist_ok=True)
+
+        if utils.config_info.output_format == 'parquet': #The Parquet files are written per work unit, so there is no findings csv file
+            return
 
         if self.create_or_truncate_file: #If create or truncate file is true then open the file in 'w' mode and write the header
             with open(self.output_file_full_path, 'w', newline='') as output_file:
                 dict_writer = csv.DictWriter(output_file, self.keys)
                 dict_writer.writeheader()
 
+    #Analyses the account and writes out the run report. The run report is then pushed to the S3 bucket, if one is provided.
+    #The findings file is pushed by the S3 sink of the findings pipeline.
+    def run(self):
+        self.get_findings()
+
+        if utils.config_info.no_local_output:
+            self.put_run_report_to_s3()
+            return
+
+        self.write_run_report()
+
+        if utils.config_info.bucket_name:
+            self.push_file_to_s3(self.run_report_file_full_path, self.run_report_file_name)
+
+    #When this account is analysed as part of a larger scan (no run report file of its own), the findings file is a part file
+    #that the caller merges and pushes to S3, so the S3 sinks are not used. Parquet files are never merged, so they are always pushed by the sink.
+    def get_sinks(self):
+        sinks = []
+        if utils.config_info.output_format == 'parquet':
+            sinks.append(ParquetSink(utils.config_info.output_folder_name, utils.config_info.bucket_name))
+        else:
+            is_part_file = not self.run_report_file_full_path
+            if is_part_file or not utils.config_info.no_local_output:
+                sinks.append(CsvSink(self.output_file_full_path))
+            if utils.config_info.bucket_name and not is_part_file:
+                if utils.config_info.stream_to_s3:
+                    sinks.append(S3StreamSink(utils.config_info.bucket_name, utils.config_info.output_folder_name+self.output_file_name+".gz"))
+                else:
+                    sinks.append(S3Sink(self.output_file_full_path, utils.config_info.bucket_name, utils.config_info.output_folder_name+self.output_file_name))
+        if utils.config_info.event_bus_arn:
+            sinks.append(EventBridgeSink(utils.config_info.event_bus_arn))
+        if self.checkpoint_journal:
+            sinks.append(CheckpointSink(self.checkpoint_journal))
+        return sinks
+
     def get_findings(self):
         start = datetime.datetime.now().astimezone()
 
-        for region in utils.config_info.regions:
-            for service in utils.config_info.services:
-                analyser = self.analyser_classes[service](account_analyser = self, region = region)        
-                if utils.config_info.single_threaded:
-                    analyser.get_and_write_findings()
-                else:
-                    t = threading.Thread(target = analyser.get_and_write_findings, name = f"{service}+{region}")
-                    self.threads.append(t)
-                    t.start()
+        if utils.config_info.prewarm_connections:
+            self.prewarm_connections()
+
+        #With the single-threaded option the scheduler runs with just one worker
+        max_workers = 1 if utils.config_info.single_threaded else utils.config_info.max_concurrent_threads
+        self.scheduler = WorkScheduler(max_workers = max_workers)
 
-        #If running in multi threaded mode wait for all threads to finish
-        if not utils.config_info.single_threaded:
-            for t in self.threads:
-                t.join()
+        if utils.config_info.incremental:
+            self.state_store = StateStore(utils.config_info.state_file_name)
+
+        self.inventory = ResourceInventory()
+
+        if utils.config_info.skip_empty_units:
+            self.availability_cache = AvailabilityCache(utils.config_info.availability_file_name, utils.config_info.availability_ttl_in_hours)
+
+        self.findings_pipeline = FindingsPipeline(self.get_sinks())
+        try:
+            if utils.config_info.resume:
+                self.replay_checkpointed_units()
+            self.scheduler.run(self.get_work_units())
+        finally:
+            self.findings_pipeline.close() #Waits for all the findings to be written out
+            if self.state_store:
+                self.state_store.close()
+            if self.checkpoint_journal:
+                self.checkpoint_journal.close()
+            if self.availability_cache:
+                self.availability_cache.save()
+
+        self.run_report.extend(self.findings_pipeline.get_run_report_recs(self.account_id))
 
         end = datetime.datetime.now().astimezone()
 
@@ -149,41 +234,118 @@ class AccountAnalyser():
                             )
 
         logging.info(f"Total time taken for the account {self.account_id} is {end-start} seconds")
-        self.write_run_report()
 
-        if utils.config_info.bucket_name:
-            self.push_files_to_s3()
+    #The work units that completed in the interrupted run are not run again. Their findings are written out again from the checkpoint
+    #(as carried forward findings, so they are not published to the event bus again) and their records are added to the run report.
+    def replay_checkpointed_units(self):
+        completed_units = self.checkpoint_journal.get_completed_units(self.account_id)
+        for (region, service), run_report_rec in completed_units.items():
+            if region not in utils.config_info.regions or service not in utils.config_info.services:
+                continue
+            context, finding_recs = self.checkpoint_journal.get_unit_findings(self.account_id, region, service)
+            for finding_rec in finding_recs:
+                self.findings_pipeline.put(finding_rec)
+            self.findings_pipeline.end_unit(context)
+            self.run_report.append(run_report_rec)
+            self.checkpointed_units.add((region, service))
+        logging.info(f"Resuming the account {self.account_id}: {len(self.checkpointed_units)} service+region(s) already completed")
+
+    #Work units are generated lazily so that an analyser object is created only when a worker is about to pick it up.
+    #Work units that cannot find anything are not scheduled at all, and are recorded in the run report as skipped.
+    def get_work_units(self):
+        for region in utils.config_info.regions:
+            for service in utils.config_info.services:
+                if (region, service) in self.checkpointed_units:
+                    release_collections(self, region, service)
+                    continue
+                analyser = analyser_registry.create_analyser(service, self, region)
+                skip_reason = self.get_skip_reason(analyser)
+                if skip_reason:
+                    logging.info(f"Skipping {service}+{region}: {skip_reason}")
+                    self.add_skipped_unit(region, analyser.service, skip_reason)
+                    release_collections(self, region, service)
+                    continue
+                yield WorkUnit(name = f"{service}+{region}", func = analyser.get_and_write_findings)
+
+    #Returns why the work unit of the analyser need not be run, or None if it has to be run
+    def get_skip_reason(self, analyser):
+        if analyser.scope == 'single-region' and analyser.region != analyser.home_region:
+            return f"The service is analysed only in {analyser.home_region}"
+        if analyser.scope == 'global' and analyser.region != utils.config_info.regions[0]:
+            return f"The service is global and is analysed only once, in {utils.config_info.regions[0]}"
+        if analyser.client_names and not is_service_available(analyser.client_names[0], analyser.region):
+            return f"The service is not available in {analyser.region}"
+        if self.availability_cache and self.availability_cache.get(self.account_id, analyser.region, analyser.service) is False:
+            return "No resources found in a recent run"
+        return None
+
+    def add_skipped_unit(self, region, service, reason, account_id = None):
+        now = datetime.datetime.now().astimezone().strftime("%Y_%m_%d_%H_%M_%S%z")
+        run_report_rec = {
+                            'account_id' : account_id if account_id else self.account_id,
+                            'region'  : region,
+                            'service' : service,
+                            'result'  : 'Skipped',
+                            'error_message' : reason,
+                            'start_time' : now,
+                            'end_time' : now,
+                            'runtime_in_seconds' : 0
+                            }
+        self.run_report.append(run_report_rec)
+        return run_report_rec
+
+    def prewarm_connections(self):
+        client_keys = []
+        for region in utils.config_info.regions:
+            for service in utils.config_info.services:
+                analyser = analyser_registry.create_analyser(service, self, region)
+                if self.get_skip_reason(analyser):
+                    continue
+                for client_name in analyser.client_names:
+                    client_keys.append((self.account_id, client_name, region))
+        if utils.config_info.event_bus_arn:
+            client_keys.append((utils.config_info.account_id, "events", utils.parse_arn(utils.config_info.event_bus_arn)['region']))
+        utils.client_pool.prewarm(client_keys, max_workers = utils.config_info.max_concurrent_threads)
 
     def write_run_report(self):
-        run_report_keys = self.run_report[0].keys()
         if self.create_or_truncate_file: #Same behaviour as the findings output file. If a new findings file is created or it is truncated, then create or truncate the run_report too.
             file_open_mode = 'w'
         else:
             file_open_mode = 'a+'
         with open(self.run_report_file_full_path, file_open_mode, newline='') as output_file:
-            dict_writer = csv.DictWriter(output_file, run_report_keys)
+            dict_writer = csv.DictWriter(output_file, self.run_report_keys)
             if self.create_or_truncate_file:
                 dict_writer.writeheader()
             dict_writer.writerows(self.run_report)
 
-    def push_files_to_s3(self):
-        session = utils.get_aws_session(session_name = 'UploadFilesToS3')
-        s3 = session.client("s3")
+    #Writes the run report straight to the bucket, without a local file
+    def put_run_report_to_s3(self):
+        run_report_file = io.StringIO(newline='')
+        dict_writer = csv.DictWriter(run_report_file, self.run_report_keys)
+        dict_writer.writeheader()
+        dict_writer.writerows(self.run_report)
+
+        s3 = utils.get_aws_client("s3")
         try:
-            response = s3.upload_file(self.output_file_full_path, utils.config_info.bucket_name, utils.config_info.output_folder_name+self.output_file_name)
-            logging.info(f"Uploaded output file {utils.config_info.output_folder_name+self.output_file_name} to bucket {utils.config_info.bucket_name}")
- 
-            response = s3.upload_file(self.run_report_file_full_path, utils.config_info.bucket_name, utils.config_info.output_folder_name+self.run_report_file_name)
-            logging.info(f"Uploaded run report file {utils.config_info.output_folder_name+self.output_file_name} to bucket {utils.config_info.bucket_name}")
+            s3.put_object(Bucket = utils.config_info.bucket_name,
+                          Key = utils.config_info.output_folder_name+self.run_report_file_name,
+                          Body = run_report_file.getvalue().encode('utf-8'))
+            logging.info(f"Uploaded run report {utils.config_info.output_folder_name+self.run_report_file_name} to bucket {utils.config_info.bucket_name}")
+        except botocore.exceptions.ClientError as error:
+            logging.error(error)
 
+    def push_file_to_s3(self, file_full_path, file_name):
+        s3 = utils.get_aws_client("s3")
+        try:
+            response = s3.upload_file(file_full_path, utils.config_info.bucket_name, utils.config_info.output_folder_name+file_name, Config = utils.get_s3_transfer_config())
+            logging.info(f"Uploaded file {utils.config_info.output_folder_name+file_name} to bucket {utils.config_info.bucket_name}")
         except botocore.exceptions.ClientError as error:
             logging.error(error)
 
     def get_account_level_information(self):
-        session = utils.get_aws_session(session_name = 'InitialAccountInfoGathering')
-        org = session.client("organizations")
+        org = utils.get_aws_client("organizations")
         try:
-            acct_info = org.describe_account(AccountId = self.account_id)
+            acct_info = utils.invoke_aws_api(org.describe_account, AccountId = self.account_id)
             self.account_name = acct_info["Account"]["Name"]
         except botocore.exceptions.ClientError as error:
             if error.response['Error']['Code'] == 'AWSOrganizationsNotInUseException':
@@ -195,13 +357,27 @@ class AccountAnalyser():
             else:
                 raise error
 
-        org_info = org.describe_organization()
+        org_info = utils.invoke_aws_api(org.describe_organization)
         self.payer_account_id = org_info["Organization"]["MasterAccountId"]
 
-        payer_account_info = org.describe_account(AccountId = self.payer_account_id)
+        payer_account_info = utils.invoke_aws_api(org.describe_account, AccountId = self.payer_account_id)
         self.payer_account_name = payer_account_info["Account"]["Name"]
 
 if __name__ == "__main__":
-    #Create an instance of the Account level analyser and trigger the get_findings function.
-    ara = AccountAnalyser()
-    ara.get_findings()
+    utils.get_config_info()
+
+    if utils.config_info.distributed_role == 'worker':
+        #Imported here as the coordinator and the workers build on the account analyser
+        from distributed import run_worker
+        run_worker()
+    elif utils.config_info.distributed_role == 'coordinator':
+        from distributed import Coordinator
+        Coordinator().run()
+    elif utils.config_info.organization:
+        #Imported here as the organization analyser itself builds on the account analyser
+        from organization_analyser import OrganizationAnalyser
+        OrganizationAnalyser().run()
+    else:
+        #Create an instance of the Account level analyser and trigger the run function.
+        ara = AccountAnalyser()
+        ara.run()
@@ -0,0 +1,91 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import logging
+import importlib
+import threading
+
+#Analysers that ship with the tool, in the order in which their work units are scheduled: service name -> 'module:class' of the analyser.
+#The module of an analyser is imported only when a work unit of its service is about to be scheduled, so a run of one service loads
+#just that analyser.
+analyser_manifest = {
+    'vpce': 'service_specific_analysers.vpce_analyser:VPCEAnalyser',
+    'dms': 'service_specific_analysers.dms_analyser:DMSAnalyser',
+    'docdb': 'service_specific_analysers.docdb_analyser:DocDBAnalyser',
+    'sgw': 'service_specific_analysers.sgw_analyser:SGWAnalyser',
+    'efs': 'service_specific_analysers.efs_analyser:EFSAnalyser',
+    'opensearch': 'service_specific_analysers.opensearch_analyser:OpensearchAnalyser',
+    'fsx': 'service_specific_analysers.fsx_analyser:FSXAnalyser',
+    'lambda': 'service_specific_analysers.lambda_analyser:LambdaAnalyser',
+    'elasticache': 'service_specific_analysers.elasticache_analyser:ElasticacheAnalyser',
+    'dax': 'service_specific_analysers.dax_analyser:DAXAnalyser',
+    'globalaccelerator': 'service_specific_analysers.globalaccelerator_analyser:GlobalAcceleratorAnalyser',
+    'rds': 'service_specific_analysers.rds_analyser:RDSAnalyser',
+    'memorydb': 'service_specific_analysers.memorydb_analyser:MemoryDBAnalyser',
+    'dx': 'service_specific_analysers.dx_analyser:DXAnalyser',
+    'cloudhsm': 'service_specific_analysers.cloudhsm_analyser:CloudHSMAnalyser',
+    'redshift': 'service_specific_analysers.redshift_analyser:RedshiftAnalyser'
+}
+
+#Analysers of other installed packages are entry points of this group, named after their service. For example, in a pyproject.toml:
+#   [project.entry-points."fault_tolerance_analyser.analysers"]
+#   kinesis = "my_package.kinesis_analyser:KinesisAnalyser"
+entry_point_group = 'fault_tolerance_analyser.analysers'
+
+lock = threading.Lock()
+plugin_analysers = None #service name -> 'module:class', read from the entry points the first time they are needed
+analyser_classes = {} #Analyser classes imported so far, keyed by service name
+
+#Reading the entry points scans the metadata of every installed package, so it is done only when a service that is not in the manifest,
+#or the list of all the services, is asked for
+def get_plugin_analysers():
+    global plugin_analysers
+    with lock:
+        if plugin_analysers is None:
+            import importlib.metadata #Imported here as it takes longer to import than the rest of this module
+            entry_points = importlib.metadata.entry_points()
+            if hasattr(entry_points, 'select'):
+                entry_points = entry_points.select(group = entry_point_group)
+            else: #Python 3.9 returns a dict of the entry points of each group
+                entry_points = entry_points.get(entry_point_group, [])
+            plugin_analysers = {}
+            for entry_point in entry_points:
+                if entry_point.name in analyser_manifest:
+                    logging.warning(f"Ignoring the analyser {entry_point.value} as the service {entry_point.name} is analysed by the tool itself")
+                    continue
+                plugin_analysers[entry_point.name] = entry_point.value
+    return plugin_analysers
+
+#All the services, those of the tool first. This is what 'ALL' stands for.
+def get_service_names():
+    return list(analyser_manifest) + list(get_plugin_analysers())
+
+def is_known_service(service):
+    return service in analyser_manifest or service in get_plugin_analysers()
+
+#Imports the module of the analyser of the service the first time the analyser is asked for
+def get_analyser_class(service):
+    analyser_class = analyser_classes.get(service)
+    if analyser_class is None:
+        analyser_path = analyser_manifest.get(service) or get_plugin_analysers().get(service)
+        if not analyser_path:
+            raise KeyError(f"There is no analyser for the service {service}")
+        module_name, _, class_name = analyser_path.partition(':')
+        analyser_class = getattr(importlib.import_module(module_name), class_name)
+        analyser_classes[service] = analyser_class
+    return analyser_class
+
+#Creates the analyser of the service (as named in -s) for a work unit of the region
+def create_analyser(service, account_analyser, region):
+    analyser = get_analyser_class(service)(account_analyser = account_analyser, region = region)
+    analyser.service_key = service
+    return analyser
+
+#The values that -s accepts. Checking a service of the tool does not read the entry points. Listing all of them (for --help) does.
+class ServiceChoices():
+
+    def __contains__(self, service):
+        return service == 'ALL' or is_known_service(service)
+
+    def __iter__(self):
+        return iter(get_service_names() + ['ALL'])
@@ -0,0 +1,92 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import botocore.exceptions
+from throttling import is_throttling_error, is_transient_error
+
+class ReplayCacheMiss(Exception):
+    pass
+
+#On disk cache of AWS API responses, used to record a run and replay it later without calling AWS.
+#Every response (one page of a paginated call, or a single call) is kept in a gzip compressed json file of its own at
+#<cache folder>/<account id>/<region>/<service>/<operation>/<hash of the parameters>.json.gz, so the files of different threads and
+#processes never clash and a run can be inspected or cleaned up per account, region or service.
+#In 'record' mode every call is made (with call(api_method, account_id, params)) and its response, or its ClientError, is saved. Throttling and
+#transient errors are not saved, as the next run would most likely not get them. In 'replay' mode nothing is sent to AWS: responses are
+#read from the cache, and a call that was not recorded, or whose recording is older than the TTL, raises ReplayCacheMiss.
+#Timestamps in the responses are saved as strings, so a replayed response has strings where the live one has datetimes.
+class ApiCache():
+
+    def __init__(self, folder_name, mode, ttl_in_hours):
+        self.folder_name = folder_name
+        self.mode = mode
+        self.ttl_in_seconds = ttl_in_hours * 3600
+
+    def invoke(self, api_method, account_id, params, call):
+        client = api_method.__self__
+        operation_name = client.meta.method_to_api_mapping.get(api_method.__name__, api_method.__name__)
+        file_full_path = self.get_file_full_path(client, api_method.__name__, account_id, params)
+
+        if self.mode == 'replay':
+            entry = self.read(file_full_path)
+            if entry is None:
+                raise ReplayCacheMiss(f"No recorded response for {client.meta.service_model.service_name}.{operation_name} in {client.meta.region_name} of account {account_id} with the parameters {params}")
+            if 'error' in entry:
+                raise botocore.exceptions.ClientError(entry['error'], operation_name)
+            return entry['response']
+
+        try:
+            response = call(api_method, account_id, params)
+        except botocore.exceptions.ClientError as error:
+            if not is_throttling_error(error) and not is_transient_error(error):
+                self.write(file_full_path, {'error': error.response})
+            raise
+        self.write(file_full_path, {'response': {key: value for key, value in response.items() if key != 'ResponseMetadata'}})
+        return response
+
+    def get_file_full_path(self, client, method_name, account_id, params):
+        region = client.meta.region_name or 'global'
+        service = client.meta.service_model.service_name
+        params_hash = hashlib.sha256(json.dumps(params, sort_keys = True, default = str).encode('utf-8')).hexdigest()
+        return os.path.join(self.folder_name, account_id or 'caller', region, service, method_name, f"{params_hash}.json.gz")
+
+    def read(self, file_full_path):
+        try:
+            if time.time() - os.path.getmtime(file_full_path) > self.ttl_in_seconds:
+                logging.info(f"Recorded response {file_full_path} is older than the TTL. Ignoring it")
+                return None
+            with gzip.open(file_full_path, 'rt', encoding = 'utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    #Written to a temporary file first and then renamed, so that a reader never sees a partially written response
+    def write(self, file_full_path, entry):
+        folder_name = os.path.dirname(file_full_path)
+        os.makedirs(folder_name, exist_ok=True)
+        fd, temp_file_full_path = tempfile.mkstemp(dir = folder_name, suffix = '.tmp')
+        with os.fdopen(fd, 'wb') as raw_file, gzip.GzipFile(fileobj = raw_file, mode = 'wb') as f:
+            f.write(json.dumps(entry, default = str).encode('utf-8'))
+        os.replace(temp_file_full_path, file_full_path)
+
+    #Removes the recorded responses that are older than the TTL, and any temporary files left behind by an interrupted run
+    def evict_expired(self):
+        now = time.time()
+        evicted_count = 0
+        for folder_name, _, file_names in os.walk(self.folder_name):
+            for file_name in file_names:
+                file_full_path = os.path.join(folder_name, file_name)
+                try:
+                    if file_name.endswith('.tmp') or now - os.path.getmtime(file_full_path) > self.ttl_in_seconds:
+                        os.remove(file_full_path)
+                        evicted_count = evicted_count + 1
+                except FileNotFoundError:
+                    pass
+        logging.info(f"Evicted {evicted_count} expired response(s) from the API cache in {self.folder_name}")
@@ -0,0 +1,122 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import json
+import time
+import datetime
+import threading
+import contextvars
+from throttling import current_attempt_number
+
+#Returns the value at the given percentile (0 to 100) of a sorted list
+def get_percentile(sorted_values, percentile):
+    return sorted_values[int(percentile / 100 * (len(sorted_values) - 1))]
+
+#Number of the page being fetched by utils.invoke_aws_api_full_list, or None for a call that is not paginated
+current_page_number = contextvars.ContextVar('current_page_number', default = None)
+
+#API calls of one work unit. The work unit being run by the current thread is found through current_api_call_stats,
+#in the same way as its throttle counter.
+class ApiCallStats():
+
+    def __init__(self, work_unit_name):
+        self.work_unit_name = work_unit_name
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.page_count = 0
+
+    def add(self, latency, page_number):
+        with self.lock:
+            self.latencies.append(latency)
+            if page_number is not None:
+                self.page_count = self.page_count + 1
+
+    #Columns of the run report record of the work unit
+    def get_run_report_fields(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            page_count = self.page_count
+        if not latencies:
+            return {'api_call_count': 0, 'page_count': 0}
+        return {
+                'api_call_count': len(latencies),
+                'page_count': page_count,
+                'average_latency_in_ms': round(1000 * sum(latencies) / len(latencies), 2),
+                'p50_latency_in_ms': round(1000 * get_percentile(latencies, 50), 2),
+                'p95_latency_in_ms': round(1000 * get_percentile(latencies, 95), 2),
+                'p99_latency_in_ms': round(1000 * get_percentile(latencies, 99), 2)
+                }
+
+current_api_call_stats = contextvars.ContextVar('current_api_call_stats', default = None)
+
+#Appends one json line per API call to the trace file. The file is opened in append mode, and every line is written with a single
+#write, so the processes of an organization wide scan can share the file.
+class ApiTraceWriter():
+
+    def __init__(self, file_full_path):
+        self.lock = threading.Lock()
+        if os.path.dirname(file_full_path):
+            os.makedirs(os.path.dirname(file_full_path), exist_ok=True)
+        self.file = open(file_full_path, 'a', buffering = 1) #Line buffered
+
+    def write(self, call_rec):
+        line = json.dumps(call_rec) + '\n'
+        with self.lock:
+            self.file.write(line)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+#botocore event handlers that time every API call made by a client, and add it to the stats of the current work unit and to the trace file.
+#A call is timed from the before-call event (once the parameters are validated and the request is built) to the after-call event
+#(once the response is parsed), so it covers the HTTP request and any retries made by botocore itself.
+class ApiCallRecorder():
+
+    def __init__(self, account_id, region, trace_writer = None):
+        self.account_id = account_id
+        self.region = region
+        self.trace_writer = trace_writer
+
+    def register(self, events):
+        events.register('before-call.*.*', self.before_call)
+        events.register('after-call.*.*', self.after_call)
+        events.register('after-call-error.*.*', self.after_call_error)
+
+    def before_call(self, model, context, **kwargs):
+        context['api_call_start'] = (time.perf_counter(), model)
+
+    def after_call(self, http_response, parsed, context, **kwargs):
+        self.record(context, http_response.status_code, parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0), parsed.get('Error', {}).get('Code'))
+
+    #Emitted instead of after-call when no response is received at all, for example when the connection fails
+    def after_call_error(self, exception, context, **kwargs):
+        self.record(context, None, None, type(exception).__name__)
+
+    def record(self, context, http_status, retry_count, error_code):
+        start, model = context.pop('api_call_start', (None, None))
+        if start is None:
+            return
+        latency = time.perf_counter() - start
+        page_number = current_page_number.get()
+
+        api_call_stats = current_api_call_stats.get()
+        if api_call_stats:
+            api_call_stats.add(latency, page_number if error_code is None else None)
+
+        if self.trace_writer:
+            self.trace_writer.write({
+                                    'timestamp': datetime.datetime.now().astimezone().isoformat(),
+                                    'work_unit': api_call_stats.work_unit_name if api_call_stats else None,
+                                    'account_id': self.account_id,
+                                    'region': self.region,
+                                    'service': model.service_model.service_name,
+                                    'operation': model.name,
+                                    'latency_in_ms': round(1000 * latency, 2),
+                                    'http_status': http_status,
+                                    'error_code': error_code,
+                                    'attempt': current_attempt_number.get(),
+                                    'retry_count': retry_count,
+                                    'page': page_number
+                                    })
@@ -0,0 +1,96 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import functools
+import botocore.session
+import botocore.exceptions
+import utils
+
+#Used only to read the endpoint data that ships with botocore. No API calls are made with it. Reading the regions of a service loads its
+#service model, so the session shares the data loader of the clients (see utils.CredentialCache) and the model is not loaded again
+#from disk when the client of the service is created.
+@functools.lru_cache(maxsize = None)
+def get_endpoint_session():
+    endpoint_session = botocore.session.Session()
+    endpoint_session.register_component('data_loader', utils.credential_cache.data_loader)
+    return endpoint_session
+
+@functools.lru_cache(maxsize = None)
+def get_endpoint_regions(client_name, partition_name):
+    return frozenset(get_endpoint_session().get_available_regions(client_name, partition_name = partition_name))
+
+#Returns False only if botocore's endpoint data says that the service has no endpoint in the region.
+#If the endpoint data does not know the region (it is newer than the installed botocore) or has no regional endpoints for the service
+#(for example Global Accelerator), the service is taken to be available, so that a work unit is never skipped by mistake.
+def is_service_available(client_name, region):
+    try:
+        partition_name = get_endpoint_session().get_partition_for_region(region)
+    except botocore.exceptions.UnknownRegionError:
+        return True
+    if region not in get_endpoint_regions('ec2', partition_name):
+        return True
+    service_regions = get_endpoint_regions(client_name, partition_name)
+    return not service_regions or region in service_regions
+
+#Remembers, per account, region and service, whether the "has any resources" probe of the analyser found any resources, so that the work units
+#that were empty are not even scheduled in the next runs. Kept in a json file, and an entry is used for ttl_in_hours after the probe.
+#Each process keeps its own copy and merges it into the file when it saves it, so that the accounts analysed by other processes are kept.
+class AvailabilityCache():
+
+    def __init__(self, file_full_path, ttl_in_hours):
+        self.file_full_path = file_full_path
+        self.ttl_in_seconds = ttl_in_hours * 3600
+        self.lock = threading.Lock()
+        self.entries = self.load()
+        self.updated_entries = {}
+
+    def load(self):
+        try:
+            with open(self.file_full_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as error:
+            logging.warning(f"Ignoring the availability cache {self.file_full_path} as it could not be read: {error}")
+            return {}
+
+    @staticmethod
+    def get_key(account_id, region, service):
+        return f"{account_id}/{region}/{service}"
+
+    #Returns True or False as found by the last probe, or None if there was no probe within the TTL
+    def get(self, account_id, region, service):
+        with self.lock:
+            entry = self.entries.get(self.get_key(account_id, region, service))
+        if entry is None or time.time() - entry['probed_at'] > self.ttl_in_seconds:
+            return None
+        return entry['has_resources']
+
+    def put(self, account_id, region, service, has_resources):
+        entry = {'has_resources': has_resources, 'probed_at': time.time()}
+        with self.lock:
+            self.entries[self.get_key(account_id, region, service)] = entry
+            self.updated_entries[self.get_key(account_id, region, service)] = entry
+
+    def save(self):
+        with self.lock:
+            if not self.updated_entries:
+                return
+            entries = self.load()
+            entries.update(self.updated_entries)
+            now = time.time()
+            entries = {key: entry for key, entry in entries.items() if now - entry['probed_at'] <= self.ttl_in_seconds}
+            folder_name = os.path.dirname(self.file_full_path)
+            if folder_name:
+                os.makedirs(folder_name, exist_ok=True)
+            fd, temp_file_full_path = tempfile.mkstemp(dir = folder_name if folder_name else '.', suffix = '.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f)
+            os.replace(temp_file_full_path, self.file_full_path)
+            self.updated_entries = {}
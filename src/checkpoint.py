@@ -0,0 +1,103 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import json
+import sqlite3
+import logging
+import datetime
+import threading
+from finding import Finding, FindingContext
+from sinks import FindingsSink
+
+#Local SQLite journal of the work units (account + region + service) of a run, used by --checkpoint and --resume.
+#Each work unit is committed in one transaction, with its run report record and its findings, as soon as all its findings have been
+#handed to the other sinks. The journal also keeps where the run started writing to the findings file, so that a resumed run can cut the
+#file back to that point and write the findings of the completed work units again from the journal, followed by those of the work units
+#it runs. The connection is shared by the threads of a process (behind a lock), and SQLite's own locking takes care of the processes
+#of an organization wide scan. Work units are journaled under the service_key of their context, the name of the service in -s, which is
+#what a resumed run schedules them by.
+class CheckpointJournal():
+
+    def __init__(self, file_full_path):
+        folder_name = os.path.dirname(file_full_path)
+        if folder_name:
+            os.makedirs(folder_name, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_full_path, timeout = 60, check_same_thread = False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS run_info (
+                                            name TEXT PRIMARY KEY,
+                                            value TEXT)''')
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS work_unit (
+                                            account_id TEXT,
+                                            region TEXT,
+                                            service TEXT,
+                                            result TEXT,
+                                            run_report_rec TEXT,
+                                            context TEXT,
+                                            findings TEXT,
+                                            completed_at TEXT,
+                                            PRIMARY KEY (account_id, region, service))''')
+
+    #Starts the journal of a new run, forgetting the work units of the previous one. run_info is a dict of json serialisable values.
+    def start_run(self, run_info):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM run_info")
+            self.connection.execute("DELETE FROM work_unit")
+            self.connection.executemany("INSERT INTO run_info VALUES (?, ?)", [(name, json.dumps(value)) for name, value in run_info.items()])
+
+    #Returns the run_info of the run being journaled, or None if no run was started
+    def get_run_info(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT name, value FROM run_info").fetchall()
+        return {name: json.loads(value) for name, value in rows} if rows else None
+
+    #findings is a list of the resource fields of each finding (see Finding.get_resource_fields). A work unit run again replaces its previous record.
+    def complete_unit(self, context, run_report_rec, findings):
+        completed_at = datetime.datetime.now().astimezone().strftime("%Y_%m_%d_%H_%M_%S%z")
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO work_unit VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (context.account_id, context.region, context.service_key, run_report_rec['result'],
+                                     json.dumps(run_report_rec), json.dumps(context.to_dict()), json.dumps(findings), completed_at))
+
+    #Returns {(region, service key): run report record} of the work units of the account that do not have to be run again
+    def get_completed_units(self, account_id):
+        with self.lock:
+            rows = self.connection.execute("SELECT region, service, run_report_rec FROM work_unit WHERE account_id = ? AND result IN ('Success', 'Skipped')",
+                                           (account_id,)).fetchall()
+        return {(region, service): json.loads(run_report_rec) for region, service, run_report_rec in rows}
+
+    #Returns the findings of the work unit, read back from the journal as carried forward findings
+    def get_unit_findings(self, account_id, region, service):
+        with self.lock:
+            row = self.connection.execute("SELECT context, findings FROM work_unit WHERE account_id = ? AND region = ? AND service = ?",
+                                          (account_id, region, service)).fetchone()
+        context = FindingContext(**json.loads(row[0]))
+        return context, [Finding.from_resource_fields(context, resource_fields, carried_forward = True) for resource_fields in json.loads(row[1])]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+#Journals each work unit once all its findings have been passed to the sinks before it. Must be the last sink of the pipeline.
+#Findings written out again from the journal by a resumed run end without a run report record, and are not journaled again.
+class CheckpointSink(FindingsSink):
+
+    def __init__(self, checkpoint_journal):
+        self.checkpoint_journal = checkpoint_journal
+        self.findings = {} #Resource fields of the findings of each work unit in progress, keyed by the context of the work unit
+
+    def write_batch(self, finding_recs):
+        for finding_rec in finding_recs:
+            self.findings.setdefault(finding_rec.context, []).append(finding_rec.get_resource_fields())
+
+    def end_unit(self, context, run_report_rec = None):
+        findings = self.findings.pop(context, [])
+        if run_report_rec:
+            self.checkpoint_journal.complete_unit(context, run_report_rec, findings)
+
+    def close(self):
+        if self.findings:
+            logging.warning(f"{len(self.findings)} work unit(s) did not end and were not checkpointed")
@@ -0,0 +1,368 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import time
+import socket
+import logging
+import datetime
+import threading
+import multiprocessing
+import utils
+from account_analyser import AccountAnalyser
+from organization_analyser import init_worker, get_organization_accounts
+from scheduler import WorkScheduler, WorkUnit
+from finding import Finding, FindingContext
+from sinks import FindingsPipeline, FindingsSink
+from state_store import StateStore
+from inventory import ResourceInventory
+from work_queue import get_work_queue
+import analyser_registry
+
+#Settings of the analysis that the coordinator passes to the workers through the run_info of the work queue, so that a worker is started
+#with just the work queue (and its own credentials and output folder)
+run_settings = ['services', 'regions', 'organization', 'report_only_issues', 'incremental']
+
+#Distributed scan. The coordinator puts one work unit (account + region + service) on the work queue for each service+region of each
+#account to analyse. Workers, on this node or on others, lease the work units, run their analysers and put their findings back on the
+#work queue as the result of the work unit. The coordinator reads the results as they come in and writes them out through its findings
+#pipeline, so the output is the same as that of a scan run in one process. A work unit whose lease expires (for example because its
+#worker died) is leased again by another worker, and is recorded as failed once its lease has expired max_lease_attempts times.
+#With --incremental, the state of the resources is kept by the coordinator alone: the previous state of each work unit is put on the
+#work queue with it, and the new state comes back with its result.
+class Coordinator(AccountAnalyser):
+
+    max_lease_attempts = 3
+    #The remaining work units are recorded as failed if no result comes in and no worker holds a live lease for this many lease timeouts,
+    #for example because no worker was started or all of them have stopped
+    max_idle_lease_timeouts = 3
+    poll_interval_in_seconds = 1
+    result_batch_size = 500
+
+    def __init__(self):
+        self.work_queue = get_work_queue(utils.config_info.work_queue_url)
+        self.local_workers = []
+        self.idle_units = set() #(account_id, region, service) of the work units given up on as no worker was running them
+
+        if not utils.config_info.organization:
+            super().__init__()
+            self.accounts = [{'Id': self.account_id, 'Name': self.account_name}]
+            return
+
+        #Same output files as an organization wide scan
+        self.scheduler = None
+        self.findings_pipeline = None
+        self.state_store = None
+        self.availability_cache = None
+        self.inventory = None
+        self.run_report = []
+        self.checkpoint_journal = None
+        self.checkpointed_units = set()
+
+        self.accounts, self.payer_account_id, self.payer_account_name = get_organization_accounts()
+        self.account_id = self.payer_account_id
+        self.account_name = self.payer_account_name
+
+        if utils.config_info.filename_with_accountid:
+            self.init_output_files(f"Fault_Tolerance_Findings_{self.payer_account_id}_{self.payer_account_name}_Organization")
+        else:
+            self.init_output_files("Fault_Tolerance_Findings")
+
+    def get_findings(self):
+        start = datetime.datetime.now().astimezone()
+
+        self.findings_pipeline = FindingsPipeline(self.get_sinks())
+        if utils.config_info.incremental:
+            self.state_store = StateStore(utils.config_info.state_file_name)
+        try:
+            unit_count = self.put_work_units()
+            self.start_local_workers()
+            self.collect_results(unit_count)
+        except BaseException:
+            for process in self.local_workers:
+                process.terminate()
+            raise
+        finally:
+            self.findings_pipeline.close() #Waits for all the findings to be written out
+            for process in self.local_workers:
+                process.join()
+            self.work_queue.close()
+            if self.state_store:
+                self.state_store.close()
+
+        self.run_report.extend(self.findings_pipeline.get_run_report_recs(self.account_id))
+
+        end = datetime.datetime.now().astimezone()
+
+        self.run_report.append(
+                                {
+                                'account_id' : self.account_id,
+                                'region'  : 'Overall',
+                                'service' : 'Overall',
+                                'result'  : 'N/A',
+                                'error_message' : 'N/A',
+                                'start_time' : start.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                'end_time' : end.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                'runtime_in_seconds' : round((end-start).total_seconds(), 2)
+                                }
+                            )
+
+        logging.info(f"Total time taken for the distributed scan is {end-start} seconds")
+
+    #Starts a new run on the work queue and puts the work units on it. Work units that cannot find anything are recorded as skipped instead.
+    #The work units of an account and region are put together, so that a worker leases them one after the other and fetches the
+    #collections of its inventory (see inventory.py) that they share only once.
+    def put_work_units(self):
+        run_info = {name: getattr(utils.config_info, name) for name in run_settings}
+        run_info['max_lease_attempts'] = self.max_lease_attempts
+        self.work_queue.start_run(run_info)
+
+        #(analyser, skip reason) of each service+region, as neither depends on the account
+        analysers = [(analyser, self.get_skip_reason(analyser))
+                     for analyser in (analyser_registry.create_analyser(service, self, region)
+                                      for region in utils.config_info.regions for service in utils.config_info.services)]
+
+        payloads = []
+        for account in self.accounts:
+            for analyser, skip_reason in analysers:
+                if skip_reason:
+                    self.add_skipped_unit(analyser.region, analyser.service, skip_reason, account_id = account['Id'])
+                    continue
+                payload = {
+                            'account_id' : account['Id'],
+                            'account_name' : account['Name'],
+                            'payer_account_id' : self.payer_account_id,
+                            'payer_account_name' : self.payer_account_name,
+                            'region' : analyser.region,
+                            'service' : analyser.service_key
+                          }
+                if self.state_store and analyser.incremental:
+                    payload['previous_state'] = self.state_store.get_unit_state(account['Id'], analyser.region, analyser.service)
+                payloads.append(payload)
+
+        unit_count = self.work_queue.put_units(payloads)
+        logging.info(f"Put {unit_count} work unit(s) for {len(self.accounts)} account(s) on the work queue")
+        return unit_count
+
+    #'spawn' so that the worker processes do not inherit the threads and open connections of this process
+    def start_local_workers(self):
+        mp_context = multiprocessing.get_context('spawn')
+        for i in range(utils.config_info.local_worker_count):
+            process = mp_context.Process(target = run_local_worker, args = (utils.config_info,), name = f"local-worker-{i}")
+            process.start()
+            self.local_workers.append(process)
+
+    #Reads the results of the work units in the order in which they are done, until all of them are in
+    def collect_results(self, unit_count):
+        position = 0
+        collected_count = 0
+        local_workers_exited = False
+        idle_timeout_in_seconds = self.max_idle_lease_timeouts * utils.config_info.lease_timeout_in_seconds
+        last_progress_time = time.time()
+        while collected_count < unit_count:
+            results = self.work_queue.get_results(position, self.result_batch_size)
+            if results:
+                for position, payload, result in results:
+                    self.add_result(payload, result)
+                collected_count = collected_count + len(results)
+                last_progress_time = time.time()
+                logging.info(f"Collected the results of {collected_count} of {unit_count} work unit(s)")
+                continue
+
+            self.work_queue.abandon_expired(self.max_lease_attempts)
+            if self.local_workers and not local_workers_exited and not any(process.is_alive() for process in self.local_workers):
+                local_workers_exited = True
+                logging.warning("All the local workers have exited. The remaining work units are left to the other workers")
+
+            if self.work_queue.get_counts()['live'] > 0:
+                last_progress_time = time.time()
+            elif time.time() - last_progress_time > idle_timeout_in_seconds:
+                payloads = self.work_queue.abandon_remaining()
+                self.idle_units.update((payload['account_id'], payload['region'], payload['service']) for payload in payloads)
+                logging.error(f"No worker has run any work unit for {idle_timeout_in_seconds} seconds. Giving up on the remaining {len(payloads)} work unit(s)")
+                last_progress_time = time.time()
+                continue
+            time.sleep(self.poll_interval_in_seconds)
+
+    def add_result(self, payload, result):
+        if result is None: #Abandoned
+            now = datetime.datetime.now().astimezone().strftime("%Y_%m_%d_%H_%M_%S%z")
+            if (payload['account_id'], payload['region'], payload['service']) in self.idle_units:
+                error_message = f"No worker ran the work unit, or any other, for {self.max_idle_lease_timeouts} lease timeouts"
+            else:
+                error_message = f"The lease of the work unit expired {self.max_lease_attempts} times without any worker completing it"
+            logging.error(f"Giving up on {payload['account_id']}+{payload['service']}+{payload['region']}: {error_message}")
+            self.run_report.append(
+                                    {
+                                    'account_id' : payload['account_id'],
+                                    'region'  : payload['region'],
+                                    'service' : payload['service'],
+                                    'result'  : 'Failure',
+                                    'error_message' : error_message,
+                                    'start_time' : now,
+                                    'end_time' : now,
+                                    'runtime_in_seconds' : 0
+                                    }
+                                )
+            return
+
+        context = FindingContext(**result['context'])
+        for resource_fields, carried_forward in result['findings']:
+            self.findings_pipeline.put(Finding.from_resource_fields(context, resource_fields, carried_forward))
+        if self.state_store and result.get('state') is not None:
+            self.state_store.replace_unit_state(context.account_id, context.region, context.service, result['state'])
+        self.findings_pipeline.end_unit(context, result['run_report_rec'])
+        self.run_report.append(result['run_report_rec'])
+
+#Stands in for the StateStore of the coordinator in the analyser of a leased work unit: the previous state of the work unit comes with
+#its payload, and the new state is kept to be put back on the work queue with its result.
+class UnitStateStore():
+
+    def __init__(self, previous_state):
+        self.previous_state = previous_state
+        self.unit_state = None #Set only if the work unit completes successfully
+
+    def get_unit_state(self, account_id, region, service):
+        return self.previous_state
+
+    def replace_unit_state(self, account_id, region, service, unit_state):
+        self.unit_state = unit_state
+
+#The account level state that the analyser of a leased work unit reads. It has no output files of its own: the findings go to the
+#pipeline of the worker, and back to the coordinator through the work queue. The inventory is that of the worker.
+class UnitAccountAnalyser(AccountAnalyser):
+
+    def __init__(self, payload, worker):
+        self.account_id = payload['account_id']
+        self.account_name = payload['account_name']
+        self.payer_account_id = payload['payer_account_id']
+        self.payer_account_name = payload['payer_account_name']
+        self.scheduler = None
+        self.findings_pipeline = worker.findings_pipeline
+        self.state_store = UnitStateStore(payload['previous_state']) if 'previous_state' in payload else None
+        self.availability_cache = None
+        self.inventory = worker.inventory
+        self.run_report = []
+        self.checkpoint_journal = None
+        self.checkpointed_units = set()
+
+#Leases work units from the work queue and runs them on the work scheduler, as many at a time as the -m option allows.
+#The leases of the work units in progress are renewed every third of the lease timeout, so a lease expires only if the worker stops.
+#The collections that the work units of an account and region share are kept in the inventory of the worker until it leases a work unit
+#of another account or region, and has none of theirs in progress any more. The worker exits once all the work units of the run are done.
+class Worker():
+
+    poll_interval_in_seconds = 1
+
+    def __init__(self, work_queue, lease_timeout_in_seconds):
+        self.work_queue = work_queue
+        self.lease_timeout_in_seconds = lease_timeout_in_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.leases = {} #Leases of the work units in progress, keyed by (account_id, region, service key), see FindingContext
+        self.state_stores = {} #UnitStateStore of the work units in progress in incremental mode, keyed as leases are
+        self.findings_pipeline = None
+        self.inventory = ResourceInventory()
+        self.max_lease_attempts = None
+        self.stopped = threading.Event()
+
+    def run(self):
+        self.join_run()
+
+        self.findings_pipeline = FindingsPipeline([WorkQueueSink(self)])
+
+        heartbeat = threading.Thread(target = self.renew_leases, name = "lease-heartbeat", daemon = True)
+        heartbeat.start()
+
+        #The queue of the scheduler is kept short, as every work unit in it holds a lease
+        max_workers = 1 if utils.config_info.single_threaded else utils.config_info.max_concurrent_threads
+        scheduler = WorkScheduler(max_workers = max_workers, queue_size = 1)
+        try:
+            scheduler.run(self.get_work_units())
+        finally:
+            self.findings_pipeline.close()
+            self.stopped.set()
+            heartbeat.join()
+            self.work_queue.close()
+
+        logging.info(f"Worker {self.worker_id} ran {scheduler.completed_count + scheduler.failed_count} work unit(s)")
+
+    #Waits for a run that is not finished yet and takes the settings of the analysis from it
+    def join_run(self):
+        while True:
+            run_info = self.work_queue.get_run_info()
+            if run_info and not self.work_queue.is_finished():
+                break
+            time.sleep(self.poll_interval_in_seconds)
+
+        for name in run_settings:
+            setattr(utils.config_info, name, run_info[name])
+        self.max_lease_attempts = run_info['max_lease_attempts']
+        utils.init_aws_clients() #The member role is assumed in the other accounts only if the run is organization wide
+        logging.info(f"Worker {self.worker_id} joined the run of {run_info['services']} in {run_info['regions']}")
+
+    def get_work_units(self):
+        while True:
+            lease = self.work_queue.lease(self.worker_id, self.lease_timeout_in_seconds, self.max_lease_attempts)
+            if lease is None:
+                if self.work_queue.is_finished():
+                    return
+                time.sleep(self.poll_interval_in_seconds)
+                continue
+
+            payload = lease.payload
+            key = (payload['account_id'], payload['region'], payload['service'])
+            account_analyser = UnitAccountAnalyser(payload, self)
+            with self.lock:
+                self.leases[key] = lease
+                if account_analyser.state_store:
+                    self.state_stores[key] = account_analyser.state_store
+                account_regions = {lease_key[:2] for lease_key in self.leases}
+            self.inventory.retain(account_regions)
+            analyser = analyser_registry.create_analyser(payload['service'], account_analyser, payload['region'])
+            yield WorkUnit(name = f"{payload['account_id']}+{payload['service']}+{payload['region']}", func = analyser.get_and_write_findings)
+
+    def renew_leases(self):
+        while not self.stopped.wait(self.lease_timeout_in_seconds / 3):
+            with self.lock:
+                leases = list(self.leases.items())
+            for key, lease in leases:
+                if not self.work_queue.renew(lease, self.lease_timeout_in_seconds):
+                    logging.warning(f"Lost the lease of the work unit {key}. It has been leased to another worker")
+
+    #Called by the WorkQueueSink once all the findings of the work unit have been handed to it. The lease is found by the service key of the
+    #context, as that is the service of the payload, while the service of the context can be another name (for example 'directconnect' for dx).
+    #A work unit that ended without a run report record is not completed, and is run again once its lease expires.
+    def complete_unit(self, context, run_report_rec, findings):
+        key = (context.account_id, context.region, context.service_key)
+        with self.lock:
+            lease = self.leases.pop(key, None)
+            state_store = self.state_stores.pop(key, None)
+        if lease is None or not run_report_rec:
+            return
+        result = {'context': context.to_dict(), 'run_report_rec': run_report_rec, 'findings': findings,
+                  'state': state_store.unit_state if state_store else None}
+        if not self.work_queue.complete(lease, result):
+            logging.warning(f"The result of {context.account_id}+{context.service}+{context.region} was dropped as its lease had been lost")
+
+#Sink of a worker. Collects the findings of each work unit and hands them to the worker as the result of the work unit once it has ended.
+class WorkQueueSink(FindingsSink):
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.findings = {} #(resource fields, carried_forward) of the findings of each work unit in progress, keyed by the context of the work unit
+
+    def write_batch(self, finding_recs):
+        for finding_rec in finding_recs:
+            self.findings.setdefault(finding_rec.context, []).append((finding_rec.get_resource_fields(), finding_rec.carried_forward))
+
+    def end_unit(self, context, run_report_rec = None):
+        self.worker.complete_unit(context, run_report_rec, self.findings.pop(context, []))
+
+def run_worker():
+    Worker(get_work_queue(utils.config_info.work_queue_url), utils.config_info.lease_timeout_in_seconds).run()
+
+#Runs in a worker process started by the coordinator with --local-workers
+def run_local_worker(config_info):
+    init_worker(config_info)
+    run_worker()
@@ -0,0 +1,118 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+#Fields that are the same for every finding of a work unit (one service in one region of one account).
+#One context is created per work unit and all the findings of that work unit refer to it, instead of each finding carrying its own copy.
+#The timestamp is captured and formatted once, when the work unit starts.
+#service is the name of the service in the findings. service_key is the name under which its analyser is registered and which -s accepts
+#(see analyser_registry), for example 'directconnect' and 'dx'. It identifies the work unit wherever work units are tracked across a run.
+class FindingContext():
+
+    __slots__ = ('service', 'region', 'account_id', 'account_name', 'payer_account_id', 'payer_account_name', 'timestamp', 'service_key')
+
+    #service_key is None in the contexts journaled before it was added, in which case it is taken to be the same as service
+    def __init__(self, service, region, account_id, account_name, payer_account_id, payer_account_name, timestamp, service_key = None):
+        self.service = service
+        self.region = region
+        self.account_id = account_id
+        self.account_name = account_name
+        self.payer_account_id = payer_account_id
+        self.payer_account_name = payer_account_name
+        self.timestamp = timestamp
+        self.service_key = service_key if service_key else service
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in FindingContext.__slots__}
+
+#A single finding. It has a fixed set of fields, matching the columns of the findings output file.
+#Only the resource specific fields are stored in the finding. The rest are read from the shared FindingContext.
+#Fields can be read and written like dict items (finding_rec['message'] = ...), so the analysers use it just like a dict.
+class Finding():
+
+    #Columns of the findings output file
+    keys = [
+                'service',
+                'region',
+                'account_id',
+                'account_name',
+                'payer_account_id',
+                'payer_account_name',
+                'resource_arn',
+                'resource_name',
+                'resource_id',
+                'potential_issue',
+                'engine', #Used for Elasticache, Memory DB and RDS
+                'message',
+                'timestamp'
+            ]
+
+    #Columns that are specific to the resource
+    resource_fields = ('resource_arn', 'resource_name', 'resource_id', 'potential_issue', 'engine', 'message')
+
+    #carried_forward is set for findings that were not evaluated again in incremental mode, but copied from the previous run.
+    #resource_key is the key of the resource the finding is about, under which it is kept in the state of incremental mode (not a column).
+    __slots__ = ('context', 'carried_forward', 'resource_key') + resource_fields
+
+    def __init__(self, context, resource_key = None):
+        self.context = context
+        self.carried_forward = False
+        self.resource_key = resource_key
+        self.resource_arn = ''
+        self.resource_name = ''
+        self.resource_id = ''
+        self.potential_issue = ''
+        self.engine = ''
+        self.message = ''
+
+    def __getitem__(self, key):
+        if key in Finding.resource_fields:
+            return getattr(self, key)
+        if key in FindingContext.__slots__:
+            return getattr(self.context, key)
+        raise KeyError(key)
+
+    #Only the resource specific fields can be set. The shared fields come from the context.
+    def __setitem__(self, key, value):
+        if key not in Finding.resource_fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default = None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    #Values in the order of the columns of the findings output file
+    def to_row(self):
+        context = self.context
+        return [
+                context.service,
+                context.region,
+                context.account_id,
+                context.account_name,
+                context.payer_account_id,
+                context.payer_account_name,
+                self.resource_arn,
+                self.resource_name,
+                self.resource_id,
+                self.potential_issue,
+                self.engine,
+                self.message,
+                context.timestamp
+                ]
+
+    def get_resource_fields(self):
+        return {key: getattr(self, key) for key in Finding.resource_fields}
+
+    #Builds a finding back from its resource fields, for example as read from a journal or a work queue
+    @staticmethod
+    def from_resource_fields(context, resource_fields, carried_forward = False):
+        finding_rec = Finding(context)
+        for key, value in resource_fields.items():
+            finding_rec[key] = value
+        finding_rec.carried_forward = carried_forward
+        return finding_rec
+
+    def to_dict(self):
+        return dict(zip(Finding.keys, self.to_row()))
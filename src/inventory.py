@@ -0,0 +1,146 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import logging
+import threading
+import utils
+
+class InventoryEntry():
+
+    def __init__(self, consumer_count):
+        self.lock = threading.Lock()
+        self.items = None
+        self.remaining_consumer_count = consumer_count
+
+#Collections of resources that more than one analyser reads, fetched once per account and region and shared by those analysers.
+#They are keyed by (account id, region, collection name).
+#The analysers of a region may run at the same time, so the first one to ask for a collection fetches it and the others wait for it.
+#A collection is dropped as soon as all the analysers that may read it have either got it or ended without it (see release_collections),
+#so that it is not held in memory for the rest of the run.
+class ResourceInventory():
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    #Returns the collection, calling fetch() to get it if no other analyser has yet. consumer_count is the number of analysers of the run
+    #that read the collection. If fetch() fails, the next analyser to ask for the collection tries again.
+    def get(self, key, fetch, consumer_count):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = InventoryEntry(consumer_count)
+                self.entries[key] = entry
+
+        with entry.lock:
+            if entry.items is None:
+                entry.items = fetch()
+            items = entry.items
+
+        self.release(key, consumer_count)
+        return items
+
+    #Counts one of the consumer_count analysers of the collection as done with it, whether or not it fetched it
+    def release(self, key, consumer_count):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = InventoryEntry(consumer_count)
+                self.entries[key] = entry
+            entry.remaining_consumer_count = entry.remaining_consumer_count - 1
+            if entry.remaining_consumer_count <= 0:
+                self.entries.pop(key, None)
+
+    #Drops the collections of every account and region that is not in account_regions, a set of (account id, region). Used by a worker
+    #of a distributed scan, which runs only some of the consumers of a collection, so that the rest never release it on that worker.
+    def retain(self, account_regions):
+        with self.lock:
+            for key in [key for key in self.entries if key[:2] not in account_regions]:
+                self.entries.pop(key)
+
+#The RDS API lists the clusters of all the RDS family engines (Aurora, Multi-AZ DB clusters, DocumentDB and Neptune) together.
+#The RDS and DocumentDB analysers read disjoint parts of that list, so it is fetched only once per region for both of them.
+db_cluster_services = ['rds', 'docdb']
+docdb_engines = ['docdb']
+non_rds_cluster_engines = ['docdb', 'neptune'] #Not analysed by the RDS analyser
+
+#Largest page size of the RDS describe APIs
+rds_max_records = 100
+
+def get_db_clusters(analyser):
+    consumers = get_consumers('db_clusters')
+    params = {'MaxRecords': rds_max_records}
+    #The Filters of the RDS API can only select engines, not leave them out. So they are used only when the RDS clusters are not needed.
+    if 'rds' not in consumers:
+        params['Filters'] = [{'Name': 'engine', 'Values': docdb_engines}]
+
+    def fetch():
+        rds = analyser.get_aws_client("rds")
+        return list(utils.invoke_aws_api_full_list(rds.describe_db_clusters, "DBClusters", **params))
+
+    db_clusters = analyser.account_analyser.inventory.get((analyser.account_analyser.account_id, analyser.region, 'db_clusters'), fetch, len(consumers))
+    analyser.read_collections.add('db_clusters')
+    return db_clusters
+
+#Subnets of a region. A subnet never moves to another AZ or VPC, so the index stays valid for the whole run.
+class SubnetIndex():
+
+    def __init__(self, subnets):
+        self.subnets = {subnet['SubnetId']: (subnet['AvailabilityZoneId'], subnet['VpcId']) for subnet in subnets}
+
+    def get_az_id(self, subnet_id):
+        subnet = self.subnets.get(subnet_id)
+        return subnet[0] if subnet else None
+
+    def get_vpc_id(self, subnet_id):
+        subnet = self.subnets.get(subnet_id)
+        return subnet[1] if subnet else None
+
+    #AZ ids of the given subnets. A subnet that is not in the index (for example one created or deleted since the index was built)
+    #is counted as an AZ of its own, which is how all subnets were counted before the index existed.
+    def get_az_ids(self, subnet_ids):
+        az_ids = set()
+        for subnet_id in subnet_ids:
+            az_id = self.get_az_id(subnet_id)
+            if az_id is None:
+                logging.warning(f"Subnet {subnet_id} was not found. Counting it as an AZ of its own")
+                az_id = subnet_id
+            az_ids.add(az_id)
+        return az_ids
+
+#Analysers that look up the AZs of subnets
+subnet_index_services = ['lambda', 'vpce', 'fsx']
+
+#Largest page size of ec2:DescribeSubnets
+describe_subnets_max_results = 1000
+
+def get_subnet_index(analyser):
+    consumers = get_consumers('subnet_index')
+
+    def fetch():
+        ec2 = analyser.get_aws_client("ec2")
+        return SubnetIndex(utils.invoke_aws_api_full_list(ec2.describe_subnets, "Subnets", MaxResults = describe_subnets_max_results))
+
+    subnet_index = analyser.account_analyser.inventory.get((analyser.account_analyser.account_id, analyser.region, 'subnet_index'), fetch, len(consumers))
+    analyser.read_collections.add('subnet_index')
+    return subnet_index
+
+#The shared collections and the services whose analysers may read them
+shared_collections = {
+    'db_clusters': db_cluster_services,
+    'subnet_index': subnet_index_services
+}
+
+#Services of the run that may read the collection
+def get_consumers(collection_name):
+    return [service for service in shared_collections[collection_name] if service in utils.config_info.services]
+
+#Called once for every work unit of the run that may read a shared collection, however it ended: after it ran (the subnet index,
+#for example, is read only if a resource needs it), or when it was skipped or replayed from the checkpoint instead of being run.
+#The collections the work unit did not read are released, so that they are dropped once the rest of their consumers are done with them.
+def release_collections(account_analyser, region, service, read_collections = ()):
+    if not account_analyser.inventory:
+        return
+    for collection_name, services in shared_collections.items():
+        if service in services and collection_name not in read_collections:
+            account_analyser.inventory.release((account_analyser.account_id, region, collection_name), len(get_consumers(collection_name)))
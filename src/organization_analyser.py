@@ -0,0 +1,178 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import csv
+import utils
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from account_analyser import AccountAnalyser
+from checkpoint import CheckpointJournal
+from s3_stream import S3StreamingUpload
+
+#Runs in each worker process before it analyses any account. The configuration is passed in as the worker process does not parse the command line.
+def init_worker(config_info):
+    utils.config_info = config_info
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)-8s %(processName)s %(message)s',
+        level=config_info.log_level,
+        datefmt='%Y-%m-%d %H:%M:%S')
+    utils.init_aws_clients()
+
+#Runs in a worker process. Analyses one account and writes the findings to a part file of its own.
+def analyse_account(account, payer_account_id, payer_account_name, part_file_full_path):
+    account_analyser = AccountAnalyser(account_id = account['Id'],
+                                       account_name = account['Name'],
+                                       payer_account_id = payer_account_id,
+                                       payer_account_name = payer_account_name,
+                                       output_file_full_path = part_file_full_path)
+    account_analyser.get_findings()
+    return account_analyser.run_report
+
+#Returns the active accounts of the AWS Organization, as [{'Id': ..., 'Name': ...}], and the id and name of its management (payer) account
+def get_organization_accounts():
+    org = utils.get_aws_client("organizations")
+
+    #Account ARNs are of the format arn:aws:organizations::<management account id>:account/<organization id>/<account id>
+    #so the management (payer) account id can be read from any of them, and its name is in the same list.
+    accounts = []
+    payer_account_id = utils.config_info.account_id
+    for account in utils.invoke_aws_api_full_list(org.list_accounts, "Accounts"):
+        payer_account_id = utils.parse_arn(account['Arn'])['account_id']
+        if account['Status'] == 'ACTIVE':
+            accounts.append({'Id': account['Id'], 'Name': account['Name']})
+
+    payer_account_name = ''
+    for account in accounts:
+        if account['Id'] == payer_account_id:
+            payer_account_name = account['Name']
+
+    logging.info(f"Found {len(accounts)} active account(s) in the organization with the management account {payer_account_id}")
+    return accounts, payer_account_id, payer_account_name
+
+#Analyses all the active accounts of the AWS Organization.
+#The accounts are listed with a single organizations:ListAccounts pagination, which also provides the account and payer names.
+#Accounts are spread across a pool of processes. Each process writes the findings of an account to a part file,
+#and the part files are merged into one consolidated findings file (and run report) as the accounts complete.
+class OrganizationAnalyser(AccountAnalyser):
+
+    def __init__(self):
+        self.run_report = []
+        #Used here only to start (or resume) the run. Each account is checkpointed by the process that analyses it.
+        self.checkpoint_journal = CheckpointJournal(utils.config_info.checkpoint_file_name) if utils.config_info.checkpoint else None
+
+        self.get_organization_information()
+
+        self.account_id = self.payer_account_id
+        self.account_name = self.payer_account_name
+
+        if utils.config_info.filename_with_accountid:
+            self.init_output_files(f"Fault_Tolerance_Findings_{self.payer_account_id}_{self.payer_account_name}_Organization")
+        else:
+            self.init_output_files("Fault_Tolerance_Findings")
+        if self.checkpoint_journal:
+            self.checkpoint_journal.close()
+
+        if utils.config_info.no_local_output: #The part files are still needed, but only until they are merged
+            self.parts_folder_name = tempfile.mkdtemp(prefix = "fault_tolerance_parts_") + "/"
+        else:
+            self.parts_folder_name = f"{utils.config_info.output_folder_name}parts_{os.getpid()}/"
+        self.output_stream = None
+
+    def get_organization_information(self):
+        self.accounts, self.payer_account_id, self.payer_account_name = get_organization_accounts()
+
+    def get_findings(self):
+        start = datetime.datetime.now().astimezone()
+
+        os.makedirs(self.parts_folder_name, exist_ok=True)
+
+        max_processes = max(1, min(utils.config_info.max_processes, len(self.accounts)))
+
+        #The part files are streamed to the bucket as they are merged, so the consolidated findings file is uploaded while the other accounts are still being analysed
+        if utils.config_info.stream_to_s3:
+            self.output_stream = S3StreamingUpload(utils.config_info.bucket_name,
+                                                   utils.config_info.output_folder_name+self.output_file_name+".gz",
+                                                   utils.get_s3_transfer_config())
+            csv.writer(self.output_stream).writerow(self.keys)
+
+        #'spawn' so that worker processes do not inherit the threads and open connections of this process
+        with ProcessPoolExecutor(max_workers = max_processes,
+                                 mp_context = multiprocessing.get_context('spawn'),
+                                 initializer = init_worker,
+                                 initargs = (utils.config_info,)) as executor:
+            futures = {}
+            for account in self.accounts:
+                part_file_full_path = f"{self.parts_folder_name}{account['Id']}.csv"
+                future = executor.submit(analyse_account, account, self.payer_account_id, self.payer_account_name, part_file_full_path)
+                futures[future] = (account, part_file_full_path)
+
+            for future in as_completed(futures):
+                account, part_file_full_path = futures[future]
+                try:
+                    self.run_report.extend(future.result())
+                    logging.info(f"Completed analysing the account {account['Id']}")
+                except Exception as error:
+                    logging.error(f"Analysing the account {account['Id']} failed: {error}")
+                    failed_at = datetime.datetime.now().astimezone()
+                    self.run_report.append(
+                                            {
+                                            'account_id' : account['Id'],
+                                            'region'  : 'ALL',
+                                            'service' : 'ALL',
+                                            'result'  : 'Failure',
+                                            'error_message' : str(error),
+                                            'start_time' : start.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                            'end_time' : failed_at.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                            'runtime_in_seconds' : round((failed_at-start).total_seconds(), 2)
+                                            }
+                                        )
+                self.merge_part_file(part_file_full_path)
+
+        shutil.rmtree(self.parts_folder_name, ignore_errors=True)
+
+        #Parquet files are pushed by the sink in each process as they are written
+        if self.output_stream:
+            try:
+                self.output_stream.close()
+            except Exception as error:
+                logging.error(f"Could not upload the findings file to the bucket: {error}")
+        elif utils.config_info.bucket_name and utils.config_info.output_format == 'csv':
+            self.push_file_to_s3(self.output_file_full_path, self.output_file_name)
+
+        end = datetime.datetime.now().astimezone()
+
+        self.run_report.append(
+                                {
+                                'account_id' : 'Organization',
+                                'region'  : 'Overall',
+                                'service' : 'Overall',
+                                'result'  : 'N/A',
+                                'error_message' : 'N/A',
+                                'start_time' : start.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                'end_time' : end.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                'runtime_in_seconds' : round((end-start).total_seconds(), 2)
+                                }
+                            )
+
+        logging.info(f"Total time taken for the organization is {end-start} seconds")
+
+    #Appends the findings in the part file (without its header) to the consolidated findings file and/or the stream to the bucket, and removes the part file
+    def merge_part_file(self, part_file_full_path):
+        if not os.path.isfile(part_file_full_path):
+            return
+        with open(part_file_full_path, 'r', newline='') as part_file:
+            part_file.readline()
+            if utils.config_info.no_local_output:
+                shutil.copyfileobj(part_file, self.output_stream)
+            else:
+                with open(self.output_file_full_path, 'a', newline='') as output_file:
+                    for chunk in iter(lambda: part_file.read(1024 * 1024), ''):
+                        output_file.write(chunk)
+                        if self.output_stream:
+                            self.output_stream.write(chunk)
+        os.remove(part_file_full_path)
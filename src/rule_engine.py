@@ -0,0 +1,199 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import operator
+import itertools
+import utils
+from state_store import get_field
+from service_analyser import ServiceAnalyser
+
+#A column of an InventoryTable, or a value computed from columns for every row of the table.
+#Expressions are built with the comparison operators, & (and), | (or), ~ (not) and the methods below. They are evaluated over all the
+#rows of a table at once, each operator being a single map over whole columns, and the result of every expression is kept in the table
+#so that an expression shared by several rules is evaluated only once.
+class Expression():
+
+    __hash__ = object.__hash__ #Expressions are keys of InventoryTable.evaluated, even though == builds an expression
+
+    def evaluate(self, table):
+        values = table.evaluated.get(self)
+        if values is None:
+            values = self.compute(table)
+            table.evaluated[self] = values
+        return values
+
+    def compute(self, table):
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        return Operation(operator.eq, self, other)
+
+    def __ne__(self, other):
+        return Operation(operator.ne, self, other)
+
+    def __lt__(self, other):
+        return Operation(operator.lt, self, other)
+
+    def __le__(self, other):
+        return Operation(operator.le, self, other)
+
+    def __gt__(self, other):
+        return Operation(operator.gt, self, other)
+
+    def __ge__(self, other):
+        return Operation(operator.ge, self, other)
+
+    #The operands of &, | and ~ must be conditions (expressions whose values are True or False)
+    def __and__(self, other):
+        return Operation(operator.and_, self, other)
+
+    def __or__(self, other):
+        return Operation(operator.or_, self, other)
+
+    def __invert__(self):
+        return Operation(operator.not_, self)
+
+    #Number of items of a list, set or dict value. 0 for None.
+    def length(self):
+        return Operation(get_length, self)
+
+    def is_in(self, values):
+        return Operation(frozenset(values).__contains__, self)
+
+    def is_none(self):
+        return Operation(operator.is_, self, None)
+
+    def is_not_none(self):
+        return Operation(operator.is_not, self, None)
+
+    #Item of a dict value. None if the value is None or does not have the key.
+    def item(self, key):
+        return Operation(lambda value: value.get(key) if value else None, self)
+
+def get_length(value):
+    return len(value) if value is not None else 0
+
+class Column(Expression):
+
+    def __init__(self, name):
+        self.name = name
+
+    def compute(self, table):
+        return table.columns[self.name]
+
+class Operation(Expression):
+
+    #Operands that are not expressions are constants
+    def __init__(self, function, *operands):
+        self.function = function
+        self.operands = operands
+
+    def compute(self, table):
+        columns = [operand.evaluate(table) if isinstance(operand, Expression) else itertools.repeat(operand, table.row_count)
+                   for operand in self.operands]
+        return list(map(self.function, *columns))
+
+def column(name):
+    return Column(name)
+
+#Resources of one type, as returned by the API, turned into columns. columns maps the name of each column to either the path of a field
+#of the resource (see state_store.get_field) or a function that computes the value of the column from the resource.
+class InventoryTable():
+
+    def __init__(self, resources, columns):
+        self.resources = resources
+        self.row_count = len(resources)
+        self.columns = {name: get_column(resources, extractor) for name, extractor in columns.items()}
+        self.evaluated = {}
+
+    #Values of the row, keyed by column name. Used to format the fields of the finding of the row.
+    def get_row(self, row_index):
+        return {name: values[row_index] for name, values in self.columns.items()}
+
+def get_column(resources, extractor):
+    if callable(extractor):
+        return list(map(extractor, resources))
+    if '.' not in extractor and '[]' not in extractor:
+        return [resource.get(extractor) for resource in resources]
+    return [get_field(resource, extractor) for resource in resources]
+
+#A finding is produced for every resource for which the condition is true, unless an earlier rule of the resource type matched it.
+#A rule without a condition matches every resource, so it is the last rule of a resource type. message is formatted (str.format) with
+#the values of the row of the resource, for example "Cluster {Name} has no replicas".
+class Rule():
+
+    def __init__(self, condition, potential_issue, message):
+        self.condition = condition
+        self.potential_issue = potential_issue
+        self.message = message
+
+#Rules of one type of resource of a service, with how the resources are listed and turned into an InventoryTable.
+#key is the column that identifies a resource in incremental mode, and finding_fields the templates (like the messages of the rules)
+#of the resource fields of the findings.
+class ResourceRules():
+
+    def __init__(self, client_name, method_name, top_level_member, columns, key, fingerprint_fields, finding_fields, rules, params = None):
+        self.client_name = client_name
+        self.method_name = method_name
+        self.top_level_member = top_level_member
+        self.columns = columns
+        self.key = key
+        self.fingerprint_fields = fingerprint_fields
+        self.finding_fields = finding_fields
+        self.rules = rules
+        self.params = params if params else {}
+
+    #Index of the first rule that matches each row of the table, or None if no rule matches it
+    def match(self, table):
+        matches = [None] * table.row_count
+        unmatched_count = table.row_count
+        for rule_index, rule in enumerate(self.rules):
+            if unmatched_count == 0:
+                break
+            mask = rule.condition.evaluate(table) if rule.condition is not None else itertools.repeat(True, table.row_count)
+            for row_index in itertools.compress(range(table.row_count), mask):
+                if matches[row_index] is None:
+                    matches[row_index] = rule_index
+                    unmatched_count = unmatched_count - 1
+        return matches
+
+#An analyser whose rules are declared (in resource_rules) instead of coded. The resources of each type are read into tables of
+#table_row_count rows as they are listed, and the rules are evaluated over a whole table at once. A new rule is just a new Rule
+#in the resource_rules of the analyser.
+class RuleBasedAnalyser(ServiceAnalyser):
+
+    resource_rules = []
+
+    #Resources evaluated together. Bounds the memory used by a table while the findings are still written out as the listing goes on.
+    table_row_count = 1000
+
+    def get_findings(self):
+        for resource_rules in self.resource_rules:
+            client = self.get_aws_client(resource_rules.client_name)
+            resources = iter(utils.invoke_aws_api_full_list(getattr(client, resource_rules.method_name), resource_rules.top_level_member,
+                                                            **resource_rules.params))
+            while True:
+                table_resources = list(itertools.islice(resources, self.table_row_count))
+                if not table_resources:
+                    break
+                yield from self.get_findings_from_table(resource_rules, InventoryTable(table_resources, resource_rules.columns))
+
+    def get_findings_from_table(self, resource_rules, table):
+        matches = resource_rules.match(table)
+        keys = table.columns[resource_rules.key]
+        for row_index, resource in enumerate(table.resources):
+            #Unchanged resources are evaluated along with the rest of the table, but their previous findings are used
+            previous_findings = self.get_previous_findings(keys[row_index], resource, resource_rules.fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
+            if matches[row_index] is None:
+                continue
+            rule = resource_rules.rules[matches[row_index]]
+            row = table.get_row(row_index)
+            finding_rec = self.get_finding_rec_with_common_fields(resource_key = keys[row_index])
+            for field_name, template in resource_rules.finding_fields.items():
+                finding_rec[field_name] = template.format_map(row)
+            finding_rec['potential_issue'] = rule.potential_issue
+            finding_rec['message'] = rule.message.format_map(row)
+            yield finding_rec
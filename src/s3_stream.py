@@ -0,0 +1,103 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+import time
+import random
+import zlib
+import logging
+import utils
+from concurrent.futures import ThreadPoolExecutor
+
+#A write-only, file like object that gzips whatever is written to it and streams it to an S3 object with a multipart upload.
+#As soon as multipart_chunksize bytes of compressed data have been collected, they are uploaded as the next part on a thread pool,
+#with up to max_concurrency parts in flight (both from the TransferConfig). write() blocks while that many parts are in flight,
+#so the memory used is bounded by the part size and the concurrency, not by the size of the object.
+#If all the data fits in one part, the object is uploaded with a single put_object instead.
+#Every S3 call is retried with backoff. If the upload cannot be completed, it is aborted so that no incomplete parts are left behind.
+class S3StreamingUpload():
+
+    max_attempts = 3
+    base_backoff_in_seconds = 1
+
+    def __init__(self, bucket_name, key, transfer_config):
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = transfer_config.multipart_chunksize
+        self.s3 = utils.get_aws_client("s3")
+        self.executor = ThreadPoolExecutor(max_workers = transfer_config.max_concurrency, thread_name_prefix = 's3-stream')
+        self.parts_in_flight = threading.BoundedSemaphore(transfer_config.max_concurrency)
+        self.compressor = zlib.compressobj(wbits = 31) #31 means a gzip header and trailer
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = [] #(part number, future of the upload_part call)
+        self.uncompressed_size = 0
+        self.compressed_size = 0
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.uncompressed_size = self.uncompressed_size + len(data)
+        self.buffer.extend(self.compressor.compress(data))
+        if len(self.buffer) >= self.part_size:
+            self.upload_part(bytes(self.buffer))
+            self.buffer = bytearray()
+
+    def upload_part(self, data):
+        if not self.upload_id:
+            response = self.call_with_retries(self.s3.create_multipart_upload,
+                                              Bucket = self.bucket_name, Key = self.key,
+                                              ContentType = 'text/csv', ContentEncoding = 'gzip')
+            self.upload_id = response['UploadId']
+
+        part_number = len(self.parts) + 1
+        self.compressed_size = self.compressed_size + len(data)
+        self.parts_in_flight.acquire()
+        future = self.executor.submit(self.call_with_retries, self.s3.upload_part,
+                                      Bucket = self.bucket_name, Key = self.key, UploadId = self.upload_id,
+                                      PartNumber = part_number, Body = data)
+        future.add_done_callback(lambda future: self.parts_in_flight.release())
+        self.parts.append((part_number, future))
+
+    #Uploads whatever is left and completes the upload. Raises the error if the upload could not be completed.
+    def close(self):
+        data = bytes(self.buffer) + self.compressor.flush()
+        self.buffer = bytearray()
+        try:
+            if not self.upload_id:
+                self.compressed_size = len(data)
+                self.call_with_retries(self.s3.put_object,
+                                       Bucket = self.bucket_name, Key = self.key, Body = data,
+                                       ContentType = 'text/csv', ContentEncoding = 'gzip')
+            else:
+                self.upload_part(data) #The last part is allowed to be smaller than the part size
+                completed_parts = [{'PartNumber': part_number, 'ETag': future.result()['ETag']} for part_number, future in self.parts]
+                self.call_with_retries(self.s3.complete_multipart_upload,
+                                       Bucket = self.bucket_name, Key = self.key, UploadId = self.upload_id,
+                                       MultipartUpload = {'Parts': completed_parts})
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self.executor.shutdown(wait = True)
+
+        logging.info(f"Uploaded {self.key} to bucket {self.bucket_name} in {max(1, len(self.parts))} part(s): {self.uncompressed_size} bytes compressed to {self.compressed_size} bytes")
+
+    def abort(self):
+        if not self.upload_id:
+            return
+        try:
+            self.s3.abort_multipart_upload(Bucket = self.bucket_name, Key = self.key, UploadId = self.upload_id)
+            logging.error(f"Aborted the upload of {self.key} to bucket {self.bucket_name}")
+        except Exception as error:
+            logging.error(f"Could not abort the upload {self.upload_id} of {self.key} to bucket {self.bucket_name}: {error}")
+
+    def call_with_retries(self, api_method, **kwargs):
+        for attempt in range(self.max_attempts):
+            try:
+                return api_method(**kwargs)
+            except Exception as error:
+                if attempt == self.max_attempts - 1:
+                    raise error
+                backoff = self.base_backoff_in_seconds * (2 ** attempt)
+                logging.warning(f"{api_method.__name__} for {self.key} failed on attempt {attempt + 1}: {error}. Retrying.")
+                time.sleep(random.uniform(backoff / 2, backoff))
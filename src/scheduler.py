@@ -0,0 +1,111 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+import queue
+import time
+import logging
+from collections import namedtuple
+
+#name is used for logging, func is the callable that does the work
+WorkUnit = namedtuple('WorkUnit', ['name', 'func'])
+
+#Runs work units on a fixed number of worker threads that pull from a bounded queue.
+#The queue is fed lazily from an iterable of work units, so the number of threads and the memory used stay flat
+#irrespective of how many service+region combinations are scheduled.
+class WorkScheduler():
+
+    def __init__(self, max_workers, queue_size = None):
+        self.max_workers = max_workers
+        self.work_queue = queue.Queue(maxsize = queue_size if queue_size else 2 * max_workers)
+        self.lock = threading.Lock()
+        self.workers = []
+        self.busy_workers = 0
+        self.busy_seconds = 0.0
+        self.completed_count = 0
+        self.failed_count = 0
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def queue_depth(self):
+        return self.work_queue.qsize()
+
+    #Fraction of the workers that are currently running a work unit
+    @property
+    def utilisation(self):
+        with self.lock:
+            return self.busy_workers / self.max_workers
+
+    #Fraction of the available worker time (number of workers x elapsed time) that was spent running work units
+    @property
+    def average_utilisation(self):
+        end = self.end_time if self.end_time else time.time()
+        if not self.start_time or end == self.start_time:
+            return 0.0
+        with self.lock:
+            return self.busy_seconds / (self.max_workers * (end - self.start_time))
+
+    def get_stats(self):
+        return {
+                'queue_depth' : self.queue_depth,
+                'busy_workers' : self.busy_workers,
+                'max_workers' : self.max_workers,
+                'utilisation' : round(self.utilisation, 2),
+                'average_utilisation' : round(self.average_utilisation, 2),
+                'completed' : self.completed_count,
+                'failed' : self.failed_count
+                }
+
+    #work_units is an iterable of WorkUnit tuples. Blocks until all the work units have been run.
+    def run(self, work_units):
+        self.start_time = time.time()
+
+        for i in range(self.max_workers):
+            t = threading.Thread(target = self.worker, name = f"worker-{i}", daemon = True)
+            self.workers.append(t)
+            t.start()
+
+        try:
+            for work_unit in work_units:
+                self.work_queue.put(work_unit) #Blocks when the queue is full, which keeps the memory used flat
+        finally:
+            #One sentinel per worker to tell it that there is no more work. If the work units could not all be generated, the ones already
+            #queued are still run, and the error is passed on only once they are done, so that the caller never cleans up under running work units.
+            for t in self.workers:
+                self.work_queue.put(None)
+
+            for t in self.workers:
+                t.join()
+
+            self.end_time = time.time()
+            logging.info(f"Work scheduler finished: {self.get_stats()}")
+
+    def worker(self):
+        worker_name = threading.current_thread().name
+        while True:
+            work_unit = self.work_queue.get()
+            if work_unit is None:
+                break
+
+            name, func = work_unit.name, work_unit.func
+            threading.current_thread().name = name #So that the log messages show which service+region is being processed
+            logging.debug(f"Starting {name}. Scheduler stats: {self.get_stats()}")
+
+            with self.lock:
+                self.busy_workers = self.busy_workers + 1
+            start = time.time()
+            try:
+                func()
+                with self.lock:
+                    self.completed_count = self.completed_count + 1
+            except Exception:
+                #The work unit is expected to record its own failure in the run report. Log it and carry on with the rest.
+                logging.exception(f"Work unit {name} failed")
+                with self.lock:
+                    self.failed_count = self.failed_count + 1
+            finally:
+                with self.lock:
+                    self.busy_workers = self.busy_workers - 1
+                    self.busy_seconds = self.busy_seconds + (time.time() - start)
+                threading.current_thread().name = worker_name
@@ -8,141 +8,203 @@ import botocore
 import time
 import logging
 import datetime
-import csv
-import json
+from finding import Finding, FindingContext
+from state_store import get_fingerprint
+from throttling import ThrottleCounter, current_throttle_counter
+from api_metrics import ApiCallStats, current_api_call_stats
+import inventory
 
 class ServiceAnalyser(metaclass = ABCMeta):
 
+    #Names of the boto3 clients the analyser uses in the region it analyses. Used to pre-warm connections.
+    #The first one is also used to look up the regions in which the service is available.
+    client_names = []
+
+    #'regional' analysers are run in every region. A 'single-region' analyser is run only in its home_region (if that region is selected),
+    #and a 'global' one only once per account, in the first of the selected regions.
+    scope = 'regional'
+    home_region = None
+
+    #Cheap calls used to find out whether there are any resources to analyse, as (client name, method name, top level member, parameters).
+    #There are resources if any of them returns at least one item.
+    probe_calls = []
+
+    #Whether the analyser calls get_previous_findings for its resources, so that they can be carried forward with --incremental.
+    #The state of the work units of the other analysers is neither read nor written, and all their resources are always evaluated.
+    incremental = True
+
     def __init__ (self, account_analyser, region, service):
         self.service = service
+        self.service_key = service #Set to the name the analyser is registered under by analyser_registry.create_analyser
         self.region = region
         self.account_analyser = account_analyser
-        self.findings = []
         self.session = None
+        self.finding_context = None
+        #Used only in incremental mode
+        self.previous_state = {}
+        self.current_state = {}
+        self.skipped_count = 0
+        self.subnet_index = None
+        self.read_collections = set() #Names of the shared collections of the inventory that this analyser has read
 
     def get_aws_session(self):
-        if self.session:
-            return self.session
-        else:
-            return utils.get_aws_session(session_name = f"{self.service}_{self.region}_FaultToleranceAnalyser")
+        if not self.session:
+            self.session = utils.get_aws_session(account_id = self.account_analyser.account_id)
+        return self.session
+
+    def get_aws_client(self, service_name, region_name = None):
+        return utils.get_aws_client(service_name,
+                                    region_name = region_name if region_name else self.region,
+                                    account_id = self.account_analyser.account_id)
+
+    #Fetched only when the first resource that needs it is found, and shared with the other analysers of the region (see inventory.py)
+    def get_subnet_index(self):
+        if self.subnet_index is None:
+            self.subnet_index = inventory.get_subnet_index(self)
+        return self.subnet_index
+
+    #Returns whether the probe calls found any resources, or None if the analyser has no probe calls
+    def has_resources(self):
+        if not self.probe_calls:
+            return None
+        for client_name, method_name, top_level_member, params in self.probe_calls:
+            client = self.get_aws_client(client_name)
+            response = utils.invoke_aws_api(getattr(client, method_name), **params)
+            if response[top_level_member] or any(token in response for token in ("NextToken", "NextMarker", "Marker")):
+                return True
+        return False
 
     @utils.log_func
     def get_and_write_findings(self):
-        
-        with self.account_analyser.thread_limiter:
-            start = datetime.datetime.now().astimezone()
-            
-            try:
-                self.get_findings()
-                self.write_findings()
-                end = datetime.datetime.now().astimezone()
-                logging.info(f"Completed processing {self.service}+{self.region} in {round((end-start).total_seconds(), 2)} seconds.")
-                self.account_analyser.run_report.append(
-                                                            {   
-                                                            'account_id' : self.account_analyser.account_id,
-                                                            'region'  : self.region,
-                                                            'service' : self.service,
-                                                            'result'  :'Success',
-                                                            'error_message' :'',
-                                                            'start_time' : start.strftime("%Y_%m_%d_%H_%M_%S%z"),
-                                                            'end_time' : end.strftime("%Y_%m_%d_%H_%M_%S%z"),
-                                                            'runtime_in_seconds' : round((end-start).total_seconds(), 2)
-                                                            }
-                                                        )
-            except botocore.exceptions.BotoCoreError as error:
-                end = datetime.datetime.now().astimezone()
-                self.account_analyser.run_report.append(
-                                                            {   
-                                                            'account_id' : self.account_analyser.account_id,
-                                                            'region'  : self.region,
-                                                            'service' : self.service,
-                                                            'result'  :'Failure', 
-                                                            'error_message' : str(error), 
-                                                            'start_time' : start.strftime("%Y_%m_%d_%H_%M_%S%z"),
-                                                            'end_time' : end.strftime("%Y_%m_%d_%H_%M_%S%z"),
-                                                            'runtime_in_seconds' : round((end-start).total_seconds(), 2)
-                                                            }
-                                                        )
-                raise error
-            
 
+        start = datetime.datetime.now().astimezone()
+
+        #Shared by all the findings of this work unit. Its timestamp is the start time of the work unit.
+        self.finding_context = FindingContext(service = self.service,
+                                              region = self.region,
+                                              account_id = self.account_analyser.account_id,
+                                              account_name = self.account_analyser.account_name,
+                                              payer_account_id = self.account_analyser.payer_account_id,
+                                              payer_account_name = self.account_analyser.payer_account_name,
+                                              timestamp = start.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                              service_key = self.service_key)
+
+        state_store = self.account_analyser.state_store if self.incremental else None
+
+        #The throttled API calls of this work unit are counted here by the rate limiter
+        throttle_counter = ThrottleCounter()
+        counter_token = current_throttle_counter.set(throttle_counter)
+        #The API calls of this work unit are timed and counted here by the event handlers of the clients (see api_metrics)
+        api_call_stats = ApiCallStats(f"{self.service}+{self.region}")
+        stats_token = current_api_call_stats.set(api_call_stats)
+        run_report_rec = None
+
+        try:
+            #With --skip-empty-units, a work unit without any resources is recorded as skipped. The result is cached for the next runs.
+            availability_cache = self.account_analyser.availability_cache
+            if availability_cache and availability_cache.get(self.account_analyser.account_id, self.region, self.service) is None:
+                has_resources = self.has_resources()
+                if has_resources is not None:
+                    availability_cache.put(self.account_analyser.account_id, self.region, self.service, has_resources)
+                if has_resources is False:
+                    run_report_rec = self.account_analyser.add_skipped_unit(self.region, self.service, "No resources found")
+                    return
+
+            if state_store:
+                self.previous_state = state_store.get_unit_state(self.account_analyser.account_id, self.region, self.service)
+            self.write_findings(self.get_findings())
+            if state_store:
+                state_store.replace_unit_state(self.account_analyser.account_id, self.region, self.service, self.current_state)
+                logging.info(f"Carried forward the findings of {self.skipped_count} unchanged resource(s) for {self.service}+{self.region}")
+            end = datetime.datetime.now().astimezone()
+            logging.info(f"Completed processing {self.service}+{self.region} in {round((end-start).total_seconds(), 2)} seconds.")
+            run_report_rec = {
+                                'account_id' : self.account_analyser.account_id,
+                                'region'  : self.region,
+                                'service' : self.service,
+                                'result'  :'Success',
+                                'error_message' :'',
+                                'start_time' : start.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                'end_time' : end.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                'runtime_in_seconds' : round((end-start).total_seconds(), 2),
+                                'skipped_resource_count' : self.skipped_count if state_store else '',
+                                'throttled_call_count' : throttle_counter.throttled_call_count,
+                                'throttle_wait_in_seconds' : round(throttle_counter.wait_in_seconds, 2),
+                                **api_call_stats.get_run_report_fields()
+                                }
+            self.account_analyser.run_report.append(run_report_rec)
+        except Exception as error: #Any failure is recorded in the run report before it is passed on to the scheduler
+            end = datetime.datetime.now().astimezone()
+            run_report_rec = {
+                                'account_id' : self.account_analyser.account_id,
+                                'region'  : self.region,
+                                'service' : self.service,
+                                'result'  :'Failure', 
+                                'error_message' : str(error), 
+                                'start_time' : start.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                'end_time' : end.strftime("%Y_%m_%d_%H_%M_%S%z"),
+                                'runtime_in_seconds' : round((end-start).total_seconds(), 2),
+                                'throttled_call_count' : throttle_counter.throttled_call_count,
+                                'throttle_wait_in_seconds' : round(throttle_counter.wait_in_seconds, 2),
+                                **api_call_stats.get_run_report_fields()
+                                }
+            self.account_analyser.run_report.append(run_report_rec)
+            raise error
+        finally:
+            current_throttle_counter.reset(counter_token)
+            current_api_call_stats.reset(stats_token)
+            inventory.release_collections(self.account_analyser, self.region, self.service_key, self.read_collections)
+            #Findings written before a failure are kept, so the end of the work unit is marked either way
+            self.account_analyser.findings_pipeline.end_unit(self.finding_context, run_report_rec)
+
+    #Must be a generator that yields one finding record at a time, so that findings are written out while the API results are still being paginated
     @abstractmethod
-    def get_findings(self, region):
+    def get_findings(self):
         pass
 
-    def get_finding_rec_with_common_fields(self):
-        finding_rec = {}
-        finding_rec["account_id"] = self.account_analyser.account_id
-        finding_rec["account_name"] = self.account_analyser.account_name
-        finding_rec["payer_account_id"] = self.account_analyser.payer_account_id
-        finding_rec["payer_account_name"] = self.account_analyser.payer_account_name
-        finding_rec['service'] = self.service
-        finding_rec['region'] = self.region
-
-        curr_time = datetime.datetime.now().astimezone()
-        finding_rec['timestamp'] = curr_time.strftime("%Y_%m_%d_%H_%M_%S%z")
-
-        return finding_rec
-
-    def write_findings(self):
-        self.write_findings_to_file()
-        #If an event bus is provided publish any issues to event bridge
-        if (utils.config_info.event_bus_arn):
-            self.publish_findings_to_event_bridge()
-
-    #This function will be called by the threads to write to the output file. So it must use a lock before opening and writing to the file.
-    def write_findings_to_file(self):
+    #resource_key is the key passed to get_previous_findings for the resource of the finding, so that the finding is kept in its state.
+    #Findings that are not about any one resource are created without it, and are not kept in the state.
+    def get_finding_rec_with_common_fields(self, resource_key = None):
+        return Finding(self.finding_context, resource_key)
+
+    #Used by the analysers for incremental scanning. Must be called for every resource before its findings are yielded.
+    #fingerprint_fields are the paths (see state_store.get_field) of the fields of the resource that the rules of the analyser read.
+    #If the fingerprint of those fields is the same as in the previous run, the previous findings of the resource are returned,
+    #and the analyser yields them instead of evaluating its rules again. Otherwise (or when not in incremental mode) None is returned.
+    def get_previous_findings(self, resource_key, resource, fingerprint_fields):
+        if not self.account_analyser.state_store:
+            return None
+
+        fingerprint = get_fingerprint(resource, fingerprint_fields)
+        self.current_state[resource_key] = (fingerprint, []) #The findings are added as they are written
+
+        previous_state = self.previous_state.get(resource_key)
+        if not previous_state or previous_state[0] != fingerprint:
+            return None
+
+        self.skipped_count = self.skipped_count + 1
+        previous_findings = []
+        for resource_fields in previous_state[1]:
+            finding_rec = self.get_finding_rec_with_common_fields(resource_key)
+            for key, value in resource_fields.items():
+                finding_rec[key] = value
+            finding_rec.carried_forward = True
+            previous_findings.append(finding_rec)
+        return previous_findings
+
+    #Consumes the findings generator and hands each finding over to the findings pipeline of the account analyser as soon as it is produced.
+    #The pipeline does the file and network I/O on a writer thread of its own.
+    def write_findings(self, findings):
+        for finding_rec in findings:
+            resource_state = self.current_state.get(finding_rec.resource_key) if finding_rec.resource_key is not None else None
+            if resource_state is not None:
+                resource_state[1].append(finding_rec.get_resource_fields())
 
-        #Log findings
-        for finding_rec in self.findings:
             if finding_rec['potential_issue']:
                 logging.error(finding_rec['message'])
             else:
                 logging.info(finding_rec['message'])
 
-        #Write findings to output file
-        if len(self.findings) > 0:
-            keys = self.findings[0].keys()
-            if self.account_analyser.lock.acquire():
-                with open(self.account_analyser.output_file_full_path, 'a', newline='') as output_file:
-                    dict_writer = csv.DictWriter(output_file, self.account_analyser.keys)
-                    if utils.config_info.report_only_issues: #If the "report-only-issues" flag is set, go through each finding and write out only those that are identified as a potential issue
-                        for finding_rec in self.findings:
-                            if finding_rec['potential_issue']:
-                                dict_writer.writerow(finding_rec)
-                    else: #If the "report-only-issues" flag is not set, then Write all findings
-                        dict_writer.writerows(self.findings)
-                self.account_analyser.lock.release()
-
-    def publish_findings_to_event_bridge(self):
-        session = self.get_aws_session()
-
-        #Get the event bus region name from the event bus ARN. That region has to be used as cross region API calls are not permitted.
-        event_bus_region = (utils.parse_arn(utils.config_info.event_bus_arn))['region']
-
-        events = session.client("events", region_name = event_bus_region)
-
-        entries = []
-
-        total_entries_count = 0
-
-        for finding_rec in self.findings:
-            if (not utils.config_info.report_only_issues) or (utils.config_info.report_only_issues and finding_rec['potential_issue']):
-                entries.append(
-                    {
-                        'Time': datetime.datetime.now().astimezone(),
-                        'Source': 'FaultToleranceAnalyser',
-                        'DetailType': 'FaultToleranceIssue',
-                        'Detail': json.dumps(finding_rec),
-                        'EventBusName' : utils.config_info.event_bus_arn
-                    }
-                )
-                total_entries_count = total_entries_count+1
-                if len(entries) == 10: #Call put-events in batches of 10 each because the API does not accept more than that many events in 1 call.
-                    response = events.put_events(Entries = entries)
-                    events.clear()
-
-        if len(entries) > 0:
-            response = events.put_events(Entries = entries)
-        
-        logging.info(f"Published {total_entries_count} finding(s) for {self.service} in {self.region} to Eventbridge")
+            #If the "report-only-issues" flag is set, write out only those findings that are identified as a potential issue
+            if (not utils.config_info.report_only_issues) or finding_rec['potential_issue']:
+                self.account_analyser.findings_pipeline.put(finding_rec)
@@ -8,14 +8,23 @@ from service_analyser import ServiceAnalyser
 
 class CloudHSMAnalyser(ServiceAnalyser):
 
+    client_names = ["cloudhsmv2"]
+    probe_calls = [("cloudhsmv2", "describe_clusters", "Clusters", {'MaxResults': 1})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    fingerprint_fields = ['ClusterId', 'Hsms[].AvailabilityZone']
+
     def __init__(self, account_analyser, region):
-        super().__init__(account_analyser, region, 'efs')
+        super().__init__(account_analyser, region, 'cloudhsm')
 
     def get_findings(self):
-        session = self.get_aws_session()
-        efs = session.client("cloudhsmv2", region_name=self.region)
+        cloudhsm = self.get_aws_client("cloudhsmv2")
 
-        for cluster in utils.invoke_aws_api_full_list(efs.describe_clusters, "Clusters"):
+        for cluster in utils.invoke_aws_api_full_list(cloudhsm.describe_clusters, "Clusters"):
+            previous_findings = self.get_previous_findings(cluster['ClusterId'], cluster, self.fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
 
             finding_rec = self.get_finding_rec_from_response(cluster)
 
@@ -35,12 +44,12 @@ class CloudHSMAnalyser(ServiceAnalyser):
                 else: #len(azs) > 1
                     finding_rec['potential_issue'] = False
                     finding_rec['message'] = f"CloudHSM: Cloud HSM cluster {cluster['ClusterId']} has {len(cluster['Hsms'])} hsms and they are spread across multiple AZs: {list(azs)}"
-            self.findings.append(finding_rec)
+            yield finding_rec
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response(self, cluster):
 
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = cluster['ClusterId'])
         finding_rec['resource_id'] = cluster['ClusterId']
         finding_rec['resource_name'] = cluster['ClusterId']
         finding_rec['resource_arn'] = f"arn:aws:cloudhsm:{self.region}:{self.account_analyser.account_id}:cluster/{cluster['ClusterId']}"
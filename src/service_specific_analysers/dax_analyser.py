@@ -8,14 +8,23 @@ from service_analyser import ServiceAnalyser
 
 class DAXAnalyser(ServiceAnalyser):
 
+    client_names = ["dax"]
+    probe_calls = [("dax", "describe_clusters", "Clusters", {'MaxResults': 20})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    fingerprint_fields = ['ClusterName', 'ClusterArn', 'Nodes[].AvailabilityZone']
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'dax')
 
     def get_findings(self):
-        session = self.get_aws_session()
-        dax = session.client("dax", region_name=self.region)
+        dax = self.get_aws_client("dax")
 
         for cluster in utils.invoke_aws_api_full_list(dax.describe_clusters, "Clusters"):
+            previous_findings = self.get_previous_findings(cluster['ClusterArn'], cluster, self.fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
             finding_rec = self.get_finding_rec_from_response(cluster)
             azs = {node['AvailabilityZone'] for node in cluster["Nodes"]}
 
@@ -25,12 +34,12 @@ class DAXAnalyser(ServiceAnalyser):
             else:
                 finding_rec['potential_issue'] = True
                 finding_rec['message'] = f"All nodes in the DAX cluster  {cluster['ClusterName']} are in a single AZ {azs}"
-            self.findings.append(finding_rec)
+            yield finding_rec
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response(self, cluster):
 
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = cluster['ClusterArn'])
         finding_rec['resource_id'] = ''
         finding_rec['resource_name'] = cluster['ClusterName']
         finding_rec['resource_arn'] = cluster['ClusterArn']
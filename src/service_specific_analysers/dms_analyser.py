@@ -8,15 +8,22 @@ from service_analyser import ServiceAnalyser
 
 class DMSAnalyser(ServiceAnalyser):
 
+    client_names = ["dms"]
+    probe_calls = [("dms", "describe_replication_instances", "ReplicationInstances", {'MaxRecords': 20})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    instance_fingerprint_fields = ['ReplicationInstanceIdentifier', 'ReplicationInstanceArn', 'MultiAZ', 'AvailabilityZone', 'SecondaryAvailabilityZone']
+    #The findings of a task are about its replication instance, so the fields of the instance read by the rules are part of its fingerprint
+    task_fingerprint_fields = ['ReplicationTaskIdentifier', 'ReplicationTaskArn', 'ReplicationInstanceArn',
+                               'ReplicationInstance.MultiAZ', 'ReplicationInstance.ReplicationInstanceIdentifier', 'ReplicationInstance.AZs']
+
     def __init__(self, account_analyser, region):
         self.dms_instances = {}
         super().__init__(account_analyser, region, 'dms')
 
     def get_findings(self):
 
-        session = self.get_aws_session()
-
-        dms = session.client("dms", region_name=self.region)
+        dms = self.get_aws_client("dms")
 
         #Go through the instances, and gather findings.
         for repl_inst in utils.invoke_aws_api_full_list(dms.describe_replication_instances, "ReplicationInstances"):
@@ -28,6 +35,10 @@ class DMSAnalyser(ServiceAnalyser):
                                                 repl_inst["SecondaryAvailabilityZone"] if "SecondaryAvailabilityZone" in repl_inst else None
                                                 ]
             }
+            previous_findings = self.get_previous_findings(repl_inst['ReplicationInstanceArn'], repl_inst, self.instance_fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
             finding_rec = self.get_finding_rec_from_inst_response(repl_inst)
 
             if repl_inst["MultiAZ"]:
@@ -36,14 +47,21 @@ class DMSAnalyser(ServiceAnalyser):
             else:
                 finding_rec['potential_issue'] = True
                 finding_rec['message'] = f"DMS Replication Instance: {repl_inst['ReplicationInstanceIdentifier']} with ARN {repl_inst['ReplicationInstanceArn']} is on an instance in a single AZ"
-            self.findings.append(finding_rec)
+            yield finding_rec
 
         #Go through the tasks and gather findings.
         for repl_task in utils.invoke_aws_api_full_list(dms.describe_replication_tasks, "ReplicationTasks"):
 
+            dms_instance_arn = repl_task["ReplicationInstanceArn"]
+            previous_findings = self.get_previous_findings(repl_task['ReplicationTaskArn'],
+                                                           {**repl_task, 'ReplicationInstance': self.dms_instances[dms_instance_arn]},
+                                                           self.task_fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
+
             finding_rec = self.get_finding_rec_from_task_response(repl_task)
 
-            dms_instance_arn = repl_task["ReplicationInstanceArn"]
             if self.dms_instances[dms_instance_arn]["MultiAZ"]:
                 finding_rec['potential_issue'] = False
                 finding_rec['message'] = f"DMS Replication Task: {repl_task['ReplicationTaskIdentifier']} with ARN {repl_task['ReplicationTaskArn']} in on the replication instance {self.dms_instances[dms_instance_arn]['ReplicationInstanceIdentifier']} which is configured with multiple AZs: {self.dms_instances[dms_instance_arn]['AZs']}"
@@ -51,10 +69,10 @@ class DMSAnalyser(ServiceAnalyser):
                 finding_rec['potential_issue'] = True
                 finding_rec['message'] = f"DMS Replication Task: {repl_task['ReplicationTaskIdentifier']} with ARN {repl_task['ReplicationTaskArn']} is on the replication instance  {self.dms_instances[dms_instance_arn]['ReplicationInstanceIdentifier']} which is configured only in a single AZ {self.dms_instances[dms_instance_arn]['AZs'][0]}."
             
-            self.findings.append(finding_rec)
+            yield finding_rec
 
     def get_finding_rec_from_inst_response(self, repl_inst):
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = repl_inst['ReplicationInstanceArn'])
         finding_rec['resource_id'] = repl_inst['ReplicationInstanceIdentifier']
         finding_rec['resource_name'] = ''
         finding_rec['resource_arn'] = repl_inst['ReplicationInstanceArn']
@@ -62,7 +80,7 @@ class DMSAnalyser(ServiceAnalyser):
         return finding_rec 
 
     def get_finding_rec_from_task_response(self, repl_task):
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = repl_task['ReplicationTaskArn'])
         finding_rec['resource_id'] = repl_task['ReplicationTaskIdentifier']
         finding_rec['resource_name'] = ''
         finding_rec['resource_arn'] = repl_task['ReplicationTaskArn']
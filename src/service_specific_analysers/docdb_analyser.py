@@ -4,19 +4,28 @@
 import boto3
 import logging
 import utils
+import inventory
 from service_analyser import ServiceAnalyser
 
 class DocDBAnalyser(ServiceAnalyser):
 
+    client_names = ["docdb", "rds"] #The clusters are listed with the RDS API, see inventory.get_db_clusters
+    probe_calls = [("docdb", "describe_db_clusters", "DBClusters", {'MaxRecords': 20, 'Filters': [{'Name': 'engine', 'Values': ['docdb']}]})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    fingerprint_fields = ['DBClusterIdentifier', 'DBClusterArn', 'DbClusterResourceId', 'MultiAZ']
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'docdb')
 
     def get_findings(self):
-        session = self.get_aws_session()
-        docdb = session.client("docdb", region_name=self.region)
-
-        for db_cluster in utils.invoke_aws_api_full_list(docdb.describe_db_clusters, "DBClusters"):
-            if db_cluster["Engine"] == "docdb": #Neptune clusters could also be listed. Hence we need to look only for docdb
+        #Shared with the RDS analyser
+        for db_cluster in inventory.get_db_clusters(self):
+            if db_cluster["Engine"] in inventory.docdb_engines: #RDS and Neptune clusters could also be listed. Hence we need to look only for docdb
+                previous_findings = self.get_previous_findings(db_cluster['DBClusterArn'], db_cluster, self.fingerprint_fields)
+                if previous_findings:
+                    yield from previous_findings
+                    continue
                 finding_rec = self.get_finding_rec_from_response(db_cluster)
                 if db_cluster["MultiAZ"]:
                     finding_rec['potential_issue'] = False
@@ -24,12 +33,12 @@ class DocDBAnalyser(ServiceAnalyser):
                 else:
                     finding_rec['potential_issue'] = True
                     finding_rec['message'] = f"DocDB Cluster: {db_cluster['DBClusterIdentifier']} is in a single AZ"
-                self.findings.append(finding_rec)
+                yield finding_rec
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response(self, db_cluster):
 
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = db_cluster['DBClusterArn'])
         finding_rec['resource_id'] = db_cluster['DbClusterResourceId']
         finding_rec['resource_name'] = db_cluster['DBClusterIdentifier']
         finding_rec['resource_arn'] = db_cluster['DBClusterArn']
@@ -13,14 +13,21 @@ from service_analyser import ServiceAnalyser
 
 class DXAnalyser(ServiceAnalyser):
 
+    client_names = ["directconnect"]
+    probe_calls = [("directconnect", "describe_connections", "connections", {}),
+                   ("directconnect", "describe_virtual_interfaces", "virtualInterfaces", {})]
+
+    #The findings are about all the connections of the region together, and all the virtual interfaces of each virtual gateway together,
+    #so there is no single resource whose fingerprint could decide whether a finding changed. Always evaluated in full.
+    incremental = False
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'directconnect')
 
     def get_findings(self):
-        self.session = self.get_aws_session()
-        self.dx = self.session.client("directconnect", region_name=self.region)
-        self.get_conn_location_findings()
-        self.get_vif_findings()
+        self.dx = self.get_aws_client("directconnect")
+        yield from self.get_conn_location_findings()
+        yield from self.get_vif_findings()
 
     def get_conn_location_findings(self):
         no_of_connections = 0
@@ -47,7 +54,7 @@ class DXAnalyser(ServiceAnalyser):
                 finding_rec['potential_issue'] = False
                 finding_rec['message'] = f"Direct Connect:  There are more than 1 DX connetions, using more than one location in region {self.region}"
 
-        self.findings.append(finding_rec)
+        yield finding_rec
 
     #check VIF redundancy - https://docs.aws.amazon.com/awssupport/latest/user/fault-tolerance-checks.html#aws-direct-connect-virtual-interface-redundancy
     def get_vif_findings(self):
@@ -75,6 +82,7 @@ class DXAnalyser(ServiceAnalyser):
             else:
                 finding_rec['potential_issue'] = False
                 finding_rec['message'] = f"Direct Connect: There are more than 1 VIFs for the virtual gateway {vgw_id}, and the VIFs are on more than one DX connection."
+            yield finding_rec
 
 #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_dx_output(self):
@@ -8,14 +8,23 @@ from service_analyser import ServiceAnalyser
 
 class EFSAnalyser(ServiceAnalyser):
 
+    client_names = ["efs"]
+    probe_calls = [("efs", "describe_file_systems", "FileSystems", {'MaxItems': 1})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    fingerprint_fields = ['FileSystemId', 'FileSystemArn', 'Tags', 'AvailabilityZoneId', 'NumberOfMountTargets']
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'efs')
 
     def get_findings(self):
-        session = self.get_aws_session()
-        efs = session.client("efs", region_name=self.region)
+        efs = self.get_aws_client("efs")
 
         for fs in utils.invoke_aws_api_full_list(efs.describe_file_systems, "FileSystems"):
+            previous_findings = self.get_previous_findings(fs['FileSystemArn'], fs, self.fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
             finding_rec = self.get_finding_rec_from_response(fs)
             if "AvailabilityZoneId" in fs: #Single AZ File system
                 finding_rec['potential_issue'] = True
@@ -26,11 +35,11 @@ class EFSAnalyser(ServiceAnalyser):
             else:
                 finding_rec['potential_issue'] = False
                 finding_rec['message'] = f"EFS: File system {fs['FileSystemId']} with ARN {fs['FileSystemArn'] } is a multi AZ enabled file system with more than one mount target"
-            self.findings.append(finding_rec)
+            yield finding_rec
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response(self, fs):
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = fs['FileSystemArn'])
         finding_rec['resource_id'] = fs['FileSystemId']
         finding_rec['resource_name'] = ''
         for tag in fs['Tags']:
@@ -4,102 +4,95 @@
 import boto3
 import logging
 import utils
-from service_analyser import ServiceAnalyser
+from rule_engine import RuleBasedAnalyser, ResourceRules, Rule, column
 
-class ElasticacheAnalyser(ServiceAnalyser):
+#AZs of the nodes of the first node group (shard) of a replication group
+def get_first_node_group_azs(repl_group):
+    if not repl_group["NodeGroups"]:
+        return set()
+    return {node.get("PreferredAvailabilityZone") for node in repl_group["NodeGroups"][0]["NodeGroupMembers"]}
 
-    def __init__(self, account_analyser, region):
-        super().__init__(account_analyser, region, 'elasticache')
-
-    def get_findings(self):
-        self.session = self.get_aws_session()
-        self.elasticache = self.session.client("elasticache", region_name=self.region)
-        self.get_memcache_single_node_redis_findings()
-        self.get_redis_replication_group_findings()
-
-    def get_memcache_single_node_redis_findings(self):
+#The first node group (shard) of a replication group that has no replicas, or that has all its nodes in the same AZ
+def get_first_weak_node_group(repl_group):
+    for node_group in repl_group["NodeGroups"]:
+        azs = {node.get("PreferredAvailabilityZone") for node in node_group["NodeGroupMembers"]}
+        if len(node_group["NodeGroupMembers"]) == 1 or len(azs) == 1:
+            return {'NodeGroupId': node_group['NodeGroupId'], 'member_count': len(node_group["NodeGroupMembers"]), 'azs': azs}
+    return None
 
-        #Get memcached and single node Redis clusters        
-        for cluster in utils.invoke_aws_api_full_list(self.elasticache.describe_cache_clusters, "CacheClusters", ShowCacheClustersNotInReplicationGroups = True):
-            finding_rec = self.get_output_from_memcache_single_node_redis_response(cluster)
-            finding_rec['potential_issue'] = True
-            if cluster['Engine'] == 'redis': #Single node redis cluster
-                finding_rec['message'] = f"Elasticache-Redis cluster: {cluster['CacheClusterId']} is a single Node Elasticache-Redis cluster"
-            else: #Memcached cluster
-                finding_rec['message'] = f"Elasticache-Memcached cluster: {cluster['CacheClusterId']} is a single AZ issue even if there are multiple nodes in multiple AZs as the data is not replicated between nodes."
-            self.findings.append(finding_rec)
+node_group_count = column('NodeGroups').length()
+multi_az_disabled = column('MultiAZ') == 'disabled'
+replication_group_message_prefix = "Elasticache-Redis Replication Group: {ReplicationGroupId}:"
 
-    def get_output_from_memcache_single_node_redis_response(self, cluster):
+class ElasticacheAnalyser(RuleBasedAnalyser):
 
-        finding_rec = self.get_finding_rec_with_common_fields()
-        finding_rec['resource_id'] = cluster['CacheClusterId']
-        finding_rec['resource_name'] = cluster['CacheClusterId']
-        finding_rec['resource_arn'] = cluster['ARN']
-        finding_rec['engine'] = cluster['Engine']
-        return finding_rec 
+    client_names = ["elasticache"]
+    probe_calls = [("elasticache", "describe_cache_clusters", "CacheClusters", {'MaxRecords': 20})]
 
-    def get_redis_replication_group_findings(self):
-        #Get Redis replication group clusters
-        
-        for repl_group in utils.invoke_aws_api_full_list(self.elasticache.describe_replication_groups, "ReplicationGroups"):
-            finding_rec = self.get_output_from_redis_replication_group_response(repl_group)
-            if len(repl_group["NodeGroups"]) == 0 : #Cluster Mode disabled. And no node groups or shards. So the data is not replicated across nodes and so this is not single AZ failure resilient
-                finding_rec['potential_issue'] = True
-                finding_rec['message'] = f"Elasticache-Redis Replication Group: {repl_group['ReplicationGroupId']}: Cluster Mode disabled and no node groups configured"
-            elif len(repl_group["NodeGroups"]) == 1 : #Cluster Mode disabled. One node group/shard
-                if repl_group["AutomaticFailover"] == "disabled":
-                    finding_rec['potential_issue'] = True
-                    finding_rec['message'] = f"Elasticache-Redis Replication Group: {repl_group['ReplicationGroupId']}: Cluster Mode disabled, 1 Node group configured but Auto Failover is disabled"
-                elif repl_group["MultiAZ"] == "disabled": #Auto failover enabled, but multi AZ disabled
-                    node_group = repl_group["NodeGroups"][0]
-                    azs = set()
-                    for node in node_group["NodeGroupMembers"]:
-                        azs.add(node["PreferredAvailabilityZone"])
-                    if len(azs) == 1: #All nodes belong to the same AZ
-                        finding_rec['potential_issue'] = True
-                        finding_rec['message'] = f"Elasticache-Redis Replication Group: {repl_group['ReplicationGroupId']}: Cluster Mode disabled and Auto Failover is enabled, but all nodes are in the same AZ {azs}"
-                    else:
-                        finding_rec['potential_issue'] = False
-                        finding_rec['message'] = f"Elasticache-Redis Replication Group: {repl_group['ReplicationGroupId']}: Cluster Mode disabled, and Auto Failover is enabled. but the nodes are not in multiple AZs {azs}"
-                else: # Auto failover enabled and multi AZ enabled. So this is ok.
-                    finding_rec['potential_issue'] = False
-                    finding_rec['message'] = f"Elasticache-Redis Replication Group: {repl_group['ReplicationGroupId']}: Cluster Mode disabled, but Auto Failover and Multi AZ enabled"
-            # At this point len(repl_group["NodeGroups"]) > 1 which implies cluster mode is enabled.
-            # This means that Automatic failover is enabled by force.
-            # The customer does not have an option to disable it. So that need not be checked.
-            # Just make sure all nodes of a given shard are not in the same AZ and that each shard has a replication node.
-            elif repl_group["MultiAZ"] == "disabled":
-                #Check to see if any replicas are missing in any node groups, or if any node groups have all the nodes in the same AZ.
-                node_groups = repl_group["NodeGroups"]
-                issue_found = False
-                for node_group in node_groups:
-                    if len(node_group["NodeGroupMembers"]) == 1:
-                        finding_rec['potential_issue'] = True
-                        finding_rec['message'] = f"Elasticache-Redis Replication Group: {repl_group['ReplicationGroupId']}: Cluster Mode enabled, but no replicas in shard {node_group['NodeGroupId']}"
-                        issue_found = True
-                        break
-                    else:
-                        azs = set()
-                        for node in node_group["NodeGroupMembers"]:
-                            azs.add(node["PreferredAvailabilityZone"])
-                        if len(azs) == 1: #All nodes belong to the same AZ
-                            finding_rec['potential_issue'] = True
-                            finding_rec['message'] = f"Elasticache-Redis Replication Group: {repl_group['ReplicationGroupId']}: Cluster Mode enabled, but all nodes in shard {node_group['NodeGroupId']} are in the same AZ {azs}"
-                            issue_found = True
-                            break
-                if not issue_found: #All Node groups have been ok
-                    finding_rec['potential_issue'] = False
-                    finding_rec['message'] = f"Elasticache-Redis Replication Group: {repl_group['ReplicationGroupId']}: Cluster Mode enabled, all nodegroups have replicas and none of those node groups have all the nodes in the same AZ."
-            else:
-                finding_rec['potential_issue'] = False
-                finding_rec['message'] = f"Elasticache-Redis Replication Group: {repl_group['ReplicationGroupId']}: Cluster Mode enabled, and Multi AZ is enabled."
-            self.findings.append(finding_rec)
+    resource_rules = [
+        #Memcached and single node Redis clusters
+        ResourceRules(
+            client_name = "elasticache",
+            method_name = "describe_cache_clusters",
+            top_level_member = "CacheClusters",
+            params = {'ShowCacheClustersNotInReplicationGroups': True},
+            columns = {'CacheClusterId': 'CacheClusterId', 'ARN': 'ARN', 'Engine': 'Engine'},
+            key = 'ARN',
+            #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+            fingerprint_fields = ['CacheClusterId', 'ARN', 'Engine'],
+            finding_fields = {'resource_id': '{CacheClusterId}', 'resource_name': '{CacheClusterId}', 'resource_arn': '{ARN}', 'engine': '{Engine}'},
+            rules = [
+                Rule(column('Engine') == 'redis', True,
+                     "Elasticache-Redis cluster: {CacheClusterId} is a single Node Elasticache-Redis cluster"),
+                Rule(None, True, #Memcached cluster
+                     "Elasticache-Memcached cluster: {CacheClusterId} is a single AZ issue even if there are multiple nodes in multiple AZs as the data is not replicated between nodes.")
+            ]
+        ),
+        #Redis replication groups
+        ResourceRules(
+            client_name = "elasticache",
+            method_name = "describe_replication_groups",
+            top_level_member = "ReplicationGroups",
+            columns = {
+                'ReplicationGroupId': 'ReplicationGroupId',
+                'ARN': 'ARN',
+                'AutomaticFailover': 'AutomaticFailover',
+                'MultiAZ': 'MultiAZ',
+                'NodeGroups': 'NodeGroups',
+                'first_node_group_azs': get_first_node_group_azs,
+                'weak_node_group': get_first_weak_node_group
+            },
+            key = 'ARN',
+            fingerprint_fields = ['ReplicationGroupId', 'ARN', 'AutomaticFailover', 'MultiAZ', 'NodeGroups[].NodeGroupId', 'NodeGroups[].NodeGroupMembers[].PreferredAvailabilityZone'],
+            finding_fields = {'resource_id': '{ReplicationGroupId}', 'resource_name': '{ReplicationGroupId}', 'resource_arn': '{ARN}', 'engine': 'Redis'},
+            rules = [
+                #Cluster Mode disabled. And no node groups or shards. So the data is not replicated across nodes and so this is not single AZ failure resilient
+                Rule(node_group_count == 0, True,
+                     replication_group_message_prefix + " Cluster Mode disabled and no node groups configured"),
+                #Cluster Mode disabled. One node group/shard
+                Rule((node_group_count == 1) & (column('AutomaticFailover') == 'disabled'), True,
+                     replication_group_message_prefix + " Cluster Mode disabled, 1 Node group configured but Auto Failover is disabled"),
+                #Auto failover enabled, but multi AZ disabled and all nodes belong to the same AZ
+                Rule((node_group_count == 1) & multi_az_disabled & (column('first_node_group_azs').length() == 1), True,
+                     replication_group_message_prefix + " Cluster Mode disabled and Auto Failover is enabled, but all nodes are in the same AZ {first_node_group_azs}"),
+                Rule((node_group_count == 1) & multi_az_disabled, False,
+                     replication_group_message_prefix + " Cluster Mode disabled, and Auto Failover is enabled. but the nodes are not in multiple AZs {first_node_group_azs}"),
+                #Auto failover enabled and multi AZ enabled. So this is ok.
+                Rule(node_group_count == 1, False,
+                     replication_group_message_prefix + " Cluster Mode disabled, but Auto Failover and Multi AZ enabled"),
+                #More than one node group implies that cluster mode is enabled, and so is automatic failover (the customer does not have an option
+                #to disable it). So just make sure that each shard has a replica and that all nodes of a shard are not in the same AZ.
+                Rule(multi_az_disabled & (column('weak_node_group').item('member_count') == 1), True,
+                     replication_group_message_prefix + " Cluster Mode enabled, but no replicas in shard {weak_node_group[NodeGroupId]}"),
+                Rule(multi_az_disabled & column('weak_node_group').is_not_none(), True,
+                     replication_group_message_prefix + " Cluster Mode enabled, but all nodes in shard {weak_node_group[NodeGroupId]} are in the same AZ {weak_node_group[azs]}"),
+                Rule(multi_az_disabled, False,
+                     replication_group_message_prefix + " Cluster Mode enabled, all nodegroups have replicas and none of those node groups have all the nodes in the same AZ."),
+                Rule(None, False,
+                     replication_group_message_prefix + " Cluster Mode enabled, and Multi AZ is enabled.")
+            ]
+        )
+    ]
 
-    def get_output_from_redis_replication_group_response(self, repl_group):
-
-        finding_rec = self.get_finding_rec_with_common_fields()
-        finding_rec['resource_id'] = repl_group['ReplicationGroupId']
-        finding_rec['resource_name'] = repl_group['ReplicationGroupId']
-        finding_rec['resource_arn'] = repl_group['ARN']
-        finding_rec['engine'] = 'Redis' #This is the only possibility for replicationg groups.
-        return finding_rec 
+    def __init__(self, account_analyser, region):
+        super().__init__(account_analyser, region, 'elasticache')
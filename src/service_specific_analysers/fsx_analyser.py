@@ -8,28 +8,38 @@ from service_analyser import ServiceAnalyser
 
 class FSXAnalyser(ServiceAnalyser):
 
+    client_names = ["fsx", "ec2"]
+    probe_calls = [("fsx", "describe_file_systems", "FileSystems", {'MaxResults': 1})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    fingerprint_fields = ['FileSystemId', 'ResourceARN', 'Tags', 'SubnetIds']
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'fsx')
 
     def get_findings(self):
 
-        session = self.get_aws_session()
-        fsx = session.client("fsx", region_name=self.region)
+        fsx = self.get_aws_client("fsx")
 
         for fs in utils.invoke_aws_api_full_list(fsx.describe_file_systems, "FileSystems"):
             if fs['FileSystemType'] == "WINDOWS": #We look only at Windows File systems
+                previous_findings = self.get_previous_findings(fs['ResourceARN'], fs, self.fingerprint_fields)
+                if previous_findings:
+                    yield from previous_findings
+                    continue
                 finding_rec = self.get_finding_rec_from_response(fs)
-                if len(fs["SubnetIds"]) == 1:
+                #A multi AZ file system has its preferred and standby file servers in subnets of two different AZs
+                if len(fs["SubnetIds"]) == 1 or len(self.get_subnet_index().get_az_ids(fs["SubnetIds"])) == 1:
                     finding_rec['potential_issue'] = True
                     finding_rec['message'] = f"FSX: Windows File system {fs['FileSystemId']} with ARN {fs['ResourceARN'] } is a single AZ file system. Please check."
                 else:
                     finding_rec['potential_issue'] = False
                     finding_rec['message'] = f"FSX: Windows File system {fs['FileSystemId']} with ARN {fs['ResourceARN'] } is a multi AZ file system"
-                self.findings.append(finding_rec)
+                yield finding_rec
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response(self, fs):
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = fs['ResourceARN'])
         finding_rec['resource_id'] = fs['FileSystemId']
         finding_rec['resource_name'] = ''
         for tag in fs['Tags']:
@@ -3,31 +3,67 @@
 
 import boto3
 import logging
+import contextvars
 import utils
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from service_analyser import ServiceAnalyser
 
 class GlobalAcceleratorAnalyser(ServiceAnalyser):
 
-    def __init__(self, account_analyser, region):
-        super().__init__(account_analyser, region, 'globalaccelerator')
-
-    def get_findings(self):
+    client_names = ["globalaccelerator"]
+    scope = 'single-region'
+    home_region = 'us-west-2' #The Global Accelerator API is served only from us-west-2
+    probe_calls = [("globalaccelerator", "list_accelerators", "Accelerators", {'MaxResults': 1})]
 
-        if self.region == "us-west-2":
-            self.session = self.get_aws_session()
-            self.aga = self.session.client("globalaccelerator", region_name=self.region)
-            self.get_standard_accelerator_findings()
-        else:
-            logging.info(f"The service Global Accelerator operates only in us-west-2. Hence doing nothing for {self.region}")
-            return #Nothing to do since Global Accelerator operates only in us-west-2
+    #The findings of an accelerator depend on its listeners, endpoint groups and EC2 endpoints, none of which change the accelerator itself.
+    #A fingerprint would have to be taken after walking all of them, which is where all the time goes. Always evaluated in full.
+    incremental = False
 
-    def get_standard_accelerator_findings(self):
-        for accelerator in utils.invoke_aws_api_full_list(self.aga.list_accelerators, "Accelerators", ):
-            self.validate_standard_accelerator(accelerator)
+    def __init__(self, account_analyser, region):
+        super().__init__(account_analyser, region, 'globalaccelerator')
 
-    def validate_standard_accelerator(self, accelerator):
-        finding_rec = self.get_finding_rec_from_response(accelerator)
+    #Accelerators are validated in chunks. The listeners and endpoint groups of the accelerators of a chunk are walked concurrently, and then
+    #the AZs of all their EC2 endpoints are looked up together, per target region, in batches as large as describe_instances allows.
+    accelerator_chunk_size = 100
+    max_concurrent_walks = 8
+    describe_instances_batch_size = 1000
 
+    #Scheduled only in us-west-2 (see scope and home_region above)
+    def get_findings(self):
+        self.aga = self.get_aws_client("globalaccelerator")
+        self.instance_azs = {} #AZ of every EC2 instance looked up so far, keyed by (region, instance id). Shared by all the accelerators of the account.
+        with ThreadPoolExecutor(max_workers = self.max_concurrent_walks, thread_name_prefix = 'ga-walk') as executor:
+            accelerators = []
+            for accelerator in utils.invoke_aws_api_full_list(self.aga.list_accelerators, "Accelerators", MaxResults = self.accelerator_chunk_size):
+                accelerators.append(accelerator)
+                if len(accelerators) == self.accelerator_chunk_size:
+                    yield from self.validate_standard_accelerators(executor, accelerators)
+                    accelerators = []
+            if accelerators:
+                yield from self.validate_standard_accelerators(executor, accelerators)
+
+    def validate_standard_accelerators(self, executor, accelerators):
+        #Each walk runs in a copy of the current context, so that its API calls are counted against this work unit
+        futures = [executor.submit(contextvars.copy_context().run, self.get_endpoint_topology, accelerator) for accelerator in accelerators]
+        topologies = [future.result() for future in futures]
+
+        #Only the instances that are not in the cache yet are looked up
+        instance_ids_by_region = defaultdict(set)
+        for target_regions, ec2_instance_ids in topologies:
+            if ec2_instance_ids and len(target_regions) == 1:
+                region = next(iter(target_regions))
+                instance_ids_by_region[region].update(instance_id for instance_id in ec2_instance_ids if (region, instance_id) not in self.instance_azs)
+        for region, instance_ids in instance_ids_by_region.items():
+            self.look_up_azs_of_ec2_instances(sorted(instance_ids), region)
+
+        for accelerator, (target_regions, ec2_instance_ids) in zip(accelerators, topologies):
+            yield from self.validate_standard_accelerator(accelerator, target_regions, ec2_instance_ids)
+
+    #Returns the regions of the endpoint groups of the accelerator, and the ids of its EC2 instance endpoints.
+    #The walk stops as soon as a second region is found, as the accelerator is then multi region anyway.
+    #The instance ids are None if any of the endpoints is not an EC2 instance.
+    def get_endpoint_topology(self, accelerator):
         ec2_instance_ids = []
         target_regions = set()
         for listener in utils.invoke_aws_api_full_list(self.aga.list_listeners,
@@ -38,20 +74,30 @@ class GlobalAcceleratorAnalyser(ServiceAnalyser):
                                                 ListenerArn = listener["ListenerArn"]):
                 target_regions.add(endpoint_group["EndpointGroupRegion"])
                 if len(target_regions) > 1:
-                    #If multiple regions are available then they are Multi-AZ. No need to proceed further
-                    finding_rec['potential_issue'] = False
-                    finding_rec['message'] = f"Global Accelerator: {accelerator['Name']} has target endpoints are in multiple regions"
-                    fself.findings.append(finding_rec)
+                    return (target_regions, ec2_instance_ids)
                 for endpoint in endpoint_group["EndpointDescriptions"]:
                     if not endpoint["EndpointId"].startswith("i-"): #Not EC2 instance
-                        logging.info(f"Global Accelerator {accelerator['Name']} has endpoints that are not EC2 instances. Hence ignored.")
-                        return
-                    else:
-                        ec2_instance_ids.append(endpoint["EndpointId"])
+                        return (target_regions, None)
+                    ec2_instance_ids.append(endpoint["EndpointId"])
+        return (target_regions, ec2_instance_ids)
+
+    def validate_standard_accelerator(self, accelerator, target_regions, ec2_instance_ids):
+        finding_rec = self.get_finding_rec_from_response(accelerator)
+
+        if len(target_regions) > 1:
+            #If multiple regions are available then they are Multi-AZ. No need to proceed further
+            finding_rec['potential_issue'] = False
+            finding_rec['message'] = f"Global Accelerator: {accelerator['Name']} has target endpoints are in multiple regions"
+            yield finding_rec
+            return
+
+        if ec2_instance_ids is None:
+            logging.info(f"Global Accelerator {accelerator['Name']} has endpoints that are not EC2 instances. Hence ignored.")
+            return
 
-        #We have now collected all EC2 instances from all listeners and endpoint groups. Check the Availability zone of these EC2 instances now.
-        #So get all AZs to which these EC2 instances belong        
-        azs = self.get_azs_of_ec2_instances(ec2_instance_ids, next(iter(target_regions))) #We can use next(iter(target_regions) as we are sure there will be only one region. If there are more than one, we would not have come this far.
+        #All the endpoints are EC2 instances in a single region. Get all AZs to which these EC2 instances belong
+        region = next(iter(target_regions), None)
+        azs = {self.instance_azs[(region, instance_id)] for instance_id in ec2_instance_ids if (region, instance_id) in self.instance_azs}
 
         if (len(azs) > 1):
             finding_rec['potential_issue'] = False
@@ -60,34 +106,17 @@ class GlobalAcceleratorAnalyser(ServiceAnalyser):
             finding_rec['potential_issue'] = True
             finding_rec['message'] = f"Global Accelerator: All target endpoints for the acceleator {accelerator['Name']} are EC2 instances and they are all in a single AZ {azs}"
 
-        self.findings.append(finding_rec)
-
-    def get_azs_of_ec2_instances(self, ec2_instance_ids, region):
-        #First break up the EC2 instances in batches
-        ec2_instance_id_batches = [] #List of batches
-        batch_size = 10
-        ec2_instance_counter = 0
-
-        #Get the list of domain names and batch them in batch_size
-        for ec2_instance_id in ec2_instance_ids:
-            if ((ec2_instance_counter % batch_size) == 0):
-                ec2_instance_id_batches.append([])
-            ec2_instance_counter = ec2_instance_counter + 1
-            ec2_instance_id_batches[len(ec2_instance_id_batches)-1].append(ec2_instance_id)
-
-        azs = set()
-        ec2 = self.session.client("ec2", region_name = region)
-        #For each batch, invoke ec2 describe-instances and get the availability zones
-        for ec2_instance_id_batch in ec2_instance_id_batches:
-            resp = ec2.describe_instances(InstanceIds = ec2_instance_id_batch)
-            #print(resp)
-
-            for ec2_instance in utils.invoke_aws_api_full_list(ec2.describe_instances,
-                                                "Reservations",
-                                                InstanceIds = ec2_instance_id_batch):
-                azs.add(ec2_instance["Instances"][0]["Placement"]["AvailabilityZone"])
+        yield finding_rec
 
-        return(azs)
+    #Adds the AZs of the given EC2 instances to the cache
+    def look_up_azs_of_ec2_instances(self, ec2_instance_ids, region):
+        ec2 = self.get_aws_client("ec2", region_name = region)
+        for batch_start in range(0, len(ec2_instance_ids), self.describe_instances_batch_size):
+            for reservation in utils.invoke_aws_api_full_list(ec2.describe_instances,
+                                                "Reservations",
+                                                InstanceIds = ec2_instance_ids[batch_start:batch_start + self.describe_instances_batch_size]):
+                for ec2_instance in reservation["Instances"]:
+                    self.instance_azs[(region, ec2_instance["InstanceId"])] = ec2_instance["Placement"]["AvailabilityZone"]
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response(self, accelerator):
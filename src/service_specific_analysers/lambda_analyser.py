@@ -8,12 +8,17 @@ from service_analyser import ServiceAnalyser
 
 class LambdaAnalyser(ServiceAnalyser):
 
+    client_names = ["lambda", "ec2"]
+    probe_calls = [("lambda", "list_functions", "Functions", {'MaxItems': 1})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    fingerprint_fields = ['FunctionName', 'FunctionArn', 'VpcConfig.VpcId', 'VpcConfig.SubnetIds']
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'lambda')
 
     def get_findings(self):
-        session = self.get_aws_session()
-        aws_lambda = session.client("lambda", region_name=self.region)
+        aws_lambda = self.get_aws_client("lambda")
 
         for lambda_func in utils.invoke_aws_api_full_list(aws_lambda.list_functions, "Functions"):
 
@@ -21,19 +26,28 @@ class LambdaAnalyser(ServiceAnalyser):
                 continue
 
             if lambda_func["VpcConfig"]["VpcId"]: #If it is populated only then is it VPC Enabld. If not, this check can be ignored.
+                previous_findings = self.get_previous_findings(lambda_func['FunctionArn'], lambda_func, self.fingerprint_fields)
+                if previous_findings:
+                    yield from previous_findings
+                    continue
                 finding_rec = self.get_finding_rec_from_response(lambda_func)
-                if len(lambda_func["VpcConfig"]["SubnetIds"]) == 1:
+                subnet_ids = lambda_func["VpcConfig"]["SubnetIds"]
+                az_ids = self.get_subnet_index().get_az_ids(subnet_ids) if len(subnet_ids) > 1 else set(subnet_ids)
+                if len(subnet_ids) == 1:
                     finding_rec['potential_issue'] = True
                     finding_rec['message'] = f"Lambda: VPC Enabled Lambda function {lambda_func['FunctionName']} is configured to run in only one subnet."
+                elif len(az_ids) == 1:
+                    finding_rec['potential_issue'] = True
+                    finding_rec['message'] = f"Lambda: VPC Enabled Lambda function {lambda_func['FunctionName']} is configured to run in {len(subnet_ids)} subnets, all of them in the same AZ {next(iter(az_ids))}."
                 else:
                     finding_rec['potential_issue'] = False
-                    finding_rec['message'] = f"Lambda: VPC Enabled Lambda Function {lambda_func['FunctionName']} is configured to run in more than one subnet"
-                self.findings.append(finding_rec)
+                    finding_rec['message'] = f"Lambda: VPC Enabled Lambda Function {lambda_func['FunctionName']} is configured to run in subnets in more than one AZ"
+                yield finding_rec
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response(self, lambda_func):
 
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = lambda_func['FunctionArn'])
         finding_rec['resource_id'] = ''
         finding_rec['resource_name'] = lambda_func['FunctionName']
         finding_rec['resource_arn'] = lambda_func['FunctionArn']
@@ -9,46 +9,48 @@ from service_analyser import ServiceAnalyser
 
 class OpensearchAnalyser(ServiceAnalyser):
 
+    client_names = ["opensearch"]
+    probe_calls = [("opensearch", "list_domain_names", "DomainNames", {})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    fingerprint_fields = ['DomainId', 'DomainName', 'ARN', 'VPCOptions.AvailabilityZones']
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'opensearch')
 
+    #describe_domains takes up to 5 domain names, and up to max_concurrent_batches calls are made at a time
+    batch_size = 5
+    max_concurrent_batches = 4
+
     def get_findings(self):
 
-        session = self.get_aws_session()
-        opensearch = session.client("opensearch", region_name=self.region)
-        domain_name_batches = [] #List of batches
-        batch_size = 5
-        batch_counter = 0
-        domain_counter = 0
-
-        #Get the list of domain names and batch them in batch_size
-        for domain_name in utils.invoke_aws_api_full_list(opensearch.list_domain_names, "DomainNames"):
-            if ((domain_counter % batch_size) == 0):
-                domain_name_batches.append([])
-            domain_counter = domain_counter + 1
-            domain_name_batches[len(domain_name_batches)-1].append(domain_name['DomainName'])
-
-        #Validate the domain names in batches as the validate_opensearch_domains API can get information about multiple domains in one API call.
-        for domain_name_batch in domain_name_batches:
-            self.validate_opensearch_domains(opensearch, domain_name_batch)
-
-    def validate_opensearch_domains(self, opensearch, domain_names):
-
-        for domain in utils.invoke_aws_api_full_list(opensearch.describe_domains, "DomainStatusList", DomainNames = domain_names):
-            finding_rec = self.get_finding_rec_from_response(domain)
-            if len(domain["VPCOptions"]["AvailabilityZones"]) > 1:
-                finding_rec['potential_issue'] = False
-                finding_rec['message'] = f"Opensearch domain: Domain {domain['DomainName']} with ARN {domain['ARN'] } is multi AZ enabled."
-            else:
-                finding_rec['potential_issue'] = True
-                finding_rec['message'] = f"Opensearch domain: Domain {domain['DomainName']} with ARN {domain['ARN'] } is only in a single AZ."
-            self.findings.append(finding_rec)
+        self.opensearch = self.get_aws_client("opensearch")
+
+        #The batches are described while the domain names are still being listed, and findings are produced as the batches complete
+        domain_names = (domain_name['DomainName'] for domain_name in utils.invoke_aws_api_full_list(self.opensearch.list_domain_names, "DomainNames"))
+        for domain in utils.invoke_in_concurrent_batches(domain_names, self.batch_size, self.describe_domains, max_concurrent_batches = self.max_concurrent_batches):
+            yield from self.validate_opensearch_domain(domain)
+
+    def describe_domains(self, domain_names):
+        return list(utils.invoke_aws_api_full_list(self.opensearch.describe_domains, "DomainStatusList", DomainNames = domain_names))
+
+    def validate_opensearch_domain(self, domain):
+        previous_findings = self.get_previous_findings(domain['ARN'], domain, self.fingerprint_fields)
+        if previous_findings:
+            yield from previous_findings
+            return
+        finding_rec = self.get_finding_rec_from_response(domain)
+        if len(domain["VPCOptions"]["AvailabilityZones"]) > 1:
+            finding_rec['potential_issue'] = False
+            finding_rec['message'] = f"Opensearch domain: Domain {domain['DomainName']} with ARN {domain['ARN'] } is multi AZ enabled."
+        else:
+            finding_rec['potential_issue'] = True
+            finding_rec['message'] = f"Opensearch domain: Domain {domain['DomainName']} with ARN {domain['ARN'] } is only in a single AZ."
+        yield finding_rec
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response(self, domain):
-        finding_rec = self.get_finding_rec_with_common_fields()
-        finding_rec['service'] = 'opensearch'
-        finding_rec['region'] = self.region
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = domain['ARN'])
         finding_rec['resource_id'] = domain['DomainId']
         finding_rec['resource_name'] = domain['DomainName']
         finding_rec['resource_arn'] = domain['ARN']
@@ -4,27 +4,40 @@
 import boto3
 import logging
 import utils
+import inventory
 from service_analyser import ServiceAnalyser
 
 class RDSAnalyser(ServiceAnalyser):
 
+    client_names = ["rds"]
+    probe_calls = [("rds", "describe_db_instances", "DBInstances", {'MaxRecords': 20}),
+                   ("rds", "describe_db_clusters", "DBClusters", {'MaxRecords': 20})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    instance_fingerprint_fields = ['DBInstanceIdentifier', 'DBInstanceArn', 'Engine', 'MultiAZ']
+    cluster_fingerprint_fields = ['DBClusterIdentifier', 'DBClusterArn', 'Engine', 'MultiAZ']
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'rds')
 
     def get_findings(self):
-        self.session = self.get_aws_session()
-        self.rds = self.session.client("rds", region_name=self.region)
-        self.get_db_instance_findings()
-        self.get_db_cluster_findings()
+        self.rds = self.get_aws_client("rds")
+        yield from self.get_db_instance_findings()
+        yield from self.get_db_cluster_findings()
     
     def get_db_instance_findings(self):
-        for db_instance in utils.invoke_aws_api_full_list(self.rds.describe_db_instances, "DBInstances"):
+        for db_instance in utils.invoke_aws_api_full_list(self.rds.describe_db_instances, "DBInstances", MaxRecords = inventory.rds_max_records):
             if db_instance["Engine"] == "docdb": #Ignore any Document DB instances as they are covered separately.
                 continue
             
             if "DBClusterIdentifier" in db_instance: #This DB instance is part of a cluster. So it will be handled as part of cluster analyser
                 continue
 
+            previous_findings = self.get_previous_findings(db_instance['DBInstanceArn'], db_instance, self.instance_fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
+
             finding_rec = self.get_finding_rec_from_response_instance(db_instance)
 
             if db_instance["MultiAZ"]:
@@ -33,13 +46,19 @@ class RDSAnalyser(ServiceAnalyser):
             else:
                 finding_rec['potential_issue'] = True
                 finding_rec['message'] = f"RDS Instance: {db_instance['DBInstanceIdentifier']} has MultiAZ disabled"
-            self.findings.append(finding_rec)
+            yield finding_rec
 
     def get_db_cluster_findings(self):
-        for db_cluster in utils.invoke_aws_api_full_list(self.rds.describe_db_clusters, "DBClusters"):
-            if db_cluster["Engine"] in ["docdb","neptune"]: #Ignore any Document DB, Neptune clusters.
+        #Shared with the DocumentDB analyser
+        for db_cluster in inventory.get_db_clusters(self):
+            if db_cluster["Engine"] in inventory.non_rds_cluster_engines: #Ignore any Document DB, Neptune clusters.
                 continue
-            
+
+            previous_findings = self.get_previous_findings(db_cluster['DBClusterArn'], db_cluster, self.cluster_fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
+
             finding_rec = self.get_finding_rec_from_response_cluster(db_cluster)
 
             if db_cluster["MultiAZ"]:
@@ -48,12 +67,12 @@ class RDSAnalyser(ServiceAnalyser):
             else:
                 finding_rec['potential_issue'] = True
                 finding_rec['message'] = f"RDS Cluster {db_cluster['DBClusterIdentifier']} has MultiAZ disabled"
-            self.findings.append(finding_rec)
+            yield finding_rec
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response_instance(self, db_instance):
 
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = db_instance['DBInstanceArn'])
 
         finding_rec['resource_id'] = ''
         finding_rec['resource_name'] = db_instance['DBInstanceIdentifier']
@@ -63,7 +82,7 @@ class RDSAnalyser(ServiceAnalyser):
 
     def get_finding_rec_from_response_cluster(self, db_cluster):
 
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = db_cluster['DBClusterArn'])
 
         finding_rec['resource_id'] = ''
         finding_rec['resource_name'] = db_cluster['DBClusterIdentifier']
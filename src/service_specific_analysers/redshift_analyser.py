@@ -6,14 +6,23 @@ from service_analyser import ServiceAnalyser
 
 class RedshiftAnalyser(ServiceAnalyser):
 
+    client_names = ["redshift"]
+    probe_calls = [("redshift", "describe_clusters", "Clusters", {'MaxRecords': 20})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    fingerprint_fields = ['ClusterIdentifier', 'MultiAZ']
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'redshift')
 
     def get_findings(self):
-        session = self.get_aws_session()
-        redshift = session.client("redshift", region_name=self.region)
+        redshift = self.get_aws_client("redshift")
 
         for cluster in utils.invoke_aws_api_full_list(redshift.describe_clusters, "Clusters"):
+            previous_findings = self.get_previous_findings(cluster['ClusterIdentifier'], cluster, self.fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
             finding_rec = self.get_finding_rec_from_response(cluster)
             if cluster["MultiAZ"] == "Enabled":
                 finding_rec['potential_issue'] = False
@@ -21,12 +30,12 @@ class RedshiftAnalyser(ServiceAnalyser):
             else:
                 finding_rec['potential_issue'] = True
                 finding_rec['message'] = f"Redshift Cluster: {cluster['ClusterIdentifier']} is in a single AZ"
-            self.findings.append(finding_rec)
+            yield finding_rec
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response(self, cluster):
 
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = cluster['ClusterIdentifier'])
         finding_rec['resource_id'] = cluster['ClusterIdentifier']
         finding_rec['resource_name'] = cluster['ClusterIdentifier']
         finding_rec['resource_arn'] = f"arn:aws:redshift:{self.region}:{self.account_analyser.account_id}:cluster-name/{cluster['ClusterIdentifier']}"
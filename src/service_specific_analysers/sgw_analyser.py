@@ -8,15 +8,24 @@ from service_analyser import ServiceAnalyser
 
 class SGWAnalyser(ServiceAnalyser):
 
+    client_names = ["storagegateway"]
+    probe_calls = [("storagegateway", "list_gateways", "Gateways", {'Limit': 1})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    fingerprint_fields = ['GatewayId', 'GatewayName', 'GatewayARN', 'Ec2InstanceRegion']
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'sgw')
 
     def get_findings(self):
 
-        session = self.get_aws_session()
-        sgw = session.client("storagegateway", region_name=self.region)
+        sgw = self.get_aws_client("storagegateway")
 
         for gateway in utils.invoke_aws_api_full_list(sgw.list_gateways, "Gateways"):
+            previous_findings = self.get_previous_findings(gateway['GatewayARN'], gateway, self.fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
             finding_rec = self.get_finding_rec_from_response(gateway)
             if (("Ec2InstanceRegion" in gateway.keys()) and (len(gateway["Ec2InstanceRegion"]))):
                 finding_rec['potential_issue'] = True
@@ -25,12 +34,12 @@ class SGWAnalyser(ServiceAnalyser):
                 finding_rec['potential_issue'] = False
                 finding_rec['message'] = f"Storge Gateway: Gateway {gateway['GatewayName']} is not hosted on AWS"
 
-            self.findings.append(finding_rec)
+            yield finding_rec
 
     #Contains the logic to extract relevant fields from the API response to the output csv file.
     def get_finding_rec_from_response(self, gateway):
 
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = gateway['GatewayARN'])
 
         finding_rec['resource_id'] = gateway['GatewayId']
         finding_rec['resource_name'] = gateway['GatewayName']
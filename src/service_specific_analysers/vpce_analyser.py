@@ -8,30 +8,44 @@ from service_analyser import ServiceAnalyser
 
 class VPCEAnalyser(ServiceAnalyser):
 
+    client_names = ["ec2"]
+    probe_calls = [("ec2", "describe_vpc_endpoints", "VpcEndpoints", {'Filters': [{'Name': 'vpc-endpoint-type', 'Values': ['Interface']}]})]
+
+    #Fields of the API response that the rules read. Used to find unchanged resources in incremental mode.
+    fingerprint_fields = ['VpcEndpointId', 'ServiceName', 'SubnetIds', 'Tags']
+
     def __init__(self, account_analyser, region):
         super().__init__(account_analyser, region, 'vpce')
 
     def get_findings(self):
-        session = self.get_aws_session()
-        ec2 = session.client("ec2", region_name=self.region)
+        ec2 = self.get_aws_client("ec2")
 
         for vpce in utils.invoke_aws_api_full_list(ec2.describe_vpc_endpoints, "VpcEndpoints", Filters = [ {'Name':'vpc-endpoint-type', 'Values' : ['Interface']} ]):
             subnet_ids = vpce["SubnetIds"]
 
+            previous_findings = self.get_previous_findings(vpce['VpcEndpointId'], vpce, self.fingerprint_fields)
+            if previous_findings:
+                yield from previous_findings
+                continue
+
             finding_rec = self.get_finding_rec_from_response(vpce)
 
-            if len(subnet_ids) > 1:
+            az_ids = self.get_subnet_index().get_az_ids(subnet_ids) if len(subnet_ids) > 1 else set(subnet_ids)
+            if len(az_ids) > 1:
                 finding_rec['potential_issue'] = False
-                finding_rec['message'] = f"VPCE: {vpce['VpcEndpointId']} has multiple subnets: {subnet_ids}"
+                finding_rec['message'] = f"VPCE: {vpce['VpcEndpointId']} has subnets in multiple AZs: {subnet_ids}"
+            elif len(subnet_ids) > 1:
+                finding_rec['potential_issue'] = True
+                finding_rec['message'] = f"VPCE: {vpce['VpcEndpointId']} has multiple subnets, all of them in the same AZ {next(iter(az_ids))}: {subnet_ids}"
             else:
                 finding_rec['potential_issue'] = True
                 finding_rec['message'] = f"VPCE: {vpce['VpcEndpointId']} has a single subnet: {subnet_ids}"
 
-            self.findings.append(finding_rec)
+            yield finding_rec
 
     def get_finding_rec_from_response(self, vpce):
 
-        finding_rec = self.get_finding_rec_with_common_fields()
+        finding_rec = self.get_finding_rec_with_common_fields(resource_key = vpce['VpcEndpointId'])
 
         finding_rec['resource_id'] = vpce['VpcEndpointId']
         finding_rec['resource_name'] = ''
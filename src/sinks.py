@@ -0,0 +1,422 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+import queue
+import csv
+import json
+import datetime
+import os
+import time
+import random
+import logging
+import utils
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from finding import Finding
+from s3_stream import S3StreamingUpload
+from api_metrics import get_percentile
+
+#Base class of the backends the findings are written to. A sink is only ever called from the writer thread of the pipeline,
+#so it does not need any locking of its own.
+class FindingsSink():
+
+    def write_batch(self, finding_recs):
+        raise NotImplementedError
+
+    #Called after all the findings of a work unit have been passed to write_batch. The context identifies the work unit, and run_report_rec
+    #is its record in the run report (None for the work units that were not run, but whose findings were written out again from the checkpoint).
+    def end_unit(self, context, run_report_rec = None):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    #A sink can add a record with its own statistics to the run report
+    def get_run_report_rec(self, account_id):
+        return None
+
+#Writes findings to the output csv file. The file is opened once and kept open for the whole run.
+class CsvSink(FindingsSink):
+
+    def __init__(self, output_file_full_path):
+        self.output_file = open(output_file_full_path, 'a', newline='')
+        self.csv_writer = csv.writer(self.output_file)
+
+    def write_batch(self, finding_recs):
+        self.csv_writer.writerows(finding_rec.to_row() for finding_rec in finding_recs)
+
+    def flush(self):
+        self.output_file.flush()
+
+    def close(self):
+        self.output_file.close()
+
+#Publishes findings to an Eventbridge event bus.
+#Entries are packed into put_events calls up to the count and size limits of the API, and up to max_calls_in_flight calls are run
+#concurrently on a small thread pool of the sink. Entries that put_events reports as failed (and calls that fail altogether)
+#are retried with exponential backoff and jitter. Throughput and latency are reported in the run report.
+class EventBridgeSink(FindingsSink):
+
+    max_entries_per_call = 10 #put_events does not accept more than 10 entries in one call
+    max_bytes_per_call = 256 * 1024 #... or more than 256KB in one call
+    max_attempts = 5
+    base_backoff_in_seconds = 0.5
+    max_backoff_in_seconds = 10
+
+    def __init__(self, event_bus_arn, max_calls_in_flight = 4):
+        self.event_bus_arn = event_bus_arn
+        #The event bus region has to be used as cross region API calls are not permitted.
+        self.region = utils.parse_arn(event_bus_arn)['region']
+        self.events = utils.get_aws_client("events", region_name = self.region)
+        self.executor = ThreadPoolExecutor(max_workers = max_calls_in_flight, thread_name_prefix = 'eventbridge-publisher')
+        self.calls_in_flight = threading.BoundedSemaphore(max_calls_in_flight)
+        self.lock = threading.Lock()
+        self.entries = []
+        self.entries_size = 0
+        self.published_count = 0
+        self.failed_count = 0
+        self.last_error = ''
+        self.latencies = []
+        self.start_time = None
+        self.end_time = None
+
+    #Size of an entry as calculated by Eventbridge - https://docs.aws.amazon.com/eventbridge/latest/userguide/eb-putevent-size.html
+    @staticmethod
+    def get_entry_size(entry):
+        size = 14 #Time
+        for field in ['Source', 'DetailType', 'Detail']:
+            size = size + len(entry[field].encode('utf-8'))
+        return size
+
+    def write_batch(self, finding_recs):
+        curr_time = datetime.datetime.now().astimezone()
+        for finding_rec in finding_recs:
+            if finding_rec.carried_forward: #Already published in the run in which it was evaluated
+                continue
+            entry = {
+                        'Time': curr_time,
+                        'Source': 'FaultToleranceAnalyser',
+                        'DetailType': 'FaultToleranceIssue',
+                        'Detail': json.dumps(finding_rec.to_dict()),
+                        'EventBusName' : self.event_bus_arn
+                    }
+            entry_size = self.get_entry_size(entry)
+
+            if entry_size > self.max_bytes_per_call:
+                with self.lock:
+                    self.failed_count = self.failed_count + 1
+                    self.last_error = f"Finding for {finding_rec['resource_arn']} is larger than the maximum event size"
+                logging.error(f"Not publishing the finding for {finding_rec['resource_arn']} as it is larger than the maximum size of an event ({entry_size} bytes)")
+                continue
+
+            if len(self.entries) == self.max_entries_per_call or self.entries_size + entry_size > self.max_bytes_per_call:
+                self.send_entries()
+            self.entries.append(entry)
+            self.entries_size = self.entries_size + entry_size
+
+    #Hands the entries collected so far to the thread pool. Blocks while max_calls_in_flight calls are already running,
+    #which holds up the writer thread of the pipeline and in turn the analysers.
+    def send_entries(self):
+        if len(self.entries) == 0:
+            return
+        entries = self.entries
+        self.entries = []
+        self.entries_size = 0
+
+        self.calls_in_flight.acquire()
+        if not self.start_time:
+            self.start_time = time.time()
+        future = self.executor.submit(self.put_events, entries)
+        future.add_done_callback(lambda future: self.calls_in_flight.release())
+
+    #Partially filled batches are held back until close(), so that put_events is not called with just a few entries every time the pipeline is flushed
+    def flush(self):
+        pass
+
+    def put_events(self, entries):
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                backoff = min(self.max_backoff_in_seconds, self.base_backoff_in_seconds * (2 ** attempt))
+                time.sleep(random.uniform(backoff / 2, backoff))
+
+            call_start = time.time()
+            try:
+                response = self.events.put_events(Entries = entries)
+            except Exception as error:
+                with self.lock:
+                    self.last_error = str(error)
+                logging.warning(f"put_events failed on attempt {attempt + 1} for {len(entries)} entries: {error}")
+                continue
+            finally:
+                with self.lock:
+                    self.latencies.append(time.time() - call_start)
+
+            #Entries in the response are in the same order as in the request. Only the failed ones have an ErrorCode.
+            failed_entries = []
+            for entry, result in zip(entries, response['Entries']):
+                if 'ErrorCode' in result:
+                    failed_entries.append(entry)
+                    error_code = result['ErrorCode']
+
+            with self.lock:
+                self.published_count = self.published_count + len(entries) - len(failed_entries)
+                if len(failed_entries) > 0:
+                    self.last_error = error_code
+
+            if len(failed_entries) == 0:
+                return
+            logging.warning(f"{len(failed_entries)} of {len(entries)} entries failed on attempt {attempt + 1} with {error_code}. Retrying them.")
+            entries = failed_entries
+
+        with self.lock:
+            self.failed_count = self.failed_count + len(entries)
+        logging.error(f"Could not publish {len(entries)} finding(s) to Eventbridge after {self.max_attempts} attempts: {self.last_error}")
+
+    def close(self):
+        self.send_entries()
+        self.executor.shutdown(wait = True)
+        self.end_time = time.time()
+        logging.info(f"Published {self.published_count} finding(s) to Eventbridge, {self.failed_count} failed")
+
+    def get_run_report_rec(self, account_id):
+        if not self.start_time: #Nothing was published
+            return None
+
+        runtime = self.end_time - self.start_time
+        latencies = sorted(self.latencies)
+
+        return {
+                'account_id' : account_id,
+                'region' : self.region,
+                'service' : 'eventbridge_publisher',
+                'result' : 'Success' if self.failed_count == 0 else 'Failure',
+                'error_message' : '' if self.failed_count == 0 else f"{self.failed_count} finding(s) could not be published. Last error: {self.last_error}",
+                'start_time' : datetime.datetime.fromtimestamp(self.start_time).astimezone().strftime("%Y_%m_%d_%H_%M_%S%z"),
+                'end_time' : datetime.datetime.fromtimestamp(self.end_time).astimezone().strftime("%Y_%m_%d_%H_%M_%S%z"),
+                'runtime_in_seconds' : round(runtime, 2),
+                'record_count' : self.published_count,
+                'records_per_second' : round(self.published_count / runtime, 2) if runtime > 0 else '',
+                'average_latency_in_ms' : round(1000 * sum(latencies) / len(latencies), 2) if latencies else '',
+                'p95_latency_in_ms' : round(1000 * get_percentile(latencies, 95), 2) if latencies else '',
+                'api_call_count' : len(latencies),
+                'p50_latency_in_ms' : round(1000 * get_percentile(latencies, 50), 2) if latencies else '',
+                'p99_latency_in_ms' : round(1000 * get_percentile(latencies, 99), 2) if latencies else ''
+                }
+
+#Uploads the findings file to the S3 bucket once all the findings have been written to it.
+#Must come after the CsvSink in the list of sinks, so that the file is complete and closed when it is uploaded.
+class S3Sink(FindingsSink):
+
+    def __init__(self, file_full_path, bucket_name, key):
+        self.file_full_path = file_full_path
+        self.bucket_name = bucket_name
+        self.key = key
+
+    def write_batch(self, finding_recs):
+        pass
+
+    def close(self):
+        s3 = utils.get_aws_client("s3")
+        s3.upload_file(self.file_full_path, self.bucket_name, self.key, Config = utils.get_s3_transfer_config())
+        logging.info(f"Uploaded output file {self.key} to bucket {self.bucket_name}")
+
+#Streams the findings to an S3 object as a gzip compressed csv file while the analysis is running. Needs no local file.
+class S3StreamSink(FindingsSink):
+
+    def __init__(self, bucket_name, key):
+        self.upload = S3StreamingUpload(bucket_name, key, utils.get_s3_transfer_config())
+        self.csv_writer = csv.writer(self.upload)
+        self.csv_writer.writerow(Finding.keys)
+
+    def write_batch(self, finding_recs):
+        self.csv_writer.writerows(finding_rec.to_row() for finding_rec in finding_recs)
+
+    def close(self):
+        self.upload.close()
+
+#Writes the findings of each work unit to a Parquet file of its own, partitioned by date, account and service:
+#<output folder>findings/date=<YYYY_MM_DD>/account_id=<account id>/service=<service>/<region>.parquet
+#The partition columns are in the path and not in the files, so that Athena and pandas add them back from the path.
+#A work unit has its own file, so no two work units (or accounts, or processes) ever write to the same file. Running the same
+#work unit again on the same day replaces its file. The files are uploaded to the S3 bucket as they are written, if one is provided.
+class ParquetSink(FindingsSink):
+
+    partition_keys = ['account_id', 'service']
+    #Columns with only a few distinct values are dictionary encoded
+    dictionary_columns = ['region', 'account_name', 'payer_account_id', 'payer_account_name', 'potential_issue', 'engine', 'timestamp']
+
+    def __init__(self, output_folder_name, bucket_name = None):
+        #pyarrow is needed only for the parquet output format, and it is imported here as it takes longer to import than the rest of the tool
+        import pyarrow
+        self.output_folder_name = output_folder_name
+        self.bucket_name = bucket_name
+        self.date = datetime.date.today().strftime("%Y_%m_%d")
+        self.columns = [key for key in Finding.keys if key not in self.partition_keys]
+        self.schema = pyarrow.schema([(key, pyarrow.bool_() if key == 'potential_issue' else pyarrow.string()) for key in self.columns])
+        self.finding_recs = defaultdict(list) #Findings of each work unit in progress, keyed by the context of the work unit
+        self.file_count = 0
+
+    def write_batch(self, finding_recs):
+        for finding_rec in finding_recs:
+            self.finding_recs[finding_rec.context].append(finding_rec)
+
+    def end_unit(self, context, run_report_rec = None):
+        finding_recs = self.finding_recs.pop(context, None)
+        if not finding_recs:
+            return
+
+        relative_path = f"findings/date={self.date}/account_id={context.account_id}/service={context.service}/{context.region}.parquet"
+        file_full_path = f"{self.output_folder_name}{relative_path}"
+        os.makedirs(os.path.dirname(file_full_path), exist_ok=True)
+
+        import pyarrow
+        import pyarrow.parquet
+        rows = [finding_rec.to_dict() for finding_rec in finding_recs]
+        table = pyarrow.Table.from_pylist(rows, schema = self.schema)
+        pyarrow.parquet.write_table(table, file_full_path, use_dictionary = self.dictionary_columns, compression = 'snappy')
+        self.file_count = self.file_count + 1
+
+        if self.bucket_name:
+            s3 = utils.get_aws_client("s3")
+            s3.upload_file(file_full_path, self.bucket_name, f"{self.output_folder_name}{relative_path}", Config = utils.get_s3_transfer_config())
+
+    def close(self):
+        #A work unit that never ended (which is not expected) would otherwise be lost
+        for context in list(self.finding_recs.keys()):
+            self.end_unit(context)
+        logging.info(f"Wrote {self.file_count} Parquet file(s) under {self.output_folder_name}findings/")
+
+#Put on the queue of the pipeline after the last finding of a work unit
+UnitEnd = namedtuple('UnitEnd', ['context', 'run_report_rec'])
+
+#Analyser threads put their findings on a bounded queue, and a single writer thread takes them off the queue and fans them out to all the sinks.
+#Analyser threads therefore never wait on file or network I/O. If the sinks fall behind, the queue fills up and put() blocks, which applies backpressure.
+#The writer hands the findings to the sinks in batches, and the sinks are flushed only when the queue has been drained.
+#A sink that fails does not stop the others. A work unit whose findings a sink failed to write (or end) is marked as failed in its run report
+#record before the sinks after it are told that it ended, so the checkpoint sink (the last one) does not journal it as completed.
+#The failures of each sink are also added to the run report (see get_run_report_recs).
+class FindingsPipeline():
+
+    def __init__(self, sinks, max_queue_size = 10000, batch_size = 500):
+        self.sinks = sinks
+        self.findings_queue = queue.Queue(maxsize = max_queue_size)
+        self.batch_size = batch_size
+        self.sink_errors = {} #[error count, last error] of each sink that failed
+        self.failed_units = {} #Error message of each work unit in progress whose findings a sink failed to write, keyed by its context
+        self.writer = threading.Thread(target = self.write_loop, name = "findings-writer", daemon = True)
+        self.writer.start()
+
+    def put(self, finding_rec):
+        self.findings_queue.put(finding_rec)
+
+    #Marks the end of the work unit with the given context. Sinks are told after all its findings put so far have been passed to them.
+    def end_unit(self, context, run_report_rec = None):
+        self.findings_queue.put(UnitEnd(context, run_report_rec))
+
+    #Waits for all the findings put so far to be written, then closes the sinks
+    def close(self):
+        self.findings_queue.put(None)
+        self.writer.join()
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as error:
+                self.add_sink_error(sink, 'close', error)
+
+    #Run report records of the sinks, followed by one for each sink that failed. Called once the pipeline is closed.
+    def get_run_report_recs(self, account_id):
+        run_report_recs = []
+        for sink in self.sinks:
+            run_report_rec = sink.get_run_report_rec(account_id)
+            if run_report_rec:
+                run_report_recs.append(run_report_rec)
+        now = datetime.datetime.now().astimezone().strftime("%Y_%m_%d_%H_%M_%S%z")
+        for sink, (error_count, last_error) in self.sink_errors.items():
+            run_report_recs.append(
+                                    {
+                                    'account_id' : account_id,
+                                    'region' : 'N/A',
+                                    'service' : f"findings_sink_{sink.__class__.__name__}",
+                                    'result' : 'Failure',
+                                    'error_message' : f"{error_count} error(s) while writing the findings. Last error: {last_error}",
+                                    'start_time' : now,
+                                    'end_time' : now,
+                                    'runtime_in_seconds' : 0
+                                    }
+                                )
+        return run_report_recs
+
+    def write_loop(self):
+        done = False
+        while not done:
+            batch = [self.findings_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.findings_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None: #Sentinel put by close()
+                batch.pop()
+                done = True
+
+            #The batch can have end of work unit markers in between the findings
+            finding_recs = []
+            for item in batch:
+                if isinstance(item, UnitEnd):
+                    if len(finding_recs) > 0:
+                        self.write_batch(finding_recs)
+                        finding_recs = []
+                    self.end_unit_in_sinks(item.context, item.run_report_rec)
+                else:
+                    finding_recs.append(item)
+            if len(finding_recs) > 0:
+                self.write_batch(finding_recs)
+
+            if done or self.findings_queue.empty():
+                for sink in self.sinks:
+                    try:
+                        sink.flush()
+                    except Exception as error:
+                        self.add_sink_error(sink, 'flush', error)
+
+    #Keeps draining the queue even if a sink fails, so that the analysers are never blocked forever
+    def write_batch(self, finding_recs):
+        for sink in self.sinks:
+            try:
+                sink.write_batch(finding_recs)
+            except Exception as error:
+                error_message = self.add_sink_error(sink, 'write_batch', error)
+                for finding_rec in finding_recs:
+                    self.failed_units.setdefault(finding_rec.context, error_message)
+
+    def end_unit_in_sinks(self, context, run_report_rec):
+        error_message = self.failed_units.pop(context, None)
+        if error_message:
+            self.mark_unit_failed(run_report_rec, error_message)
+        for sink in self.sinks:
+            try:
+                sink.end_unit(context, run_report_rec)
+            except Exception as error:
+                self.mark_unit_failed(run_report_rec, self.add_sink_error(sink, 'end_unit', error))
+
+    #The record is the one in the run report, so the change shows up there. Findings written out again from the checkpoint have no record.
+    def mark_unit_failed(self, run_report_rec, error_message):
+        if not run_report_rec:
+            return
+        if run_report_rec['result'] == 'Failure':
+            run_report_rec['error_message'] = f"{run_report_rec['error_message']}. {error_message}"
+        else:
+            run_report_rec['result'] = 'Failure'
+            run_report_rec['error_message'] = error_message
+
+    def add_sink_error(self, sink, method_name, error):
+        error_message = f"The findings sink {sink.__class__.__name__} failed in {method_name}: {error}"
+        logging.error(error_message)
+        error_count, _ = self.sink_errors.get(sink, (0, None))
+        self.sink_errors[sink] = (error_count + 1, str(error))
+        return error_message
@@ -0,0 +1,77 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import datetime
+
+#Returns the value at a path like "VpcConfig.SubnetIds" in an API response. A segment ending in "[]" is a list,
+#and the rest of the path is looked up in each of its items, so "NodeGroups[].NodeGroupMembers[].PreferredAvailabilityZone"
+#gives the AZs of all the members of all the node groups. Missing keys give None.
+def get_field(resource, path):
+    values = [resource]
+    for segment in path.split('.'):
+        is_list = segment.endswith('[]')
+        key = segment[:-2] if is_list else segment
+        next_values = []
+        for value in values:
+            value = value.get(key) if isinstance(value, dict) else None
+            if is_list:
+                next_values.extend(value if value else [])
+            else:
+                next_values.append(value)
+        values = next_values
+    return values if '[]' in path else values[0]
+
+#Fingerprint of only the fields of a resource that the rules of an analyser read. If none of them change, the findings do not change either.
+#The list of fields is part of the fingerprint, so that changing it in an analyser invalidates the fingerprints recorded before.
+def get_fingerprint(resource, fingerprint_fields):
+    values = [[path, get_field(resource, path)] for path in fingerprint_fields]
+    return hashlib.sha256(json.dumps(values, sort_keys = True, default = str).encode('utf-8')).hexdigest()
+
+#Local SQLite store of the fingerprint and the findings of every resource seen in the last run, used by the incremental mode.
+#The state of a work unit (account + region + service) is read once when the work unit starts and replaced in one transaction when it
+#completes successfully, so a failed work unit leaves the previous state as it was. The connection is shared by the threads of a process
+#(behind a lock), and SQLite's own locking takes care of several processes using the same file.
+class StateStore():
+
+    def __init__(self, file_full_path):
+        folder_name = os.path.dirname(file_full_path)
+        if folder_name:
+            os.makedirs(folder_name, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_full_path, timeout = 60, check_same_thread = False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS resource_state (
+                                            account_id TEXT,
+                                            region TEXT,
+                                            service TEXT,
+                                            resource_key TEXT,
+                                            fingerprint TEXT,
+                                            findings TEXT,
+                                            updated_at TEXT,
+                                            PRIMARY KEY (account_id, region, service, resource_key))''')
+
+    #Returns {resource key: (fingerprint, list of findings)} for the work unit
+    def get_unit_state(self, account_id, region, service):
+        with self.lock:
+            rows = self.connection.execute("SELECT resource_key, fingerprint, findings FROM resource_state WHERE account_id = ? AND region = ? AND service = ?",
+                                           (account_id, region, service)).fetchall()
+        return {resource_key: (fingerprint, json.loads(findings)) for resource_key, fingerprint, findings in rows}
+
+    #unit_state is {resource key: (fingerprint, list of findings)}. Resources that are no longer there are removed.
+    def replace_unit_state(self, account_id, region, service, unit_state):
+        updated_at = datetime.datetime.now().astimezone().strftime("%Y_%m_%d_%H_%M_%S%z")
+        rows = [(account_id, region, service, resource_key, fingerprint, json.dumps(findings), updated_at)
+                for resource_key, (fingerprint, findings) in unit_state.items()]
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM resource_state WHERE account_id = ? AND region = ? AND service = ?", (account_id, region, service))
+            self.connection.executemany("INSERT INTO resource_state VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,169 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import time
+import random
+import logging
+import threading
+import contextvars
+import collections
+import botocore.exceptions
+
+#Error codes with which the AWS APIs report that the caller is being throttled
+throttling_error_codes = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'SlowDown',
+    'PriorRequestNotComplete',
+    'EC2ThrottledException'
+}
+
+def is_throttling_error(error):
+    return isinstance(error, botocore.exceptions.ClientError) and error.response.get('Error', {}).get('Code') in throttling_error_codes
+
+#Errors that are worth retrying as they are usually gone by the next attempt: connection problems, timeouts and server side errors
+def is_transient_error(error):
+    if isinstance(error, (botocore.exceptions.ConnectionError, botocore.exceptions.HTTPClientError)):
+        return True
+    return isinstance(error, botocore.exceptions.ClientError) and error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500
+
+#Throttling counters of one work unit. The work unit being run by the current thread is found through current_throttle_counter,
+#so that the API calls made anywhere in an analyser are counted against it without the counter being passed around.
+class ThrottleCounter():
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.throttled_call_count = 0
+        self.wait_in_seconds = 0.0
+
+    def add(self, throttled_call_count, wait_in_seconds):
+        with self.lock:
+            self.throttled_call_count = self.throttled_call_count + throttled_call_count
+            self.wait_in_seconds = self.wait_in_seconds + wait_in_seconds
+
+current_throttle_counter = contextvars.ContextVar('current_throttle_counter', default = None)
+
+#Attempt (starting at 1) of the call being made by RateLimiter.call, for the API call trace
+current_attempt_number = contextvars.ContextVar('current_attempt_number', default = None)
+
+#Token bucket that paces the calls to one API. rate is in calls per second, and up to one second worth of calls can be made in a burst.
+#A configured rate is used as it is, and is also the highest rate the bucket goes back up to. An API without a configured rate is not limited
+#until it is first throttled. From then on, its rate is learned: it is halved every time the API throttles (at most once a second, as the
+#calls that were already in flight get throttled together) and goes up by about one call per second every second that calls succeed.
+class TokenBucket():
+
+    min_rate = 0.5
+    decrease_factor = 0.5
+    additive_increase = 1.0
+
+    def __init__(self, rate = None):
+        self.lock = threading.Lock()
+        self.max_rate = rate
+        self.rate = rate
+        self.tokens = 1.0
+        self.last_refill_time = time.monotonic()
+        self.last_decrease_time = 0.0
+        self.recent_call_times = collections.deque() #Used only while not limited, to know the rate at which the API started throttling
+
+    #Blocks until the call can be made. Returns the number of seconds waited.
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.rate is None:
+                    self.recent_call_times.append(now)
+                    while self.recent_call_times[0] < now - 1:
+                        self.recent_call_times.popleft()
+                    return waited
+                self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.last_refill_time) * self.rate)
+                self.last_refill_time = now
+                if self.tokens >= 1:
+                    self.tokens = self.tokens - 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited = waited + wait
+
+    def on_success(self):
+        with self.lock:
+            if self.rate is not None:
+                self.rate = self.rate + self.additive_increase / max(1.0, self.rate)
+                if self.max_rate is not None:
+                    self.rate = min(self.rate, self.max_rate)
+
+    def on_throttle(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_decrease_time < 1:
+                return
+            self.last_decrease_time = now
+            if self.rate is None:
+                self.rate = len(self.recent_call_times)
+                self.recent_call_times.clear()
+                self.tokens = 0.0
+                self.last_refill_time = now
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+
+#One token bucket per account, region and API, created on first use. configured_rates maps "service" or "service:Operation"
+#(for example "rds" or "organizations:ListAccounts") to a rate. The operation specific rate wins over the service wide one.
+class RateLimiter():
+
+    def __init__(self, configured_rates):
+        self.configured_rates = configured_rates
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def get_bucket(self, account_id, region, service, operation):
+        key = (account_id, region, service, operation)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    rate = self.configured_rates.get(f"{service}:{operation}", self.configured_rates.get(service))
+                    bucket = TokenBucket(rate)
+                    self.buckets[key] = bucket
+        return bucket
+
+    #Makes the call when the bucket of the API allows it. Throttled calls are retried with exponential backoff and full jitter, and
+    #slow the bucket down. Transient errors are retried the same way. The throttled calls and the time spent waiting are added to the
+    #counter of the current work unit.
+    def call(self, api_method, account_id, params, max_attempts, base_backoff_in_seconds = 0.5, max_backoff_in_seconds = 20):
+        client = api_method.__self__
+        operation_name = client.meta.method_to_api_mapping.get(api_method.__name__, api_method.__name__)
+        bucket = self.get_bucket(account_id, client.meta.region_name, client.meta.service_model.service_name, operation_name)
+        counter = current_throttle_counter.get()
+
+        for attempt in range(max_attempts):
+            waited = bucket.acquire()
+            attempt_token = current_attempt_number.set(attempt + 1)
+            try:
+                response = api_method(**params)
+            except Exception as error:
+                throttled = is_throttling_error(error)
+                if throttled:
+                    bucket.on_throttle()
+                if (not throttled and not is_transient_error(error)) or attempt == max_attempts - 1:
+                    if counter:
+                        counter.add(1 if throttled else 0, waited)
+                    raise error
+                backoff = random.uniform(0, min(max_backoff_in_seconds, base_backoff_in_seconds * (2 ** attempt)))
+                logging.warning(f"{operation_name} in {client.meta.region_name} failed on attempt {attempt + 1}: {error}. Retrying in {round(backoff, 2)} seconds")
+                time.sleep(backoff)
+                if counter:
+                    counter.add(1 if throttled else 0, waited + backoff)
+                continue
+            finally:
+                current_attempt_number.reset(attempt_token)
+
+            bucket.on_success()
+            if counter and waited:
+                counter.add(0, waited)
+            return response
@@ -2,14 +2,31 @@
 # SPDX-License-Identifier: MIT-0
 
 import argparse
+import collections
+import concurrent.futures
+import contextvars
+import functools
+import importlib.util
+import itertools
 import logging
+import os
 import re
 import time
 import threading
 import boto3
 import botocore
+import botocore.awsrequest
+import botocore.config
+import botocore.credentials
+import botocore.loaders
+import botocore.session
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 from dataclasses import dataclass
+from api_cache import ApiCache
+from throttling import RateLimiter
+from api_metrics import ApiCallRecorder, ApiTraceWriter, current_page_number
+import analyser_registry
 
 
 @dataclass
@@ -17,35 +34,49 @@ class ConfigInfo:
     regions: list
     services: list
     max_concurrent_threads: int
+    endpoint_url: str
     output_folder_name: str
+    output_format: str
     event_bus_arn: str
     log_level: str
     aws_profile_name: str
     aws_assume_role_name: str
+    organization: bool
+    member_role_name: str
+    max_processes: int
+    prewarm_connections: bool
     single_threaded: bool
     run_report_file_name: str
     bucket_name: str
+    stream_to_s3: bool
+    no_local_output: bool
+    s3_part_size_mb: int
+    s3_max_concurrency: int
     account_id: str
     truncate_output: bool
     filename_with_accountid: bool
     report_only_issues: bool
-
-all_services = ['vpce',
-                'dms',
-                'docdb',
-                'sgw',
-                'efs',
-                'opensearch',
-                'fsx',
-                'lambda',
-                'elasticache',
-                'dax',
-                'globalaccelerator',
-                'rds',
-                'memorydb',
-                'dx',
-                'cloudhsm',
-                'redshift']
+    incremental: bool
+    state_file_name: str
+    api_cache_mode: str
+    api_cache_folder_name: str
+    api_cache_ttl_in_hours: float
+    api_rate_limits: dict
+    max_api_attempts: int
+    skip_empty_units: bool
+    availability_file_name: str
+    availability_ttl_in_hours: float
+    api_trace_file_name: str
+    checkpoint: bool
+    resume: bool
+    checkpoint_file_name: str
+    distributed_role: str
+    work_queue_url: str
+    lease_timeout_in_seconds: int
+    local_worker_count: int
+
+api_cache = None
+api_trace_writer = None
 
 #Use the below function,if needed, as print(json.dumps(db_instance,  default = json_serialise, indent = 4))
 def json_serialise(obj):
@@ -86,49 +117,170 @@ def log_func(func):
         return result
     return inner
 
-def get_aws_session(session_name = None):
-    session = boto3.session.Session(profile_name = config_info.aws_profile_name)
-
-    if config_info.aws_assume_role_name: #Need to assume a role before creating an org client
-        
-        logging.info(f"aws-assume-role option is used. About to assume the role {config_info.aws_assume_role_name}")
-
-        sts_client = session.client('sts')
-        account_id = sts_client.get_caller_identity()["Account"]
+#Hands out boto3 sessions that share one set of credentials per target account for the whole run.
+#When a role is to be assumed, it is assumed only once per account (lazily, on the first API call) and the credentials
+#are refreshed by botocore before they expire, so long running scans do not fail halfway and STS is not called for every service+region.
+#role_name is assumed in the account of the credentials in use (the home account), member_role_name in any other account of the organization.
+class CredentialCache:
+
+    def __init__(self, profile_name, role_name, member_role_name = None, home_account_id = None):
+        self.profile_name = profile_name
+        self.role_name = role_name
+        self.member_role_name = member_role_name
+        self.home_account_id = home_account_id
+        self.lock = threading.Lock()
+        self.assumed_role_credentials = {} #Keyed by the account id in which the role is assumed
+
+        self.base_session = boto3.session.Session(profile_name = profile_name)
+        self.data_loader = self.base_session._session.get_component('data_loader') #Shared so that service models are loaded from disk only once per run
+        self.base_credentials = self.base_session.get_credentials()
+        self.sts = None
+
+    def get_credentials(self, account_id):
+        role_name = self.role_name if account_id == self.home_account_id else self.member_role_name
+        if not role_name:
+            return self.base_credentials
+
+        with self.lock:
+            if account_id not in self.assumed_role_credentials:
+                if self.sts is None:
+                    self.sts = self.base_session.client('sts')
+                self.assumed_role_credentials[account_id] = botocore.credentials.DeferredRefreshableCredentials(
+                                                                refresh_using = self.get_refresh_function(account_id, role_name),
+                                                                method = 'sts-assume-role'
+                                                            )
+            return self.assumed_role_credentials[account_id]
+
+    def get_refresh_function(self, account_id, role_name):
+        role_arn = f"arn:aws:iam::{account_id}:role/{role_name}"
+
+        def refresh():
+            logging.info(f"About to assume the role {role_arn}")
+            assumed_role_object = self.sts.assume_role(
+                RoleArn = role_arn,
+                RoleSessionName = "FaultToleranceAnalyser"
+            )
+            credentials = assumed_role_object['Credentials']
+            logging.info(f"Assumed the role {role_arn}. Credentials expire at {credentials['Expiration']}")
+            return {
+                'access_key': credentials['AccessKeyId'],
+                'secret_key': credentials['SecretAccessKey'],
+                'token': credentials['SessionToken'],
+                'expiry_time': credentials['Expiration'].isoformat()
+            }
+        return refresh
+
+    #boto3 sessions are not thread safe, so a new (cheap) session is built for every caller, but all of them share the cached credentials object.
+    def get_session(self, account_id):
+        botocore_session = botocore.session.Session(profile = self.profile_name)
+        botocore_session.register_component('data_loader', self.data_loader)
+        botocore_session._credentials = self.get_credentials(account_id)
+        return boto3.session.Session(botocore_session = botocore_session)
+
+#Sets up the credential cache and the client pool based on config_info. Also used to set them up in worker processes.
+def init_aws_clients():
+    global credential_cache
+    credential_cache = CredentialCache(profile_name = config_info.aws_profile_name,
+                                       role_name = config_info.aws_assume_role_name,
+                                       member_role_name = config_info.member_role_name if config_info.organization else None,
+                                       home_account_id = config_info.account_id)
+
+    global rate_limiter
+    rate_limiter = RateLimiter(configured_rates = config_info.api_rate_limits)
+
+    global api_trace_writer
+    api_trace_writer = ApiTraceWriter(config_info.api_trace_file_name) if config_info.api_trace_file_name else None
+
+    global client_pool
+    client_pool = ClientPool(max_pool_connections = config_info.max_concurrent_threads, endpoint_url = config_info.endpoint_url, api_trace_writer = api_trace_writer)
+
+    global api_cache
+    api_cache = None
+    if config_info.api_cache_mode:
+        api_cache = ApiCache(folder_name = config_info.api_cache_folder_name, mode = config_info.api_cache_mode, ttl_in_hours = config_info.api_cache_ttl_in_hours)
+
+def get_aws_session(account_id = None):
+    if not account_id:
+        account_id = config_info.account_id
+    return credential_cache.get_session(account_id)
+
+#Thread safe pool of botocore clients keyed by (account, service, region).
+#Clients are created once per run and shared by all analysers, so service models are not reloaded and the HTTP connection pool of
+#each client stays warm across work units. botocore clients themselves are thread safe, only their creation needs to be serialised.
+#The calls that read information go through invoke_aws_api, which paces and retries them itself, so botocore does not retry them.
+#The clients of the services the findings are written to keep botocore's retries.
+class ClientPool:
+
+    services_retried_by_botocore = ['s3', 'events']
+
+    def __init__(self, max_pool_connections, endpoint_url = None, api_trace_writer = None):
+        self.endpoint_url = endpoint_url
+        self.api_trace_writer = api_trace_writer
+        self.config = botocore.config.Config(
+                                                max_pool_connections = max_pool_connections,
+                                                tcp_keepalive = True,
+                                                retries = {'mode': 'standard', 'max_attempts': 1}
+                                            )
+        self.config_with_retries = self.config.merge(botocore.config.Config(retries = {'mode': 'standard', 'max_attempts': 5}))
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.clients = {}
+        self.account_ids = {} #Account id of each client, keyed by id(client)
+
+    def get_client(self, service_name, region_name, account_id):
+        key = (account_id, service_name, region_name)
+        client = self.clients.get(key)
+        if client is None:
+            with self.lock:
+                client = self.clients.get(key)
+                if client is None:
+                    if account_id not in self.sessions:
+                        self.sessions[account_id] = get_aws_session(account_id = account_id)
+                    config = self.config_with_retries if service_name in self.services_retried_by_botocore else self.config
+                    client = self.sessions[account_id].client(service_name, region_name = region_name, endpoint_url = self.endpoint_url, config = config)
+                    ApiCallRecorder(account_id, client.meta.region_name, self.api_trace_writer).register(client.meta.events)
+                    self.clients[key] = client
+                    self.account_ids[id(client)] = account_id
+        return client
+
+    #Account whose credentials the client uses. Clients that are not from the pool are taken to be of the home account.
+    def get_account_id(self, client):
+        return self.account_ids.get(id(client), config_info.account_id)
+
+    #Opens a TLS connection to the endpoint of each of the given clients in parallel, so that the first real API calls do not pay for the handshakes.
+    #A plain unsigned HEAD request is sent through the client's own HTTP session so that the connection lands in the pool the client will reuse.
+    def prewarm(self, client_keys, max_workers):
+        def prewarm_client(key):
+            account_id, service_name, region_name = key
+            try:
+                client = self.get_client(service_name, region_name, account_id)
+                request = botocore.awsrequest.AWSRequest(method = 'HEAD', url = client.meta.endpoint_url).prepare()
+                client._endpoint.http_session.send(request)
+            except Exception as error:
+                logging.debug(f"Could not pre-warm connection for {service_name} in {region_name}: {error}")
 
-        if not session_name:
-            session_name = "AssumeRoleForFaultToleranceAnalyser"
+        start = time.time()
+        with ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = 'prewarm') as executor:
+            list(executor.map(prewarm_client, set(client_keys)))
+        logging.info(f"Pre-warmed connections to {len(set(client_keys))} endpoint(s) in {round(time.time()-start, 2)} seconds")
 
-        assumed_role_object=sts_client.assume_role(
-            RoleArn=f"arn:aws:iam::{account_id}:role/{config_info.aws_assume_role_name}",
-            RoleSessionName=session_name
-        )
-        credentials=assumed_role_object['Credentials']
-
-        assumed_role_session = boto3.session.Session(
-            aws_access_key_id=credentials['AccessKeyId'],
-            aws_secret_access_key=credentials['SecretAccessKey'],
-            aws_session_token=credentials['SessionToken'],
-        )
-        logging.info(f"Assumed the role {config_info.aws_assume_role_name} with session name {session_name}")
-        return assumed_role_session
-    else:
-        return session
+def get_aws_client(service_name, region_name = None, account_id = None):
+    if not account_id:
+        account_id = config_info.account_id
+    return client_pool.get_client(service_name, region_name, account_id)
 
 def check_aws_credentials():
     try:
-        session = boto3.session.Session(profile_name = config_info.aws_profile_name)
-        sts = session.client("sts")
-        resp = sts.get_caller_identity()
+        sts = credential_cache.base_session.client("sts")
+        resp = invoke_aws_api(sts.get_caller_identity)
         account_id = resp["Account"]
         return account_id
     except botocore.exceptions.ClientError as error:
         raise error
 
 def get_approved_regions():
-    session = get_aws_session(session_name = 'ValidateRegions')
-    ec2 = session.client("ec2", region_name='us-east-1')
-    response = ec2.describe_regions()
+    ec2 = get_aws_client("ec2", region_name='us-east-1')
+    response = invoke_aws_api(ec2.describe_regions)
     approved_regions = [region["RegionName"] for region in response["Regions"]]
     return approved_regions
 
@@ -150,9 +302,9 @@ def regions_validator(input_regions):
 def services_validator(input_services):
     if 'ALL' in input_services:
         if len(input_services) == 1: #'ALL' is the only input
-            return all_services
+            return analyser_registry.get_service_names()
         else:
-            raise argparse.ArgumentTypeError(f"When providing 'ALL' as an input service, please do not provide any other services. 'ALL' implies the following services: {all_services}")
+            raise argparse.ArgumentTypeError(f"When providing 'ALL' as an input service, please do not provide any other services. 'ALL' implies the following services: {analyser_registry.get_service_names()}")
     else:
         return input_services
 
@@ -189,6 +341,16 @@ def arn_validator(arn):
         raise argparse.ArgumentTypeError(f"The provided ARN is invalid. Please provide a valid ARN. Ref: https://docs.aws.amazon.com/general/latest/gr/aws-arns-and-namespaces.html")
     return arn
 
+def api_rate_limit_validator(api_rate_limit):
+    regex = r"^[a-z0-9-]+(:[A-Za-z0-9]+)?=[0-9]*\.?[0-9]+$"
+    pattern = re.compile(regex)
+    if not pattern.match(api_rate_limit):
+        raise argparse.ArgumentTypeError(f"Invalid API rate limit '{api_rate_limit}'. Provide it as service=rate or service:Operation=rate. Example: rds=5 organizations:ListAccounts=1")
+    api, rate = api_rate_limit.split("=")
+    if float(rate) <= 0:
+        raise argparse.ArgumentTypeError(f"Invalid API rate limit '{api_rate_limit}'. The rate must be more than 0 calls per second")
+    return (api, float(rate))
+
 def bucket_name_validator(bucket_name):
 
     regex = r"^[a-z0-9][a-z0-9.-]{1,61}[a-z0-9]$"
@@ -211,13 +373,11 @@ def get_config_info():
     parser = argparse.ArgumentParser(description='Generate fault tolerance findings for different services', add_help=False)
 
     required_params_group = parser.add_argument_group('Required arguments')
-    required_params_group.add_argument('-s', '--services', nargs='+', choices = all_services + ['ALL'],
-                        help=f"Indicate which service(s) you want to fetch fault tolerance findings for. Options are {all_services}. Use 'ALL' for all services",
-                        required = True
+    required_params_group.add_argument('-s', '--services', nargs='+', choices = analyser_registry.ServiceChoices(),
+                        help="Indicate which service(s) you want to fetch fault tolerance findings for. Options are %(choices)s, where ALL is all the services. Not needed with --worker"
                         )
     required_params_group.add_argument('-r', '--regions', nargs='+',
-                        help='Indicate which region(s) you want to fetch fault tolerance findings for. Use "ALL" for all approved regions',
-                        required = True
+                        help='Indicate which region(s) you want to fetch fault tolerance findings for. Use "ALL" for all approved regions. Not needed with --worker'
                         )
 
     optional_params_group = parser.add_argument_group('Optional arguments')
@@ -238,10 +398,31 @@ def get_config_info():
                             Output file name will be of the format Fault_Tolerance_Findings_<account_id>_<account_name>_<Run date in YYYY_MM_DD format>.csv. Example: Fault_Tolerance_Findings_123456789101_TestAccount_2022_11_01.csv
                             If you do not use the --filename-with-accountid option, the output file name will be of the format:
                             Fault_Tolerance_Findings_<Run date in YYYY_MM_DD format>.csv. Example: Fault_Tolerance_Findings_2022_11_01.csv''')
+    optional_params_group.add_argument('--output-format', dest='output_format',
+                        default='csv', choices = ['csv', 'parquet'],
+                        help='''Format of the findings output. 'csv' (default) writes one findings csv file.
+                        'parquet' writes one Parquet file per service+region under <output folder>findings/date=<YYYY_MM_DD>/account_id=<account id>/service=<service>/,
+                        which can be queried directly with Athena or pandas. Needs the pyarrow package''')
     optional_params_group.add_argument('-b', '--bucket', dest='bucket_name',
                         default = None,
                         type=bucket_name_validator,
                         help='Name of the bucket where findings output csv file and the run report csv file will be uploaded to')
+    optional_params_group.add_argument('--stream-to-s3', action='store_true', dest='stream_to_s3',
+                        default=False,
+                        help='''Use this flag to stream the findings to the bucket as a gzip compressed csv file (<output file name>.gz) while the analysis is still running,
+                        instead of uploading the findings csv file at the end. Needs a bucket name. Default is False''')
+    optional_params_group.add_argument('--no-local-output', action='store_true', dest='no_local_output',
+                        default=False,
+                        help='''Used only with --stream-to-s3. Use this flag to not write the findings csv file and the run report csv file to the output folder,
+                        for example when there is no writable local folder. The output folder name is then used only as the prefix of the files in the bucket''')
+    optional_params_group.add_argument('--s3-part-size', dest='s3_part_size_mb',
+                        default = 8,
+                        type=int,
+                        help='Size in MB (at least 5) of the parts in which files are uploaded to the bucket. Default is 8')
+    optional_params_group.add_argument('--s3-max-concurrency', dest='s3_max_concurrency',
+                        default = 10,
+                        type=int,
+                        help='Maximum number of parts of a file that are uploaded to the bucket at the same time. Default is 10')
     optional_params_group.add_argument('--event-bus-arn', dest='event_bus_arn',
                         default=None,
                         type=regex_validator_generator(regex = r"arn:(aws|aws-gov|aws-cn):events:.*:.*:event-bus*/[A-Za-z0-9._-]{1,256}$", desc_param_name = "Event Bus ARN",
@@ -256,9 +437,28 @@ def get_config_info():
                         type=regex_validator_generator(regex = r"^[a-zA-Z0-9+=,.@_-]+$", desc_param_name = "IAM Role name"),
                         #type=iam_entity,
                         help="Use this option if you want the aws profile to assume a role before querying Org related information")
+    optional_params_group.add_argument('--endpoint-url', dest='endpoint_url',
+                        default=None,
+                        help="Send all AWS API calls to this endpoint instead of the AWS endpoints. Meant for testing against a local mock of the AWS APIs (for example moto_server)")
+    optional_params_group.add_argument('--organization', action='store_true', dest='organization',
+                        default=False,
+                        help='''Use this flag to analyse all the active accounts of the AWS Organization, instead of only the account of the credentials in use.
+                        The credentials must be allowed to call organizations:ListAccounts (management account or delegated administrator).
+                        The member role is assumed in each member account, and the findings of all accounts are written to one consolidated output file''')
+    optional_params_group.add_argument('--member-role-name', dest='member_role_name',
+                        default='OrganizationAccountAccessRole',
+                        type=regex_validator_generator(regex = r"^[a-zA-Z0-9+=,.@_-]+$", desc_param_name = "Member IAM Role name"),
+                        help="Used only with --organization. Name of the IAM role to assume in each member account. Default is OrganizationAccountAccessRole")
+    optional_params_group.add_argument('--max-processes', dest='max_processes',
+                        default = os.cpu_count(),
+                        type=int,
+                        help='Used only with --organization. Maximum number of processes that analyse accounts in parallel. Each process analyses one account at a time. Default is the number of CPUs')
     optional_params_group.add_argument('--log-level', dest='log_level',
                         default='ERROR', choices = ['DEBUG','INFO','WARNING','ERROR','CRITICAL'],
                         help="Log level. Needs to be one of the following: 'DEBUG','INFO','WARNING','ERROR','CRITICAL'")
+    optional_params_group.add_argument('--prewarm-connections', action='store_true', dest='prewarm_connections',
+                        default=False,
+                        help="Use this flag to open connections to all the service endpoints needed for the run, in parallel, before the analysis starts. Default is False")
     optional_params_group.add_argument('--single-threaded', action='store_true', dest='single_threaded',
                         default=False,
                         help="Use this option to specify that the service+region level information gathering threads should not run in parallel. Default is False, which means the script uses multi-threading by default. Same effect as setting max-running-threads to 1")
@@ -274,8 +474,122 @@ def get_config_info():
     optional_params_group.add_argument('--report-only-issues', action='store_true', dest='report_only_issues',
                         default=False,
                         help="Use this flag to report only findings that are potential issues. Resources that have no identified issues will not appear in the final csv file. Default is to report all findings.")
+    optional_params_group.add_argument('--incremental', action='store_true', dest='incremental',
+                        default=False,
+                        help='''Use this flag to evaluate only the resources that changed since the last incremental run. For resources whose relevant configuration
+                        has not changed, the findings of the last run are carried forward to the output (but not published to the event bus again). Default is False''')
+    optional_params_group.add_argument('--state-file', dest='state_file_name',
+                        default=None,
+                        help="Used only with --incremental. SQLite file in which the state of the resources is kept between runs. Default is fault_tolerance_state.db in the output folder")
+    optional_params_group.add_argument('--api-rate-limit', nargs='+', dest='api_rate_limits',
+                        default=[],
+                        type=api_rate_limit_validator,
+                        metavar='API=RATE',
+                        help='''Maximum number of calls per second to an API, per account and region. The API is either a service (for example rds=5) or an operation of a service
+                        (for example organizations:ListAccounts=1). APIs without a rate limit are not paced until they throttle, after which their rate is learned:
+                        it is halved on throttling and slowly increased while calls succeed''')
+    optional_params_group.add_argument('--max-api-attempts', dest='max_api_attempts',
+                        default = 8,
+                        type=int,
+                        help='Maximum number of attempts for an API call that is throttled or fails with a transient error. Retries use exponential backoff with jitter. Default is 8')
+    optional_params_group.add_argument('--skip-empty-units', action='store_true', dest='skip_empty_units',
+                        default=False,
+                        help='''Use this flag to first check, with a cheap API call, whether there are any resources for a service in a region, and to skip the service+region if there are none.
+                        The result of the check is remembered for the availability TTL, so service+regions without resources are not even scheduled in the next runs. Default is False''')
+    optional_params_group.add_argument('--availability-file', dest='availability_file_name',
+                        default=None,
+                        help="Used only with --skip-empty-units. json file in which the results of the checks are kept between runs. Default is availability_cache.json in the output folder")
+    optional_params_group.add_argument('--availability-ttl', dest='availability_ttl_in_hours',
+                        default = 24,
+                        type=float,
+                        help="Used only with --skip-empty-units. Number of hours for which the result of a check is used. Default is 24")
+    optional_params_group.add_argument('--checkpoint', action='store_true', dest='checkpoint',
+                        default=False,
+                        help='''Use this flag to record each service+region in the checkpoint file, along with its findings, as soon as it completes, so that the run can be resumed
+                        with --resume if it is interrupted. Default is False''')
+    optional_params_group.add_argument('--resume', action='store_true', dest='resume',
+                        default=False,
+                        help='''Use this flag to resume an interrupted run that was started with --checkpoint (or --resume). Only the service+regions that did not complete successfully are run again.
+                        The findings of the others are taken from the checkpoint file, and the findings file is rebuilt so that no resource appears in it twice. Implies --checkpoint''')
+    optional_params_group.add_argument('--checkpoint-file', dest='checkpoint_file_name',
+                        default=None,
+                        help="Used only with --checkpoint or --resume. SQLite file in which the completed service+regions are recorded. Default is fault_tolerance_checkpoint.db in the output folder")
+    distributed_group = optional_params_group.add_mutually_exclusive_group()
+    distributed_group.add_argument('--coordinator', action='store_const', const='coordinator', dest='distributed_role',
+                        default=None,
+                        help='''Use this flag to run the scan as the coordinator of a distributed scan. The coordinator puts a work unit for each service+region (of each account
+                        with --organization) on the work queue, and writes out the findings that the workers put back on it''')
+    distributed_group.add_argument('--worker', action='store_const', const='worker', dest='distributed_role',
+                        default=None,
+                        help='''Use this flag to run as a worker of a distributed scan. The worker takes the services, regions and other settings of the analysis from the
+                        coordinator, leases work units from the work queue and runs them until all the work units of the scan are done''')
+    optional_params_group.add_argument('--work-queue', dest='work_queue_url',
+                        default=None,
+                        help='''Used only with --coordinator or --worker. Work queue shared by the coordinator and the workers, as a path to a SQLite file (or sqlite://<path>).
+                        Default is fault_tolerance_work_queue.db in the output folder''')
+    optional_params_group.add_argument('--lease-timeout', dest='lease_timeout_in_seconds',
+                        default = 300,
+                        type=int,
+                        help="Used only with --worker or --local-workers. Number of seconds after which a work unit leased by a worker that stopped is leased to another worker. Default is 300")
+    optional_params_group.add_argument('--local-workers', dest='local_worker_count',
+                        default = 0,
+                        type=int,
+                        help="Used only with --coordinator. Number of worker processes the coordinator starts on this machine. Default is 0 (workers are started separately with --worker)")
+    api_cache_group = optional_params_group.add_mutually_exclusive_group()
+    api_cache_group.add_argument('--record', action='store_const', const='record', dest='api_cache_mode',
+                        default=None,
+                        help='''Use this flag to save the responses of all the AWS API calls that read information to the API cache folder, so that the run can be replayed later with --replay.
+                        Recorded responses older than the cache TTL are removed at the start of the run''')
+    api_cache_group.add_argument('--replay', action='store_const', const='replay', dest='api_cache_mode',
+                        default=None,
+                        help='''Use this flag to serve the AWS API calls that read information from the API cache folder, without calling AWS, for example to re-run the analysis after a change
+                        to the rules or to benchmark it offline. A call that was not recorded (or was recorded longer ago than the cache TTL) fails its service+region''')
+    optional_params_group.add_argument('--cache-dir', dest='api_cache_folder_name',
+                        default=None,
+                        help="Used only with --record or --replay. Folder of the API cache. Default is api_cache/ in the output folder")
+    optional_params_group.add_argument('--cache-ttl', dest='api_cache_ttl_in_hours',
+                        default = 24,
+                        type=float,
+                        help="Used only with --record or --replay. Number of hours for which a recorded response can be replayed. Default is 24")
+    optional_params_group.add_argument('--api-trace-file', dest='api_trace_file_name',
+                        default=None,
+                        help='''json lines file to which a record of every AWS API call is appended: the operation, region, latency, HTTP status, attempt, retries and page number.
+                        Not written by default''')
     args = parser.parse_args()
 
+    if args.distributed_role != 'worker' and not (args.services and args.regions):
+        parser.error("the arguments -s/--services and -r/--regions are required, except with --worker")
+    if args.distributed_role and (args.checkpoint or args.resume):
+        parser.error("--checkpoint and --resume cannot be used with --coordinator or --worker. The work queue keeps track of the work units that are done")
+    if args.distributed_role and args.skip_empty_units:
+        parser.error("--skip-empty-units cannot be used with --coordinator or --worker")
+    if args.local_worker_count and args.distributed_role != 'coordinator':
+        parser.error("--local-workers can be used only with --coordinator")
+    if args.lease_timeout_in_seconds < 3:
+        parser.error("--lease-timeout must be at least 3 (seconds)")
+    if args.output_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        parser.error("The parquet output format needs the pyarrow package. Install it with 'pip install pyarrow'")
+    if args.stream_to_s3 and not args.bucket_name:
+        parser.error("--stream-to-s3 needs a bucket name")
+    if args.stream_to_s3 and args.output_format != 'csv':
+        parser.error("--stream-to-s3 can be used only with the csv output format")
+    if args.no_local_output and not args.stream_to_s3:
+        parser.error("--no-local-output can be used only with --stream-to-s3")
+    if args.incremental and args.no_local_output and not args.state_file_name:
+        parser.error("--incremental with --no-local-output needs a --state-file outside the output folder")
+    if args.api_cache_mode == 'replay' and args.prewarm_connections:
+        parser.error("--prewarm-connections cannot be used with --replay as no connections are made to AWS")
+    if args.api_cache_mode and args.no_local_output and not args.api_cache_folder_name:
+        parser.error("--record or --replay with --no-local-output needs a --cache-dir outside the output folder")
+    if args.skip_empty_units and args.no_local_output and not args.availability_file_name:
+        parser.error("--skip-empty-units with --no-local-output needs an --availability-file outside the output folder")
+    if (args.checkpoint or args.resume) and args.no_local_output and not args.checkpoint_file_name:
+        parser.error("--checkpoint or --resume with --no-local-output needs a --checkpoint-file outside the output folder")
+    if args.max_api_attempts < 1:
+        parser.error("--max-api-attempts must be at least 1")
+    if args.s3_part_size_mb < 5:
+        parser.error("--s3-part-size must be at least 5 (MB) as that is the minimum size of a part in a multipart upload")
+
     #Set up logging
     logging.basicConfig(
         format='%(asctime)s %(levelname)-8s %(message)s',
@@ -288,43 +602,158 @@ def get_config_info():
                             regions = [],
                             services = [],
                             max_concurrent_threads = args.max_concurrent_threads,
+                            endpoint_url = args.endpoint_url,
                             output_folder_name = args.output_folder_name,
+                            output_format = args.output_format,
                             event_bus_arn=args.event_bus_arn,
                             log_level = args.log_level,
                             aws_profile_name = args.aws_profile_name,
                             aws_assume_role_name = args.aws_assume_role_name,
+                            organization = args.organization,
+                            member_role_name = args.member_role_name,
+                            max_processes = args.max_processes,
+                            prewarm_connections = args.prewarm_connections,
                             single_threaded = args.single_threaded,
                             run_report_file_name = "run_report.csv",
                             bucket_name = args.bucket_name,
+                            stream_to_s3 = args.stream_to_s3,
+                            no_local_output = args.no_local_output,
+                            s3_part_size_mb = args.s3_part_size_mb,
+                            s3_max_concurrency = args.s3_max_concurrency,
                             account_id = '',
                             truncate_output = args.truncate_output,
                             filename_with_accountid = args.filename_with_accountid,
-                            report_only_issues = args.report_only_issues
+                            report_only_issues = args.report_only_issues,
+                            incremental = args.incremental,
+                            state_file_name = args.state_file_name if args.state_file_name else f"{args.output_folder_name}fault_tolerance_state.db",
+                            api_cache_mode = args.api_cache_mode,
+                            api_cache_folder_name = args.api_cache_folder_name if args.api_cache_folder_name else f"{args.output_folder_name}api_cache/",
+                            api_cache_ttl_in_hours = args.api_cache_ttl_in_hours,
+                            api_rate_limits = dict(args.api_rate_limits),
+                            max_api_attempts = args.max_api_attempts,
+                            skip_empty_units = args.skip_empty_units,
+                            availability_file_name = args.availability_file_name if args.availability_file_name else f"{args.output_folder_name}availability_cache.json",
+                            availability_ttl_in_hours = args.availability_ttl_in_hours,
+                            api_trace_file_name = args.api_trace_file_name,
+                            checkpoint = args.checkpoint or args.resume,
+                            resume = args.resume,
+                            checkpoint_file_name = args.checkpoint_file_name if args.checkpoint_file_name else f"{args.output_folder_name}fault_tolerance_checkpoint.db",
+                            distributed_role = args.distributed_role,
+                            work_queue_url = args.work_queue_url if args.work_queue_url else f"{args.output_folder_name}fault_tolerance_work_queue.db",
+                            lease_timeout_in_seconds = args.lease_timeout_in_seconds,
+                            local_worker_count = args.local_worker_count
                 )
 
 
+    init_aws_clients()
+
+    if config_info.api_cache_mode == 'record':
+        api_cache.evict_expired()
+
     #First check credentials
     account_id = check_aws_credentials()
 
     #Validate regions
     config_info.account_id = account_id
-    config_info.regions = regions_validator(args.regions)
-    config_info.services = services_validator(args.services)
+    credential_cache.home_account_id = account_id
+    #A worker takes the regions and services from the coordinator (see distributed.py)
+    if args.distributed_role != 'worker':
+        config_info.regions = regions_validator(args.regions)
+        config_info.services = services_validator(args.services)
     config_info.event_bus_arn = bus_arn_validator(args.event_bus_arn)
 
+#Transfer settings for all the uploads to the bucket
+def get_s3_transfer_config():
+    import boto3.s3.transfer #Imported here as it is needed only when there is a bucket
+    part_size = config_info.s3_part_size_mb * 1024 * 1024
+    return boto3.s3.transfer.TransferConfig(multipart_threshold = part_size,
+                                            multipart_chunksize = part_size,
+                                            max_concurrency = config_info.s3_max_concurrency)
+
+#Used only to read the pagination model that ships with botocore. Created on first use, as creating a session takes a while.
+@functools.lru_cache(maxsize = None)
+def get_pagination_session():
+    return botocore.session.Session()
+
+#Names of the request parameter and of the response field that carry the pagination token of an operation, as per botocore's paginator model.
+#Most APIs use NextToken for both, but not all. For example Lambda uses Marker and NextMarker, and RDS uses Marker for both.
+@functools.lru_cache(maxsize = None)
+def get_pagination_tokens(service_name, operation_name):
+    try:
+        paginator_config = get_pagination_session().get_paginator_model(service_name).get_paginator(operation_name)
+    except (botocore.exceptions.DataNotFoundError, ValueError): #The service or the operation cannot be paginated
+        return ('NextToken', 'NextToken')
+    input_token, output_token = paginator_config['input_token'], paginator_config['output_token']
+    if not isinstance(input_token, str) or not isinstance(output_token, str): #Operations paginated with more than one token are not used here
+        return ('NextToken', 'NextToken')
+    return (input_token, output_token)
+
 def invoke_aws_api_full_list (api_method, top_level_member, **kwargs):
 
     logging.info(f"Invoking {api_method.__self__.__class__.__name__}.{api_method.__name__} for {top_level_member} with the parameters {kwargs}")
-    response = api_method(**kwargs)
+    client_meta = api_method.__self__.meta
+    input_token, output_token = get_pagination_tokens(client_meta.service_model.service_name,
+                                                      client_meta.method_to_api_mapping.get(api_method.__name__, api_method.__name__))
+    page_number = 1
+    response = invoke_aws_api_page(api_method, page_number, **kwargs)
 
     for response_item in response[top_level_member]:
         yield(response_item)
 
-    while ('NextToken' in response):
-        response = api_method(NextToken = response['NextToken'], **kwargs)
+    while response.get(output_token):
+        page_number = page_number + 1
+        response = invoke_aws_api_page(api_method, page_number, **{input_token: response[output_token]}, **kwargs)
         for response_item in response[top_level_member]:
             yield(response_item)
 
+#The page number is only set around the call, and not across the yields of invoke_aws_api_full_list, so that it does not leak into the caller
+def invoke_aws_api_page(api_method, page_number, **kwargs):
+    page_token = current_page_number.set(page_number)
+    try:
+        return invoke_aws_api(api_method, **kwargs)
+    finally:
+        current_page_number.reset(page_token)
+
+#For the describe APIs that take a list of resources. Calls describe_batch (which must return a list) for every batch of up to batch_size of the items,
+#with up to max_concurrent_batches calls in flight, and yields the results. Batches are sent while the items are still being iterated over (for example
+#while a list API is still being paginated), and no more than max_concurrent_batches batches are held at a time. The results are yielded in the order
+#of the batches, or, if ordered is False, as soon as each batch completes.
+def invoke_in_concurrent_batches(items, batch_size, describe_batch, max_concurrent_batches = 4, ordered = True):
+    items = iter(items)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers = max_concurrent_batches, thread_name_prefix = 'batch') as executor:
+        try:
+            while True:
+                while len(pending) < max_concurrent_batches:
+                    batch = list(itertools.islice(items, batch_size))
+                    if not batch:
+                        break
+                    #Each batch runs in a copy of the current context, so that its API calls are counted against the current work unit
+                    pending.append(executor.submit(contextvars.copy_context().run, describe_batch, batch))
+                if not pending:
+                    return
+                if ordered:
+                    future = pending.popleft()
+                else:
+                    done, _ = concurrent.futures.wait(pending, return_when = concurrent.futures.FIRST_COMPLETED)
+                    future = next(iter(done))
+                    pending.remove(future)
+                yield from future.result()
+        finally:
+            for future in pending: #Only when the caller stops early or a batch fails
+                future.cancel()
+
+#Makes a single API call, paced by the rate limiter and retried when throttled.
+#With --record the response is also saved to the API cache, and with --replay it is read from the cache instead of calling AWS.
+def invoke_aws_api(api_method, **kwargs):
+    account_id = client_pool.get_account_id(api_method.__self__)
+    if api_cache is None:
+        return call_aws_api(api_method, account_id, kwargs)
+    return api_cache.invoke(api_method, account_id, kwargs, call_aws_api)
+
+def call_aws_api(api_method, account_id, params):
+    return rate_limiter.call(api_method, account_id, params, max_attempts = config_info.max_api_attempts)
+
 def parse_arn(arn):
     parts = arn.split(":")
     if len(parts) == 7: #Follows the format "arn:partition:service:region:account-id:resource-type:resource-id"
@@ -0,0 +1,200 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import namedtuple
+
+#A work unit leased by a worker. token identifies this lease of the unit: once the lease has expired and the unit has been leased again,
+#the old token can neither renew nor complete the unit.
+Lease = namedtuple('Lease', ['unit_id', 'token', 'payload'])
+
+#Queue of the work units (account + region + service) of a distributed run, shared by the coordinator and the workers.
+#A backend (for example over Redis or SQS) implements these methods. Payloads, run_info and results are json serialisable.
+#A unit is pending until a worker leases it, leased until the worker completes it or the lease expires (and it can be leased again),
+#and done once it is completed or abandoned. Results are read back in the order in which the units were done.
+class WorkQueue():
+
+    #Starts a new run, dropping the units and results of any previous run
+    def start_run(self, run_info):
+        raise NotImplementedError
+
+    #Returns the run_info of the run, or None if no run has been started
+    def get_run_info(self):
+        raise NotImplementedError
+
+    #Adds the units and returns how many were added. Called once per run, after start_run.
+    def put_units(self, payloads):
+        raise NotImplementedError
+
+    #Returns a Lease on the next pending unit (or unit whose lease has expired fewer than max_attempts times), or None if there is none
+    def lease(self, worker_id, lease_timeout_in_seconds, max_attempts):
+        raise NotImplementedError
+
+    #Extends the lease. Returns False if the lease has been lost.
+    def renew(self, lease, lease_timeout_in_seconds):
+        raise NotImplementedError
+
+    #Marks the unit as done with its result. Returns False, and drops the result, if the lease has been lost.
+    def complete(self, lease, result):
+        raise NotImplementedError
+
+    #Marks the units whose lease has expired max_attempts times as done, without a result. Returns their payloads.
+    def abandon_expired(self, max_attempts):
+        raise NotImplementedError
+
+    #Marks all the units that are not done yet as done, without a result. Returns their payloads.
+    def abandon_remaining(self):
+        raise NotImplementedError
+
+    #Returns [(position, payload, result)] of the units done after the given position, in the order they were done.
+    #result is None for abandoned units.
+    def get_results(self, after_position, max_count):
+        raise NotImplementedError
+
+    #Returns the number of units that are pending, leased and done, and (as 'live') the number of leased units whose lease has not expired
+    def get_counts(self):
+        raise NotImplementedError
+
+    #Whether all the units of the run have been put and are done
+    def is_finished(self):
+        run_info = self.get_run_info()
+        if not run_info or not run_info.get('all_units_put'):
+            return False
+        counts = self.get_counts()
+        return counts['pending'] == 0 and counts['leased'] == 0
+
+    def close(self):
+        pass
+
+#Work queue in a SQLite file. It can be shared by the processes of a node, or by several nodes through a shared file system whose file
+#locking works (POSIX advisory locks). Every state change is a single statement, which SQLite runs atomically across processes.
+#The file uses a rollback journal and not WAL, as the shared memory index of WAL works only between the processes of one host.
+#Lease expiry times are compared with the clock of the process, so the clocks of the nodes must be in sync. Many network file systems
+#do not implement locking reliably, and across many nodes a backend over a shared service (see work_queue_backends) is the safer choice.
+class SqliteWorkQueue(WorkQueue):
+
+    def __init__(self, file_full_path):
+        folder_name = os.path.dirname(file_full_path)
+        if folder_name:
+            os.makedirs(folder_name, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_full_path, timeout = 60, check_same_thread = False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=DELETE")
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS run_info (
+                                            name TEXT PRIMARY KEY,
+                                            value TEXT)''')
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS work_unit (
+                                            unit_id INTEGER PRIMARY KEY,
+                                            payload TEXT,
+                                            status TEXT,
+                                            lease_token TEXT,
+                                            worker_id TEXT,
+                                            lease_expires_at REAL,
+                                            attempt_count INTEGER,
+                                            result TEXT,
+                                            done_position INTEGER)''')
+            self.connection.execute("CREATE INDEX IF NOT EXISTS work_unit_status ON work_unit (status, unit_id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS work_unit_done_position ON work_unit (done_position)")
+
+    def start_run(self, run_info):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM run_info")
+            self.connection.execute("DELETE FROM work_unit")
+            self.connection.executemany("INSERT INTO run_info VALUES (?, ?)", [(name, json.dumps(value)) for name, value in run_info.items()])
+
+    def get_run_info(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT name, value FROM run_info").fetchall()
+        return {name: json.loads(value) for name, value in rows} if rows else None
+
+    def put_units(self, payloads):
+        rows = [(json.dumps(payload),) for payload in payloads]
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT INTO work_unit (payload, status, attempt_count) VALUES (?, 'pending', 0)", rows)
+            self.connection.execute("INSERT OR REPLACE INTO run_info VALUES ('all_units_put', 'true')")
+        return len(rows)
+
+    def lease(self, worker_id, lease_timeout_in_seconds, max_attempts):
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute('''UPDATE work_unit SET status = 'leased', lease_token = ?, worker_id = ?, lease_expires_at = ?, attempt_count = attempt_count + 1
+                                       WHERE unit_id = (SELECT unit_id FROM work_unit
+                                                        WHERE status = 'pending' OR (status = 'leased' AND lease_expires_at < ? AND attempt_count < ?)
+                                                        ORDER BY unit_id LIMIT 1)''',
+                                    (token, worker_id, now + lease_timeout_in_seconds, now, max_attempts))
+            row = self.connection.execute("SELECT unit_id, payload FROM work_unit WHERE lease_token = ?", (token,)).fetchone()
+        return Lease(row[0], token, json.loads(row[1])) if row else None
+
+    def renew(self, lease, lease_timeout_in_seconds):
+        with self.lock, self.connection:
+            cursor = self.connection.execute("UPDATE work_unit SET lease_expires_at = ? WHERE unit_id = ? AND lease_token = ? AND status = 'leased'",
+                                             (time.time() + lease_timeout_in_seconds, lease.unit_id, lease.token))
+        return cursor.rowcount == 1
+
+    def complete(self, lease, result):
+        with self.lock, self.connection:
+            cursor = self.connection.execute('''UPDATE work_unit SET status = 'done', result = ?,
+                                                    done_position = (SELECT COALESCE(MAX(done_position), 0) + 1 FROM work_unit)
+                                                WHERE unit_id = ? AND lease_token = ? AND status = 'leased' ''',
+                                             (json.dumps(result), lease.unit_id, lease.token))
+        return cursor.rowcount == 1
+
+    def abandon_expired(self, max_attempts):
+        with self.lock, self.connection:
+            rows = self.connection.execute("SELECT unit_id, payload FROM work_unit WHERE status = 'leased' AND lease_expires_at < ? AND attempt_count >= ?",
+                                           (time.time(), max_attempts)).fetchall()
+            for unit_id, payload in rows:
+                self.connection.execute('''UPDATE work_unit SET status = 'done', result = NULL,
+                                                done_position = (SELECT COALESCE(MAX(done_position), 0) + 1 FROM work_unit)
+                                            WHERE unit_id = ?''', (unit_id,))
+        return [json.loads(payload) for unit_id, payload in rows]
+
+    def abandon_remaining(self):
+        with self.lock, self.connection:
+            rows = self.connection.execute("SELECT unit_id, payload FROM work_unit WHERE status != 'done'").fetchall()
+            for unit_id, payload in rows:
+                self.connection.execute('''UPDATE work_unit SET status = 'done', result = NULL,
+                                                done_position = (SELECT COALESCE(MAX(done_position), 0) + 1 FROM work_unit)
+                                            WHERE unit_id = ?''', (unit_id,))
+        return [json.loads(payload) for unit_id, payload in rows]
+
+    def get_results(self, after_position, max_count):
+        with self.lock:
+            rows = self.connection.execute("SELECT done_position, payload, result FROM work_unit WHERE done_position > ? ORDER BY done_position LIMIT ?",
+                                           (after_position, max_count)).fetchall()
+        return [(position, json.loads(payload), json.loads(result) if result else None) for position, payload, result in rows]
+
+    def get_counts(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM work_unit GROUP BY status").fetchall()
+            live_count = self.connection.execute("SELECT COUNT(*) FROM work_unit WHERE status = 'leased' AND lease_expires_at >= ?",
+                                                 (time.time(),)).fetchone()[0]
+        counts = {'pending': 0, 'leased': 0, 'done': 0}
+        counts.update(dict(rows))
+        counts['live'] = live_count
+        return counts
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+#Backends of --work-queue, keyed by the scheme of the URL. A backend class takes the rest of the URL (after '<scheme>://').
+work_queue_backends = {
+    'sqlite': SqliteWorkQueue
+}
+
+#A URL without a scheme is the path of a SQLite file
+def get_work_queue(url):
+    scheme, separator, location = url.partition('://')
+    if not separator:
+        return SqliteWorkQueue(url)
+    if scheme not in work_queue_backends:
+        raise ValueError(f"Unknown work queue scheme {scheme}. Known schemes are {list(work_queue_backends.keys())}")
+    return work_queue_backends[scheme](location)